@@ -0,0 +1,69 @@
+'''
+Буфер записей audit_log на время запроса.
+Записи копятся по ходу изменения и пишутся одним запросом в той же транзакции
+прямо перед commit: многострочный INSERT, а для больших пакетов (импорт) — COPY.
+Одинаковая копия модуля лежит в каждой функции, которая пишет аудит.
+'''
+
+import io
+import os
+from typing import List, Optional, Tuple
+from psycopg2.extras import execute_values
+
+AUDIT_TABLE = 't_p43707323_map_portal_creation.audit_log'
+AUDIT_COLUMNS = ('user_id', 'action', 'resource_type', 'resource_id', 'details')
+
+Record = Tuple[Optional[str], str, Optional[str], Optional[str], Optional[str]]
+
+
+def _copy_threshold() -> int:
+    return int(os.environ.get('AUDIT_COPY_THRESHOLD', '500'))
+
+
+def _copy_field(value: Optional[str]) -> str:
+    '''Поле в текстовом формате COPY: \\N для NULL, экранирование спецсимволов'''
+    if value is None:
+        return '\\N'
+    return (
+        str(value).replace('\\', '\\\\').replace('\t', '\\t')
+        .replace('\n', '\\n').replace('\r', '\\r')
+    )
+
+
+class AuditLog:
+    '''Записи аудита одного запроса от имени user_id'''
+
+    def __init__(self, user_id: Optional[str]):
+        self.user_id = user_id
+        self.records: List[Record] = []
+
+    def add(self, action: str, resource_type: Optional[str], resource_id: Optional[str] = None,
+            details: Optional[str] = None) -> None:
+        self.records.append((self.user_id, action, resource_type, resource_id, details))
+
+    def flush(self, cur, copy: Optional[bool] = None) -> int:
+        '''
+        Пишет накопленные записи курсором текущей транзакции и очищает буфер.
+        copy=None выбирает COPY автоматически от AUDIT_COPY_THRESHOLD записей
+        '''
+        records, self.records = self.records, []
+        if not records:
+            return 0
+        if copy is None:
+            copy = len(records) >= _copy_threshold()
+        if copy:
+            buffer = io.StringIO()
+            for record in records:
+                buffer.write('\t'.join(_copy_field(v) for v in record) + '\n')
+            buffer.seek(0)
+            cur.copy_expert(
+                'COPY ' + AUDIT_TABLE + ' (' + ', '.join(AUDIT_COLUMNS) + ') FROM STDIN', buffer
+            )
+        else:
+            execute_values(
+                cur,
+                'INSERT INTO ' + AUDIT_TABLE + ' (' + ', '.join(AUDIT_COLUMNS) + ') VALUES %s',
+                records,
+                page_size=1000
+            )
+        return len(records)
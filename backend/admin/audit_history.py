@@ -0,0 +1,142 @@
+'''
+Чтение журнала аудита страницами и задание хранения.
+Страницы идут от новых записей к старым по ключу (created_at, id):
+следующая страница запрашивается с before=<created_at>,<id> последней строки.
+Старые записи переносятся в audit_log_archive (или удаляются) пачками.
+'''
+
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+SCHEMA = 't_p43707323_map_portal_creation'
+
+DEFAULT_AUDIT_LIMIT = 50
+MAX_AUDIT_LIMIT = 500
+
+# Параметр запроса -> колонка audit_log; action занят под выбор раздела админки
+AUDIT_FILTERS = (
+    ('user_id', 'user_id'),
+    ('audit_action', 'action'),
+    ('resource_type', 'resource_type'),
+    ('resource_id', 'resource_id'),
+)
+
+RETENTION_MODES = ('archive', 'delete')
+
+_SELECT_OLD_SQL = (
+    "SELECT id FROM " + SCHEMA + ".audit_log WHERE created_at < %s "
+    "ORDER BY created_at, id LIMIT %s"
+)
+
+_DELETE_OLD_SQL = (
+    "DELETE FROM " + SCHEMA + ".audit_log a USING old WHERE a.id = old.id "
+    "RETURNING a.id, a.user_id, a.action, a.resource_type, a.resource_id, a.details, a.created_at"
+)
+
+# Оба запроса возвращают число строк, убранных из audit_log
+ARCHIVE_SQL = (
+    "WITH old AS (" + _SELECT_OLD_SQL + "), "
+    "moved AS (" + _DELETE_OLD_SQL + "), "
+    "archived AS ("
+    "INSERT INTO " + SCHEMA + ".audit_log_archive (id, user_id, action, resource_type, resource_id, details, created_at) "
+    "SELECT * FROM moved ON CONFLICT (id) DO NOTHING"
+    ") SELECT count(*) FROM moved"
+)
+
+PURGE_SQL = (
+    "WITH old AS (" + _SELECT_OLD_SQL + "), "
+    "moved AS (" + _DELETE_OLD_SQL + ") "
+    "SELECT count(*) FROM moved"
+)
+
+
+def parse_audit_limit(value: Optional[str]) -> int:
+    '''Размер страницы в пределах 1..MAX_AUDIT_LIMIT. Бросает ValueError'''
+    if not value:
+        return DEFAULT_AUDIT_LIMIT
+    limit = int(value)
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return min(limit, MAX_AUDIT_LIMIT)
+
+
+def parse_before(value: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    '''Разбирает before=<created_at>,<id> (created_at в ISO-формате). Бросает ValueError'''
+    if not value:
+        return None
+    created_at, sep, audit_id = value.rpartition(',')
+    if not sep:
+        raise ValueError('before must be <created_at>,<id>')
+    return datetime.fromisoformat(created_at.strip()), int(audit_id)
+
+
+def audit_page_query(params: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    '''SQL и параметры страницы журнала по параметрам запроса. Бросает ValueError'''
+    conditions = []
+    values: List[Any] = []
+    for param, column in AUDIT_FILTERS:
+        if params.get(param):
+            conditions.append('a.' + column + ' = %s')
+            values.append(params[param])
+    before = parse_before(params.get('before'))
+    if before:
+        conditions.append('(a.created_at, a.id) < (%s, %s)')
+        values.extend(before)
+    values.append(parse_audit_limit(params.get('limit')))
+
+    sql = (
+        "SELECT a.id, a.user_id, a.action, a.resource_type, a.resource_id, a.details, a.created_at, "
+        "u.name, u.email "
+        "FROM " + SCHEMA + ".audit_log a "
+        "LEFT JOIN " + SCHEMA + ".users u ON a.user_id = u.id "
+        + ("WHERE " + " AND ".join(conditions) + " " if conditions else "") +
+        "ORDER BY a.created_at DESC, a.id DESC "
+        "LIMIT %s"
+    )
+    return sql, values
+
+
+def retention_settings(body: Dict[str, Any]) -> Tuple[int, str, int]:
+    '''(срок хранения в днях, режим, размер пачки) из тела запроса и окружения. Бросает ValueError'''
+    keep_days = int(body.get('keep_days') or os.environ.get('AUDIT_RETENTION_DAYS', '365'))
+    if keep_days < 1:
+        raise ValueError('keep_days must be positive')
+    mode = body.get('mode') or 'archive'
+    if mode not in RETENTION_MODES:
+        raise ValueError('mode must be one of: ' + ', '.join(RETENTION_MODES))
+    batch_size = int(body.get('batch_size') or os.environ.get('AUDIT_RETENTION_BATCH', '50000'))
+    if batch_size < 1:
+        raise ValueError('batch_size must be positive')
+    return keep_days, mode, batch_size
+
+
+def run_retention(conn, keep_days: int, mode: str, batch_size: int,
+                  time_budget: Optional[float] = None) -> Dict[str, Any]:
+    '''
+    Переносит в архив (mode=archive) или удаляет (mode=delete) записи старше keep_days.
+    Каждая пачка — отдельная транзакция; по истечении time_budget секунд
+    задание останавливается и возвращает done=False, чтобы его вызвали ещё раз
+    '''
+    if time_budget is None:
+        time_budget = float(os.environ.get('AUDIT_RETENTION_TIME_BUDGET', '20'))
+    sql = ARCHIVE_SQL if mode == 'archive' else PURGE_SQL
+    started = time.monotonic()
+    total = 0
+    done = False
+    with conn.cursor() as cur:
+        # Граница считается один раз по часам базы, которыми заполняется created_at
+        cur.execute("SELECT LOCALTIMESTAMP - make_interval(days => %s)", (keep_days,))
+        cutoff = cur.fetchone()[0]
+        while True:
+            cur.execute(sql, (cutoff, batch_size))
+            count = cur.fetchone()[0]
+            conn.commit()
+            total += count
+            if count < batch_size:
+                done = True
+                break
+            if time.monotonic() - started > time_budget:
+                break
+    return {'mode': mode, 'cutoff': cutoff.isoformat(), 'processed': total, 'done': done}
@@ -1,16 +1,10 @@
 import json
-import os
 from typing import Dict, Any, List, Optional
-import psycopg2
 import psycopg2.extras
 from urllib.parse import parse_qs
-
-def get_db_connection():
-    '''Создаёт подключение к PostgreSQL базе данных'''
-    dsn = os.environ.get('DATABASE_URL')
-    if not dsn:
-        raise Exception('DATABASE_URL not configured')
-    return psycopg2.connect(dsn)
+from db import get_connection, release_connection
+from audit import AuditLog
+from audit_history import audit_page_query, retention_settings, run_retention
 
 def check_admin_access(user_id: str, conn) -> bool:
     '''Проверяет, является ли пользователь администратором'''
@@ -49,10 +43,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     user_id = headers.get('X-User-Id') or headers.get('x-user-id')
     
     try:
-        conn = get_db_connection()
+        conn = get_connection()
         
         if not check_admin_access(user_id, conn):
-            conn.close()
             return {
                 'statusCode': 403,
                 'headers': {
@@ -62,6 +55,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'body': json.dumps({'error': 'Access denied. Admin role required.'})
             }
         
+        audit = AuditLog(user_id)
+        
         if method == 'GET':
             params = event.get('queryStringParameters', {})
             action = params.get('action', '')
@@ -96,15 +91,18 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     result = cur.fetchall()
                 
                 elif action == 'audit':
-                    limit = int(params.get('limit', 50))
-                    cur.execute('''
-                        SELECT a.id, a.user_id, a.action, a.resource_type, a.resource_id, a.details, a.created_at,
-                               u.name, u.email
-                        FROM t_p43707323_map_portal_creation.audit_log a
-                        LEFT JOIN t_p43707323_map_portal_creation.users u ON a.user_id = u.id
-                        ORDER BY a.created_at DESC
-                        LIMIT %s
-                    ''', (limit,))
+                    try:
+                        audit_sql, audit_params = audit_page_query(params)
+                    except ValueError as e:
+                        return {
+                            'statusCode': 400,
+                            'headers': {
+                                'Content-Type': 'application/json',
+                                'Access-Control-Allow-Origin': '*'
+                            },
+                            'body': json.dumps({'error': str(e)})
+                        }
+                    cur.execute(audit_sql, audit_params)
                     result = cur.fetchall()
                 
                 elif action == 'layers':
@@ -127,7 +125,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     result = cur.fetchall()
                 
                 else:
-                    conn.close()
                     return {
                         'statusCode': 400,
                         'headers': {
@@ -137,7 +134,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'body': json.dumps({'error': 'Unknown action'})
                     }
             
-            conn.close()
             return {
                 'statusCode': 200,
                 'headers': {
@@ -161,10 +157,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         (new_role, user_target_id)
                     )
                     
-                    cur.execute(
-                        "INSERT INTO t_p43707323_map_portal_creation.audit_log (user_id, action, resource_type, resource_id, details) VALUES (%s, 'update_object', 'user', %s, %s)",
-                        (user_id, user_target_id, json.dumps({'field': 'role', 'new_value': new_role}))
-                    )
+                    audit.add('update_object', 'user', user_target_id, json.dumps({'field': 'role', 'new_value': new_role}))
+                    audit.flush(cur)
                     conn.commit()
                     result = {'success': True}
                 
@@ -177,10 +171,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         (new_status, user_target_id)
                     )
                     
-                    cur.execute(
-                        "INSERT INTO t_p43707323_map_portal_creation.audit_log (user_id, action, resource_type, resource_id, details) VALUES (%s, 'update_object', 'user', %s, %s)",
-                        (user_id, user_target_id, json.dumps({'field': 'status', 'new_value': new_status}))
-                    )
+                    audit.add('update_object', 'user', user_target_id, json.dumps({'field': 'status', 'new_value': new_status}))
+                    audit.flush(cur)
                     conn.commit()
                     result = {'success': True}
                 
@@ -195,10 +187,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         body.get('address'), body.get('phone'), body.get('email'), body.get('website')
                     ))
                     
-                    cur.execute(
-                        "INSERT INTO t_p43707323_map_portal_creation.audit_log (user_id, action, resource_type, resource_id, details) VALUES (%s, 'create_object', 'company', %s, %s)",
-                        (user_id, company_id, json.dumps({'name': body.get('name')}))
-                    )
+                    audit.add('create_object', 'company', company_id, json.dumps({'name': body.get('name')}))
+                    audit.flush(cur)
                     conn.commit()
                     result = {'success': True}
                 
@@ -213,10 +203,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         body.get('address'), body.get('phone'), body.get('email'), body.get('website'), company_id
                     ))
                     
-                    cur.execute(
-                        "INSERT INTO t_p43707323_map_portal_creation.audit_log (user_id, action, resource_type, resource_id, details) VALUES (%s, 'update_object', 'company', %s, %s)",
-                        (user_id, company_id, json.dumps({'name': body.get('name')}))
-                    )
+                    audit.add('update_object', 'company', company_id, json.dumps({'name': body.get('name')}))
+                    audit.flush(cur)
                     conn.commit()
                     result = {'success': True}
                 
@@ -230,10 +218,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         body.get('resource_id'), body.get('permission_level')
                     ))
                     
-                    cur.execute(
-                        "INSERT INTO t_p43707323_map_portal_creation.audit_log (user_id, action, resource_type, resource_id, details) VALUES (%s, 'grant_permission', %s, %s, %s)",
-                        (user_id, body.get('resource_type'), body.get('resource_id'), json.dumps({'target_user': body.get('user_id'), 'level': body.get('permission_level')}))
-                    )
+                    audit.add('grant_permission', body.get('resource_type'), body.get('resource_id'), json.dumps({'target_user': body.get('user_id'), 'level': body.get('permission_level')}))
+                    audit.flush(cur)
                     conn.commit()
                     result = {'success': True}
                 
@@ -274,7 +260,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 elif action == 'create_beneficiary':
                     name = body.get('name')
                     if not name:
-                        conn.close()
                         return {
                             'statusCode': 400,
                             'headers': {
@@ -290,17 +275,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     )
                     new_id = cur.fetchone()[0]
                     
-                    cur.execute(
-                        "INSERT INTO t_p43707323_map_portal_creation.audit_log (user_id, action, resource_type, resource_id, details) VALUES (%s, 'create', 'beneficiary', %s, %s)",
-                        (user_id, str(new_id), json.dumps({'name': name}))
-                    )
+                    audit.add('create', 'beneficiary', str(new_id), json.dumps({'name': name}))
+                    audit.flush(cur)
                     conn.commit()
                     result = {'success': True, 'id': new_id}
                 
                 elif action == 'delete_beneficiary':
                     name = body.get('name')
                     if not name:
-                        conn.close()
                         return {
                             'statusCode': 400,
                             'headers': {
@@ -317,16 +299,31 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     deleted_id = cur.fetchone()
                     
                     if deleted_id:
-                        cur.execute(
-                            "INSERT INTO t_p43707323_map_portal_creation.audit_log (user_id, action, resource_type, resource_id, details) VALUES (%s, 'delete', 'beneficiary', %s, %s)",
-                            (user_id, str(deleted_id[0]), json.dumps({'name': name}))
-                        )
+                        audit.add('delete', 'beneficiary', str(deleted_id[0]), json.dumps({'name': name}))
                     
+                    audit.flush(cur)
                     conn.commit()
                     result = {'success': True}
                 
+                elif action == 'audit_retention':
+                    try:
+                        keep_days, mode, batch_size = retention_settings(body)
+                    except ValueError as e:
+                        return {
+                            'statusCode': 400,
+                            'headers': {
+                                'Content-Type': 'application/json',
+                                'Access-Control-Allow-Origin': '*'
+                            },
+                            'body': json.dumps({'error': str(e)})
+                        }
+                    
+                    result = run_retention(conn, keep_days, mode, batch_size)
+                    audit.add('audit_retention', 'audit_log', None, json.dumps(result))
+                    audit.flush(cur)
+                    conn.commit()
+                
                 else:
-                    conn.close()
                     return {
                         'statusCode': 400,
                         'headers': {
@@ -336,7 +333,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'body': json.dumps({'error': 'Unknown action'})
                     }
             
-            conn.close()
             return {
                 'statusCode': 200,
                 'headers': {
@@ -356,10 +352,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         "DELETE FROM t_p43707323_map_portal_creation.companies WHERE id = %s",
                         (company_id,)
                     )
-                    cur.execute(
-                        "INSERT INTO t_p43707323_map_portal_creation.audit_log (user_id, action, resource_type, resource_id, details) VALUES (%s, 'delete_object', 'company', %s, '{}')",
-                        (user_id, company_id)
-                    )
+                    audit.add('delete_object', 'company', company_id, '{}')
+                    audit.flush(cur)
                     conn.commit()
                 
                 elif 'permission_id' in params:
@@ -376,10 +370,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     )
                     
                     if perm:
-                        cur.execute(
-                            "INSERT INTO t_p43707323_map_portal_creation.audit_log (user_id, action, resource_type, resource_id, details) VALUES (%s, 'revoke_permission', %s, %s, %s)",
-                            (user_id, perm[1], perm[2], json.dumps({'target_user': perm[0]}))
-                        )
+                        audit.add('revoke_permission', perm[1], perm[2], json.dumps({'target_user': perm[0]}))
+                    audit.flush(cur)
                     conn.commit()
                 
                 elif 'attribute_id' in params:
@@ -391,7 +383,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     conn.commit()
                 
                 else:
-                    conn.close()
                     return {
                         'statusCode': 400,
                         'headers': {
@@ -401,7 +392,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'body': json.dumps({'error': 'Missing required parameter'})
                     }
             
-            conn.close()
             return {
                 'statusCode': 200,
                 'headers': {
@@ -412,7 +402,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             }
         
         else:
-            conn.close()
             return {
                 'statusCode': 405,
                 'headers': {
@@ -430,4 +419,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'Access-Control-Allow-Origin': '*'
             },
             'body': json.dumps({'error': str(e)})
-        }
\ No newline at end of file
+        }
+    finally:
+        if 'conn' in locals():
+            release_connection(conn)
\ No newline at end of file
@@ -0,0 +1,161 @@
+'''
+Исходящие HTTP-запросы к внешним API с keep-alive: соединения хранятся в пуле
+на уровне модуля (по хосту), поэтому тёплые вызовы функции не открывают новое
+TCP/TLS-соединение. SSL-контекст создаётся один раз, ответы gzip/deflate
+распаковываются. Ответ не 2xx бросает urllib.error.HTTPError, как urlopen.
+Файл одинаковый во всех функциях, которые ходят во внешние API.
+'''
+
+import gzip
+import io
+import json
+import os
+import ssl
+import threading
+import time
+import zlib
+import http.client
+import urllib.error
+import urllib.parse
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+_lock = threading.Lock()
+_idle: Dict[Tuple[str, str, int, bool], List[Tuple[http.client.HTTPConnection, float]]] = {}
+_stats = {'requests': 0, 'connections_opened': 0, 'connections_reused': 0}
+
+# Ошибки, после которых запрос повторяется на новом соединении, если старое
+# оказалось закрытым сервером за время простоя
+_STALE_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine,
+                 ConnectionResetError, BrokenPipeError, ConnectionAbortedError)
+
+
+def _pool_size() -> int:
+    return int(os.environ.get('HTTP_POOL_SIZE', '10'))
+
+
+def _idle_timeout() -> float:
+    return float(os.environ.get('HTTP_IDLE_TIMEOUT', '50'))
+
+
+@lru_cache(maxsize=2)
+def ssl_context(verify: bool = True) -> ssl.SSLContext:
+    '''Общий SSL-контекст; verify=False — без проверки сертификата (НСПД)'''
+    context = ssl.create_default_context()
+    if not verify:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def _acquire(key: Tuple[str, str, int, bool], timeout: float) -> Tuple[http.client.HTTPConnection, bool]:
+    '''Свободное соединение из пула или новое; второй элемент — True, если взято из пула'''
+    now = time.monotonic()
+    with _lock:
+        idle = _idle.get(key, [])
+        while idle:
+            conn, released_at = idle.pop()
+            if now - released_at < _idle_timeout():
+                _stats['connections_reused'] += 1
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                return conn, True
+            conn.close()
+    return _connect(key, timeout), False
+
+
+def _connect(key: Tuple[str, str, int, bool], timeout: float) -> http.client.HTTPConnection:
+    scheme, host, port, verify = key
+    with _lock:
+        _stats['connections_opened'] += 1
+    if scheme == 'https':
+        return http.client.HTTPSConnection(host, port, timeout=timeout, context=ssl_context(verify))
+    return http.client.HTTPConnection(host, port, timeout=timeout)
+
+
+def _release(key: Tuple[str, str, int, bool], conn: http.client.HTTPConnection) -> None:
+    with _lock:
+        idle = _idle.setdefault(key, [])
+        if len(idle) < _pool_size():
+            idle.append((conn, time.monotonic()))
+            return
+    conn.close()
+
+
+def _decode(body: bytes, encoding: Optional[str]) -> bytes:
+    encoding = (encoding or '').lower()
+    if encoding == 'gzip':
+        return gzip.decompress(body)
+    if encoding == 'deflate':
+        return zlib.decompress(body)
+    return body
+
+
+def request(method: str, url: str, body: Optional[bytes] = None, headers: Optional[Dict[str, str]] = None,
+            timeout: float = 10, verify: bool = True) -> Tuple[int, Dict[str, str], bytes]:
+    '''
+    Выполняет запрос через пул соединений и возвращает (status, headers, body)
+    с уже распакованным телом. Редиректы не обрабатываются
+    '''
+    parts = urllib.parse.urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in ('http', 'https'):
+        raise ValueError(f'Unsupported URL scheme: {url}')
+    port = parts.port or (443 if scheme == 'https' else 80)
+    key = (scheme, parts.hostname, port, verify)
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    request_headers = {'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive'}
+    request_headers.update(headers or {})
+
+    with _lock:
+        _stats['requests'] += 1
+    conn, reused = _acquire(key, timeout)
+    while True:
+        try:
+            conn.request(method, path, body=body, headers=request_headers)
+            response = conn.getresponse()
+            data = response.read()
+            break
+        except _STALE_ERRORS:
+            conn.close()
+            if not reused:
+                raise
+            # Сервер закрыл простаивавшее соединение: повторяем один раз на новом
+            conn, reused = _connect(key, timeout), False
+        except Exception:
+            conn.close()
+            raise
+
+    if response.will_close:
+        conn.close()
+    else:
+        _release(key, conn)
+
+    response_headers = {name.lower(): value for name, value in response.getheaders()}
+    data = _decode(data, response_headers.get('content-encoding'))
+    if not 200 <= response.status < 300:
+        raise urllib.error.HTTPError(url, response.status, response.reason,
+                                     response.msg, io.BytesIO(data))
+    return response.status, response_headers, data
+
+
+def request_json(method: str, url: str, payload: Any = None, headers: Optional[Dict[str, str]] = None,
+                 timeout: float = 10, verify: bool = True) -> Any:
+    '''JSON-запрос: payload сериализуется в тело, ответ разбирается из JSON'''
+    request_headers = {'Accept': 'application/json'}
+    body = None
+    if payload is not None:
+        body = json.dumps(payload).encode('utf-8')
+        request_headers['Content-Type'] = 'application/json'
+    request_headers.update(headers or {})
+    _, _, data = request(method, url, body=body, headers=request_headers, timeout=timeout, verify=verify)
+    return json.loads(data.decode('utf-8'))
+
+
+def stats() -> Dict[str, int]:
+    '''Счётчики запросов и соединений с момента загрузки модуля (тёплые вызовы их копят)'''
+    with _lock:
+        return dict(_stats, idle=sum(len(idle) for idle in _idle.values()))
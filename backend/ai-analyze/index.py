@@ -1,8 +1,8 @@
 import json
 import os
 from typing import Dict, Any
-import urllib.request
 import urllib.error
+from http_client import request_json
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -154,33 +154,29 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         'max_tokens': 2000
     }
     
-    req = urllib.request.Request(
-        'https://api.openai.com/v1/chat/completions',
-        data=json.dumps(openai_request).encode('utf-8'),
-        headers={
-            'Content-Type': 'application/json',
-            'Authorization': f'Bearer {api_key}'
-        }
-    )
-    
     try:
-        with urllib.request.urlopen(req) as response:
-            openai_data = json.loads(response.read().decode('utf-8'))
-            result = openai_data['choices'][0]['message']['content']
-            
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'isBase64Encoded': False,
-                'body': json.dumps({
-                    'result': result,
-                    'mode': mode,
-                    'requestId': context.request_id
-                }, ensure_ascii=False)
-            }
+        openai_data = request_json(
+            'POST',
+            'https://api.openai.com/v1/chat/completions',
+            openai_request,
+            headers={'Authorization': f'Bearer {api_key}'},
+            timeout=60
+        )
+        result = openai_data['choices'][0]['message']['content']
+        
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'isBase64Encoded': False,
+            'body': json.dumps({
+                'result': result,
+                'mode': mode,
+                'requestId': context.request_id
+            }, ensure_ascii=False)
+        }
     
     except urllib.error.HTTPError as e:
         error_body = e.read().decode('utf-8')
@@ -0,0 +1,136 @@
+'''
+Пул подключений к PostgreSQL, живущий между «тёплыми» вызовами функции.
+Одинаковая копия модуля лежит в каждой функции, работающей с БД:
+функции деплоятся отдельными папками и не видят общий код.
+'''
+
+import hashlib
+import os
+import re
+import threading
+from typing import Any, Optional, Sequence
+import psycopg2
+from psycopg2 import pool
+from psycopg2.extensions import connection, TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+
+_pool: Optional[pool.ThreadedConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def _max_size() -> int:
+    return max(1, int(os.environ.get('DB_POOL_MAX_SIZE', '4')))
+
+
+def _prepared_enabled() -> bool:
+    # Отключается за pgbouncer в режиме транзакций: там сессия не принадлежит соединению
+    return os.environ.get('DB_PREPARED_STATEMENTS', '1') != '0'
+
+
+class PooledConnection(connection):
+    '''Соединение пула; помнит имена подготовленных на нём запросов'''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+
+
+def get_pool() -> pool.ThreadedConnectionPool:
+    '''Лениво создаёт пул на уровне модуля'''
+    global _pool
+    if _pool is None or _pool.closed:
+        with _pool_lock:
+            if _pool is None or _pool.closed:
+                dsn = os.environ.get('DATABASE_URL')
+                if not dsn:
+                    raise Exception('DATABASE_URL not configured')
+                _pool = pool.ThreadedConnectionPool(0, _max_size(), dsn, connection_factory=PooledConnection)
+    return _pool
+
+
+def _is_healthy(conn) -> bool:
+    '''Проверяет, что соединение живо и не висит в транзакции'''
+    if conn.closed:
+        return False
+    try:
+        status = conn.info.transaction_status
+        if status == TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if status != TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def get_connection():
+    '''Выдаёт проверенное соединение из пула'''
+    db_pool = get_pool()
+    for _ in range(_max_size() + 1):
+        conn = db_pool.getconn()
+        if _is_healthy(conn):
+            return conn
+        db_pool.putconn(conn, close=True)
+    raise Exception('No healthy database connection available')
+
+
+def release_connection(conn) -> None:
+    '''Возвращает соединение в пул, сбрасывая состояние транзакции'''
+    if conn is None or _pool is None or _pool.closed:
+        if conn is not None and not conn.closed:
+            conn.close()
+        return
+    broken = conn.closed != 0
+    if not broken:
+        try:
+            if conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            if conn.autocommit:
+                conn.autocommit = False
+        except psycopg2.Error:
+            broken = True
+    try:
+        _pool.putconn(conn, close=broken)
+    except pool.PoolError:
+        if not conn.closed:
+            conn.close()
+
+
+_PLACEHOLDER_RE = re.compile(r'%%|%s')
+# cached plan must not change result type / prepared statement does not exist
+_STALE_PREPARED_CODES = ('0A000', '26000')
+
+
+def _numbered_placeholders(sql: str) -> str:
+    '''Заменяет %s на $1, $2, ... (и %% на %) для PREPARE'''
+    counter = iter(range(1, sql.count('%s') + 1))
+    return _PLACEHOLDER_RE.sub(lambda m: '%' if m.group() == '%%' else '$' + str(next(counter)), sql)
+
+
+def execute_prepared(cur, sql: str, params: Sequence[Any] = ()) -> None:
+    '''
+    Выполняет параметризованный запрос (плейсхолдеры %s) как подготовленный
+    на сервере: PREPARE один раз на соединение, дальше только EXECUTE без
+    повторного разбора и планирования. Имя запроса выводится из текста SQL
+    '''
+    prepared = getattr(cur.connection, 'prepared_statements', None)
+    if prepared is None or not _prepared_enabled():
+        cur.execute(sql, params)
+        return
+    name = 'ps_' + hashlib.sha1(sql.encode('utf-8')).hexdigest()[:16]
+    if name not in prepared:
+        cur.execute('PREPARE ' + name + ' AS ' + _numbered_placeholders(sql))
+        prepared.add(name)
+    try:
+        if params:
+            cur.execute('EXECUTE ' + name + ' (' + ', '.join(['%s'] * len(params)) + ')', params)
+        else:
+            cur.execute('EXECUTE ' + name)
+    except psycopg2.Error as e:
+        if e.pgcode in _STALE_PREPARED_CODES:
+            # Схема поменялась или сессия сброшена: соединение закрывается,
+            # release_connection уберёт его из пула, следующий запрос подготовит заново
+            cur.connection.close()
+        raise
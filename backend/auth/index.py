@@ -3,8 +3,8 @@ import os
 import hashlib
 import secrets
 from typing import Dict, Any
-import psycopg2
 from psycopg2.extras import RealDictCursor
+from db import get_connection, release_connection, execute_prepared
 
 def hash_password(password: str) -> str:
     return hashlib.sha256(password.encode()).hexdigest()
@@ -42,7 +42,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     try:
-        conn = psycopg2.connect(database_url)
+        conn = get_connection()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         body = json.loads(event.get('body', '{}'))
@@ -60,9 +60,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'body': json.dumps({'error': 'Email, password and name required'})
                 }
             
-            cur.execute(
-                "SELECT id FROM users WHERE email = '" + email.replace("'", "''") + "'"
-            )
+            execute_prepared(cur, "SELECT id FROM users WHERE email = %s", (email,))
             existing = cur.fetchone()
             
             if existing:
@@ -76,11 +74,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             password_hash = hash_password(password)
             
             cur.execute(
-                "INSERT INTO users (id, email, name, password_hash) "
-                "VALUES ('" + user_id + "', "
-                "'" + email.replace("'", "''") + "', "
-                "'" + name.replace("'", "''") + "', "
-                "'" + password_hash + "')"
+                "INSERT INTO users (id, email, name, password_hash) VALUES (%s, %s, %s, %s)",
+                (user_id, email, name, password_hash)
             )
             conn.commit()
             
@@ -109,8 +104,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             password_hash = hash_password(password)
             print(f"Login attempt: email={email}, password_hash={password_hash}")
             
-            cur.execute(
-                "SELECT id, email, name, role, status, password_hash as stored_hash FROM users WHERE email = '" + email.replace("'", "''") + "'"
+            execute_prepared(
+                cur,
+                "SELECT id, email, name, role, status, password_hash as stored_hash FROM users WHERE email = %s",
+                (email,)
             )
             user = cur.fetchone()
             
@@ -161,9 +158,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'body': json.dumps({'error': 'Token required'})
                 }
             
-            cur.execute(
-                "SELECT id, email, name, role, status FROM users WHERE id = '" + token.replace("'", "''") + "'"
-            )
+            execute_prepared(cur, "SELECT id, email, name, role, status FROM users WHERE id = %s", (token,))
             user = cur.fetchone()
             
             if not user:
@@ -195,4 +190,4 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         if 'cur' in locals():
             cur.close()
         if 'conn' in locals():
-            conn.close()
\ No newline at end of file
+            release_connection(conn)
\ No newline at end of file
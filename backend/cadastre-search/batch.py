@@ -0,0 +1,143 @@
+'''
+Пакетный поиск участков: POST {"cadastral_numbers": [...]}.
+Номера нормализуются и дедуплицируются, свежие записи кэша читаются одним запросом,
+остальные запрашиваются в НСПД пулом из CADASTRE_BATCH_CONCURRENCY потоков (все
+запросы идут на один хост, так что размер пула и есть лимит на хост).
+Ответ — NDJSON: строка на номер в порядке готовности, последняя строка — итоги.
+'''
+
+import json
+import os
+import time
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from lookup_cache import normalize_cadastral_number, get_entries, put_entry
+from breaker import CircuitOpenError
+
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+
+
+def _max_batch_size() -> int:
+    return int(os.environ.get('CADASTRE_BATCH_MAX', '500'))
+
+
+def _concurrency() -> int:
+    return max(1, int(os.environ.get('CADASTRE_BATCH_CONCURRENCY', '8')))
+
+
+def _time_budget() -> float:
+    return float(os.environ.get('CADASTRE_BATCH_TIME_BUDGET', '25'))
+
+
+def parse_numbers(body: Dict[str, Any]) -> List[str]:
+    '''Нормализованные номера без повторов в исходном порядке; бросает ValueError'''
+    numbers = body.get('cadastral_numbers')
+    if not isinstance(numbers, list) or not all(isinstance(n, str) for n in numbers):
+        raise ValueError('cadastral_numbers must be a list of strings')
+    unique = list(dict.fromkeys(n for n in map(normalize_cadastral_number, numbers) if n))
+    if not unique:
+        raise ValueError('Кадастровые номера не указаны')
+    limit = _max_batch_size()
+    if len(unique) > limit:
+        raise ValueError(f'Не больше {limit} кадастровых номеров за запрос')
+    return unique
+
+
+def nspd_error_message(e: Exception) -> str:
+    '''Текст ошибки НСПД для пользователя'''
+    if isinstance(e, CircuitOpenError):
+        return f'НСПД временно недоступен, повторите через {max(1, round(e.retry_in))} с'
+    if isinstance(e, urllib.error.HTTPError):
+        return f'API НСПД временно недоступен (HTTP {e.code})'
+    return f'Не удалось загрузить участок: {str(e)}'
+
+
+def _item(cadastral_number: str, result: Optional[Dict[str, Any]], cache_status: str) -> Dict[str, Any]:
+    if result is None:
+        return {'cadastral_number': cadastral_number, 'status': 'not_found', 'cache': cache_status}
+    return {'cadastral_number': cadastral_number, 'status': 'found', 'cache': cache_status, 'result': result}
+
+
+def lookup_batch(numbers: List[str], fetch: Callable[[str], Optional[Dict[str, Any]]],
+                 conn=None) -> Iterator[Dict[str, Any]]:
+    '''
+    Результаты по номерам по мере готовности: status found / not_found / error,
+    cache HIT, MISS или STALE. conn — соединение с кэшем или None; новые ответы
+    НСПД пишутся в кэш из текущего потока и фиксируются в конце
+    '''
+    cached: Dict[str, Dict[str, Any]] = {}
+    if conn is not None:
+        try:
+            with conn.cursor() as cur:
+                cached = get_entries(cur, numbers)
+            conn.rollback()
+        except Exception as e:
+            print(f"DEBUG: cadastre cache unavailable: {e}")
+            conn.rollback()
+            conn = None
+
+    pending = []
+    for number in numbers:
+        entry = cached.get(number)
+        if entry and entry['fresh']:
+            yield _item(number, entry['payload'] if entry['found'] else None, 'HIT')
+        else:
+            pending.append(number)
+    if not pending:
+        return
+
+    deadline = time.monotonic() + _time_budget()
+    executor = ThreadPoolExecutor(max_workers=min(_concurrency(), len(pending)))
+    try:
+        futures = {executor.submit(fetch, number): number for number in pending}
+        remaining = set(futures)
+        while remaining:
+            done, remaining = wait(remaining, timeout=max(0.0, deadline - time.monotonic()),
+                                   return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                number = futures[future]
+                entry = cached.get(number)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    if entry and entry['usable']:
+                        print(f"DEBUG: NSPD error for {number}, serving stale entry from {entry['fetched_at']}: {e}")
+                        yield _item(number, entry['payload'] if entry['found'] else None, 'STALE')
+                    else:
+                        yield {'cadastral_number': number, 'status': 'error', 'error': nspd_error_message(e)}
+                    continue
+                if conn is not None:
+                    try:
+                        with conn.cursor() as cur:
+                            put_entry(cur, number, result)
+                    except Exception as e:
+                        print(f"DEBUG: cadastre cache write failed: {e}")
+                        conn.rollback()
+                        conn = None
+                yield _item(number, result, 'MISS')
+
+        # Бюджет времени исчерпан: незавершённые номера отдаются ошибкой, их можно запросить повторно
+        for future in remaining:
+            yield {'cadastral_number': futures[future], 'status': 'error', 'error': 'Превышено время ожидания НСПД'}
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        if conn is not None:
+            try:
+                conn.commit()
+            except Exception as e:
+                print(f"DEBUG: cadastre cache write failed: {e}")
+
+
+def ndjson_body(items: Iterator[Dict[str, Any]]) -> str:
+    '''NDJSON-тело: строки результатов и итоговая строка {"summary": {...}}'''
+    lines = []
+    summary = {'total': 0, 'found': 0, 'not_found': 0, 'error': 0}
+    for item in items:
+        summary['total'] += 1
+        summary[item['status']] += 1
+        lines.append(json.dumps(item, ensure_ascii=False))
+    lines.append(json.dumps({'summary': summary}))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,180 @@
+'''
+Защита вызовов внешнего сервиса: предохранитель (circuit breaker), адаптивный
+таймаут по задержкам последних ответов и повтор с джиттером.
+Состояние живёт на уровне модуля и общее для тёплых вызовов одного экземпляра функции.
+Настройки — переменные окружения с префиксом сервиса (NSPD_BREAKER_THRESHOLD и т. д.),
+значения по умолчанию в DEFAULTS. CALL_BUDGET ограничивает вызов вместе с повторами.
+'''
+
+import http.client
+import os
+import random
+import threading
+import time
+import urllib.error
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+LATENCY_WINDOW = 200
+# Пока ответов меньше, таймаут не сокращается: мало данных для перцентиля
+MIN_LATENCY_SAMPLES = 20
+
+DEFAULTS = {
+    'BREAKER_THRESHOLD': 5,
+    'BREAKER_COOLDOWN': 30,
+    'RETRIES': 2,
+    'RETRY_BASE': 0.25,
+    'RETRY_MAX': 2,
+    'TIMEOUT_MIN': 3,
+    'TIMEOUT_MAX': 20,
+    'TIMEOUT_FACTOR': 3,
+    'CALL_BUDGET': 20,
+}
+
+
+class CircuitOpenError(Exception):
+    '''Цепь разомкнута: запрос к сервису не выполнялся'''
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f'{name} circuit is open, retry in {retry_in:.0f}s')
+        self.retry_in = retry_in
+
+
+# Транспортные ошибки: OSError покрывает URLError, таймауты, сброс соединения,
+# DNS и SSL; HTTPException — оборванный или некорректный HTTP-ответ
+TRANSPORT_ERRORS = (OSError, http.client.HTTPException)
+
+
+def is_failure(error: Exception) -> bool:
+    '''
+    Ошибка сервиса: транспорт, 5xx, 408 и 429. Прочие 4xx и ошибки разбора ответа
+    (ValueError, KeyError и т. п.) — нет: повтор не поможет, а цепь не должна размыкаться
+    '''
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code >= 500 or error.code in (408, 429)
+    return isinstance(error, TRANSPORT_ERRORS)
+
+
+class CircuitBreaker:
+    '''Предохранитель одного сервиса: closed → open после серии ошибок → half_open (один пробный запрос)'''
+
+    def __init__(self, name: str, env_prefix: str):
+        self.name = name
+        self.env_prefix = env_prefix
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self.latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self.counters = {'success': 0, 'failure': 0, 'rejected': 0, 'retries': 0}
+
+    def setting(self, name: str) -> float:
+        return float(os.environ.get(self.env_prefix + '_' + name, str(DEFAULTS[name])))
+
+    def allow(self) -> None:
+        '''Пропускает запрос или бросает CircuitOpenError'''
+        with self._lock:
+            if self.state == OPEN:
+                retry_in = self.opened_at + self.setting('BREAKER_COOLDOWN') - time.monotonic()
+                if retry_in > 0:
+                    self.counters['rejected'] += 1
+                    raise CircuitOpenError(self.name, retry_in)
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == HALF_OPEN:
+                if self._probe_in_flight:
+                    self.counters['rejected'] += 1
+                    raise CircuitOpenError(self.name, 0)
+                self._probe_in_flight = True
+
+    def record_success(self, latency: float) -> None:
+        with self._lock:
+            self.latencies.append(latency)
+            self.counters['success'] += 1
+            self.failures = 0
+            self.state = CLOSED
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.counters['failure'] += 1
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == HALF_OPEN or self.failures >= self.setting('BREAKER_THRESHOLD'):
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def timeout(self) -> float:
+        '''p99 последних ответов × TIMEOUT_FACTOR в пределах TIMEOUT_MIN..TIMEOUT_MAX'''
+        upper = self.setting('TIMEOUT_MAX')
+        if len(self.latencies) < MIN_LATENCY_SAMPLES:
+            return upper
+        p99 = self.percentile(0.99)
+        return min(upper, max(self.setting('TIMEOUT_MIN'), p99 * self.setting('TIMEOUT_FACTOR')))
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            state, failures, counters = self.state, self.failures, dict(self.counters)
+            retry_in = self.opened_at + self.setting('BREAKER_COOLDOWN') - time.monotonic()
+            samples = len(self.latencies)
+
+        def ms(value: Optional[float]) -> Optional[float]:
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            'name': self.name,
+            'state': state,
+            'consecutive_failures': failures,
+            'retry_in_s': round(max(0.0, retry_in), 1) if state == OPEN else None,
+            'timeout_s': round(self.timeout(), 2),
+            'latency_ms': {
+                'samples': samples,
+                'p50': ms(self.percentile(0.5)),
+                'p90': ms(self.percentile(0.9)),
+                'p99': ms(self.percentile(0.99))
+            },
+            'counters': counters
+        }
+
+    def call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        '''
+        fn(*args, timeout=...) через предохранитель. Ошибки сервиса повторяются
+        до RETRIES раз с полным джиттером, пока укладываются в CALL_BUDGET
+        '''
+        deadline = time.monotonic() + self.setting('CALL_BUDGET')
+        attempt = 0
+        while True:
+            self.allow()
+            timeout = min(self.timeout(), max(0.1, deadline - time.monotonic()))
+            started = time.monotonic()
+            try:
+                result = fn(*args, timeout=timeout)
+            except Exception as e:
+                if not is_failure(e):
+                    # Сервис ответил, ошибка в запросе или в разборе ответа — повторять нечего
+                    self.record_success(time.monotonic() - started)
+                    raise
+                self.record_failure()
+                backoff = random.uniform(0, min(self.setting('RETRY_MAX'), self.setting('RETRY_BASE') * 2 ** attempt))
+                if (attempt >= self.setting('RETRIES') or self.state == OPEN
+                        or time.monotonic() + backoff + self.setting('TIMEOUT_MIN') > deadline):
+                    raise
+                attempt += 1
+                with self._lock:
+                    self.counters['retries'] += 1
+                time.sleep(backoff)
+                continue
+            self.record_success(time.monotonic() - started)
+            return result
@@ -1,30 +1,183 @@
 import json
-import urllib.request
-import urllib.error
-import ssl
-from typing import Dict, Any
+import urllib.parse
+from typing import Dict, Any, Optional
+from db import get_connection, release_connection
+from http_client import request_json, stats as http_stats
+from breaker import CircuitBreaker
+from lookup_cache import cache_enabled, normalize_cadastral_number, get_entry, put_entry
+from batch import NDJSON_MEDIA_TYPE, parse_numbers, lookup_batch, ndjson_body, nspd_error_message
+
+# НСПД Геопортал API v5
+NSPD_SEARCH_URL = 'https://nspd.gov.ru/api/geoportal/v5/search/geoportal?thematicSearchId=1&query={query}&CRS=EPSG:4326'
+
+# Предохранитель НСПД: пока цепь разомкнута, ответ с инструкцией отдаётся сразу
+NSPD_BREAKER = CircuitBreaker('NSPD', 'NSPD')
+
+
+def not_available_result(cadastral_number: str, message: str) -> Dict[str, Any]:
+    '''Ответ с инструкцией через Telegram-бот, когда участок не удалось получить из НСПД'''
+    return {
+        'error': 'not_available',
+        'message': message,
+        'instructions': {
+            'title': 'Как загрузить участок:',
+            'steps': [
+                '1. Откройте Telegram бот @pkk2kml_bot',
+                f'2. Отправьте боту кадастровый номер: {cadastral_number}',
+                '3. Бот вернёт файл в формате KML с границами участка',
+                '4. Вернитесь сюда и нажмите кнопку "Импорт данных" внизу',
+                '5. Выберите полученный KML файл — участок появится на карте'
+            ]
+        },
+        'cadastral_number': cadastral_number,
+        'telegram_bot': '@pkk2kml_bot',
+        'telegram_link': 'https://t.me/pkk2kml_bot',
+        'pkk_link': f'https://pkk.rosreestr.ru/#/search/{cadastral_number}'
+    }
+
+
+def fetch_from_nspd(cadastral_number: str, timeout: float = 20) -> Optional[Dict[str, Any]]:
+    '''Участок из НСПД или None, если не найден; ошибки сети и HTTP пробрасываются'''
+    api_url = NSPD_SEARCH_URL.format(query=urllib.parse.quote(cadastral_number, safe=':'))
+
+    # Сертификат НСПД не проверяется; соединение переиспользуется между вызовами
+    response_data = request_json(
+        'GET',
+        api_url,
+        headers={
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+            'Accept': 'application/json, text/plain, */*',
+            'Referer': 'https://nspd.gov.ru/',
+            'Origin': 'https://nspd.gov.ru'
+        },
+        timeout=timeout,
+        verify=False
+    )
+
+    # Check if results exist
+    if not response_data.get('results') or len(response_data['results']) == 0:
+        return None
+
+    # Extract first result
+    feature = response_data['results'][0]
+
+    # Extract geometry
+    geometry = feature.get('geometry', {})
+
+    # Extract attributes from properties
+    properties = feature.get('properties', {})
+
+    # Parse area from properties
+    area = 0
+    if 'area' in properties:
+        area = float(properties['area'])
+    elif 'Площадь' in properties:
+        area = float(properties['Площадь'])
+
+    return {
+        'cadastral_number': cadastral_number,
+        'area': area,
+        'category': properties.get('category', properties.get('Категория земель', '')),
+        'permitted_use': properties.get('permitted_use', properties.get('Разрешенное использование', '')),
+        'address': properties.get('address', properties.get('Адрес', '')),
+        'cost': properties.get('cost', properties.get('Кадастровая стоимость', 0)),
+        'date': properties.get('date', properties.get('Дата постановки на учет', '')),
+        'geometry': geometry
+    }
+
+
+def lookup_nspd(cadastral_number: str) -> Optional[Dict[str, Any]]:
+    '''fetch_from_nspd через предохранитель, с адаптивным таймаутом и повторами'''
+    return NSPD_BREAKER.call(fetch_from_nspd, cadastral_number)
+
+
+def lookup_response(cadastral_number: str, result: Optional[Dict[str, Any]], cache_status: str) -> Dict[str, Any]:
+    '''HTTP-ответ по результату поиска; X-Cache: HIT, MISS или STALE'''
+    if result is None:
+        return {
+            'statusCode': 503,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Expose-Headers': 'X-Cache',
+                'Content-Type': 'application/json',
+                'X-Cache': cache_status
+            },
+            'isBase64Encoded': False,
+            'body': json.dumps(
+                not_available_result(cadastral_number, f'Участок {cadastral_number} не найден в НСПД'),
+                ensure_ascii=False
+            )
+        }
+
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'X-Cache',
+            'Content-Type': 'application/json',
+            'X-Cache': cache_status
+        },
+        'isBase64Encoded': False,
+        'body': json.dumps(result, ensure_ascii=False)
+    }
+
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Загрузка геометрии земельного участка по кадастровому номеру из НСПД Геопортала
-    Args: event с queryStringParameters (cadastral_number)
-    Returns: GeoJSON геометрия участка с атрибутами
+    Args: event с queryStringParameters (cadastral_number или action=status) или POST с body {"cadastral_numbers": [...]}
+    Returns: GeoJSON геометрия участка с атрибутами; для POST — NDJSON, строка на номер
     '''
     method: str = event.get('httpMethod', 'GET')
-    
+
     if method == 'OPTIONS':
         return {
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
                 'Access-Control-Allow-Headers': 'Content-Type',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
             'isBase64Encoded': False
         }
-    
+
+    if method == 'POST':
+        try:
+            numbers = parse_numbers(json.loads(event.get('body') or '{}'))
+        except (ValueError, AttributeError) as e:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Content-Type': 'application/json'
+                },
+                'isBase64Encoded': False,
+                'body': json.dumps({'error': str(e)}, ensure_ascii=False)
+            }
+
+        conn = None
+        try:
+            if cache_enabled():
+                try:
+                    conn = get_connection()
+                except Exception as e:
+                    print(f"DEBUG: cadastre cache unavailable: {e}")
+            body = ndjson_body(lookup_batch(numbers, lookup_nspd, conn))
+        finally:
+            release_connection(conn)
+
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Content-Type': NDJSON_MEDIA_TYPE
+            },
+            'isBase64Encoded': False,
+            'body': body
+        }
+
     if method != 'GET':
         return {
             'statusCode': 405,
@@ -35,10 +188,24 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False,
             'body': json.dumps({'error': 'Method not allowed'})
         }
-    
+
     params = event.get('queryStringParameters', {})
-    cadastral_number = params.get('cadastral_number', '').strip()
-    
+
+    if params.get('action') == 'status':
+        # Состояние предохранителя и задержки НСПД в этом экземпляре функции
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Content-Type': 'application/json',
+                'Cache-Control': 'no-store'
+            },
+            'isBase64Encoded': False,
+            'body': json.dumps({'nspd': NSPD_BREAKER.status(), 'http': http_stats()})
+        }
+
+    cadastral_number = normalize_cadastral_number(params.get('cadastral_number', ''))
+
     if not cadastral_number:
         return {
             'statusCode': 400,
@@ -49,51 +216,33 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False,
             'body': json.dumps({'error': 'Кадастровый номер не указан'})
         }
-    
-    # НСПД Геопортал API v5
-    api_url = f'https://nspd.gov.ru/api/geoportal/v5/search/geoportal?thematicSearchId=1&query={cadastral_number}&CRS=EPSG:4326'
-    
-    # Create SSL context that doesn't verify certificates
-    ssl_context = ssl.create_default_context()
-    ssl_context.check_hostname = False
-    ssl_context.verify_mode = ssl.CERT_NONE
-    
+
+    conn = None
     try:
-        req = urllib.request.Request(
-            api_url,
-            headers={
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Accept': 'application/json, text/plain, */*',
-                'Referer': 'https://nspd.gov.ru/',
-                'Origin': 'https://nspd.gov.ru'
-            }
-        )
-        
-        with urllib.request.urlopen(req, timeout=20, context=ssl_context) as response:
-            response_data = json.loads(response.read().decode('utf-8'))
-        
-        # Check if results exist
-        if not response_data.get('results') or len(response_data['results']) == 0:
-            # Fallback to Telegram bot instruction
-            result = {
-                'error': 'not_available',
-                'message': f'Участок {cadastral_number} не найден в НСПД',
-                'instructions': {
-                    'title': 'Как загрузить участок:',
-                    'steps': [
-                        '1. Откройте Telegram бот @pkk2kml_bot',
-                        f'2. Отправьте боту кадастровый номер: {cadastral_number}',
-                        '3. Бот вернёт файл в формате KML с границами участка',
-                        '4. Вернитесь сюда и нажмите кнопку "Импорт данных" внизу',
-                        '5. Выберите полученный KML файл — участок появится на карте'
-                    ]
-                },
-                'cadastral_number': cadastral_number,
-                'telegram_bot': '@pkk2kml_bot',
-                'telegram_link': 'https://t.me/pkk2kml_bot',
-                'pkk_link': f'https://pkk.rosreestr.ru/#/search/{cadastral_number}'
-            }
-            
+        # Ошибки кэша не мешают поиску: без него запрос просто идёт в НСПД
+        cached = None
+        if cache_enabled():
+            try:
+                conn = get_connection()
+                with conn.cursor() as cur:
+                    cached = get_entry(cur, cadastral_number)
+                conn.rollback()
+            except Exception as e:
+                print(f"DEBUG: cadastre cache unavailable: {e}")
+                release_connection(conn)
+                conn = None
+
+        if cached and cached['fresh']:
+            return lookup_response(cadastral_number, cached['payload'] if cached['found'] else None, 'HIT')
+
+        try:
+            result = lookup_nspd(cadastral_number)
+        except Exception as e:
+            # НСПД недоступен: отдаём последний известный ответ, если он не слишком старый
+            if cached and cached['usable']:
+                print(f"DEBUG: NSPD error for {cadastral_number}, serving stale entry from {cached['fetched_at']}: {e}")
+                return lookup_response(cadastral_number, cached['payload'] if cached['found'] else None, 'STALE')
+            message = nspd_error_message(e)
             return {
                 'statusCode': 503,
                 'headers': {
@@ -101,106 +250,17 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'Content-Type': 'application/json'
                 },
                 'isBase64Encoded': False,
-                'body': json.dumps(result, ensure_ascii=False)
+                'body': json.dumps(not_available_result(cadastral_number, message), ensure_ascii=False)
             }
-        
-        # Extract first result
-        feature = response_data['results'][0]
-        
-        # Extract geometry
-        geometry = feature.get('geometry', {})
-        
-        # Extract attributes from properties
-        properties = feature.get('properties', {})
-        
-        # Parse area from properties
-        area = 0
-        if 'area' in properties:
-            area = float(properties['area'])
-        elif 'Площадь' in properties:
-            area = float(properties['Площадь'])
-        
-        result = {
-            'cadastral_number': cadastral_number,
-            'area': area,
-            'category': properties.get('category', properties.get('Категория земель', '')),
-            'permitted_use': properties.get('permitted_use', properties.get('Разрешенное использование', '')),
-            'address': properties.get('address', properties.get('Адрес', '')),
-            'cost': properties.get('cost', properties.get('Кадастровая стоимость', 0)),
-            'date': properties.get('date', properties.get('Дата постановки на учет', '')),
-            'geometry': geometry
-        }
-        
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
-            },
-            'isBase64Encoded': False,
-            'body': json.dumps(result, ensure_ascii=False)
-        }
-        
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode('utf-8', errors='ignore') if e.fp else ''
-        
-        # Fallback to Telegram bot instruction
-        result = {
-            'error': 'not_available',
-            'message': f'API НСПД временно недоступен (HTTP {e.code})',
-            'instructions': {
-                'title': 'Как загрузить участок:',
-                'steps': [
-                    '1. Откройте Telegram бот @pkk2kml_bot',
-                    f'2. Отправьте боту кадастровый номер: {cadastral_number}',
-                    '3. Бот вернёт файл в формате KML с границами участка',
-                    '4. Вернитесь сюда и нажмите кнопку "Импорт данных" внизу',
-                    '5. Выберите полученный KML файл — участок появится на карте'
-                ]
-            },
-            'cadastral_number': cadastral_number,
-            'telegram_bot': '@pkk2kml_bot',
-            'telegram_link': 'https://t.me/pkk2kml_bot',
-            'pkk_link': f'https://pkk.rosreestr.ru/#/search/{cadastral_number}'
-        }
-        
-        return {
-            'statusCode': 503,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
-            },
-            'isBase64Encoded': False,
-            'body': json.dumps(result, ensure_ascii=False)
-        }
-        
-    except Exception as e:
-        # Fallback to Telegram bot instruction
-        result = {
-            'error': 'not_available',
-            'message': f'Не удалось загрузить участок: {str(e)}',
-            'instructions': {
-                'title': 'Как загрузить участок:',
-                'steps': [
-                    '1. Откройте Telegram бот @pkk2kml_bot',
-                    f'2. Отправьте боту кадастровый номер: {cadastral_number}',
-                    '3. Бот вернёт файл в формате KML с границами участка',
-                    '4. Вернитесь сюда и нажмите кнопку "Импорт данных" внизу',
-                    '5. Выберите полученный KML файл — участок появится на карте'
-                ]
-            },
-            'cadastral_number': cadastral_number,
-            'telegram_bot': '@pkk2kml_bot',
-            'telegram_link': 'https://t.me/pkk2kml_bot',
-            'pkk_link': f'https://pkk.rosreestr.ru/#/search/{cadastral_number}'
-        }
-        
-        return {
-            'statusCode': 503,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
-            },
-            'isBase64Encoded': False,
-            'body': json.dumps(result, ensure_ascii=False)
-        }
\ No newline at end of file
+
+        if conn is not None:
+            try:
+                with conn.cursor() as cur:
+                    put_entry(cur, cadastral_number, result)
+                conn.commit()
+            except Exception as e:
+                print(f"DEBUG: cadastre cache write failed: {e}")
+
+        return lookup_response(cadastral_number, result, 'MISS')
+    finally:
+        release_connection(conn)
@@ -0,0 +1,69 @@
+'''
+Кэш ответов НСПД по кадастровому номеру (таблица cadastre_lookup_cache).
+Найденный участок свеж CADASTRE_CACHE_TTL секунд, «не найден» — CADASTRE_NEGATIVE_TTL.
+Просроченная запись не старше CADASTRE_STALE_MAX_AGE отдаётся, если НСПД не отвечает.
+Без DATABASE_URL кэш выключен и каждый запрос идёт в НСПД.
+'''
+
+import os
+from typing import Any, Dict, List, Optional
+from psycopg2.extras import Json
+
+CACHE_TABLE = 't_p43707323_map_portal_creation.cadastre_lookup_cache'
+
+GET_SQL = (
+    "SELECT cadastral_number, found, payload, fetched_at, "
+    "expires_at > LOCALTIMESTAMP AS fresh, "
+    "fetched_at > LOCALTIMESTAMP - make_interval(secs => %s) AS usable "
+    "FROM " + CACHE_TABLE + " WHERE cadastral_number = ANY(%s)"
+)
+
+PUT_SQL = (
+    "INSERT INTO " + CACHE_TABLE + " (cadastral_number, found, payload, fetched_at, expires_at) "
+    "VALUES (%s, %s, %s, LOCALTIMESTAMP, LOCALTIMESTAMP + make_interval(secs => %s)) "
+    "ON CONFLICT (cadastral_number) DO UPDATE SET "
+    "found = EXCLUDED.found, payload = EXCLUDED.payload, "
+    "fetched_at = EXCLUDED.fetched_at, expires_at = EXCLUDED.expires_at"
+)
+
+
+def _ttl(found: bool) -> float:
+    if found:
+        return float(os.environ.get('CADASTRE_CACHE_TTL', str(7 * 24 * 3600)))
+    return float(os.environ.get('CADASTRE_NEGATIVE_TTL', '3600'))
+
+
+def _stale_max_age() -> float:
+    return float(os.environ.get('CADASTRE_STALE_MAX_AGE', str(30 * 24 * 3600)))
+
+
+def cache_enabled() -> bool:
+    return bool(os.environ.get('DATABASE_URL')) and os.environ.get('CADASTRE_CACHE', '1') != '0'
+
+
+def normalize_cadastral_number(value: str) -> str:
+    '''Ключ кэша: номер без пробелов (в том числе внутри, «77:01: 0001001:12»)'''
+    return ''.join(value.split())
+
+
+def get_entry(cur, cadastral_number: str) -> Optional[Dict[str, Any]]:
+    '''
+    Запись кэша: found, payload, fetched_at, fresh (можно отдавать без запроса в НСПД)
+    и usable (годится как устаревший ответ при ошибке НСПД); None, если записи нет
+    '''
+    return get_entries(cur, [cadastral_number]).get(cadastral_number)
+
+
+def get_entries(cur, cadastral_numbers: List[str]) -> Dict[str, Dict[str, Any]]:
+    '''Записи кэша для нескольких номеров одним запросом (как get_entry), по номеру'''
+    cur.execute(GET_SQL, (_stale_max_age(), cadastral_numbers))
+    return {
+        number: {'found': found, 'payload': payload, 'fetched_at': fetched_at, 'fresh': fresh, 'usable': usable}
+        for number, found, payload, fetched_at, fresh, usable in cur.fetchall()
+    }
+
+
+def put_entry(cur, cadastral_number: str, payload: Optional[Dict[str, Any]]) -> None:
+    '''Сохраняет ответ НСПД; payload=None — участок не найден (отрицательный кэш)'''
+    found = payload is not None
+    cur.execute(PUT_SQL, (cadastral_number, found, Json(payload) if found else None, _ttl(found)))
@@ -0,0 +1,210 @@
+'''
+Поиск компании по ИНН в Dadata (findById/party) с кэшами, общий для dadata и company-save.
+Порядок: LRU в памяти экземпляра → таблица company_lookup_cache → Dadata.
+Найденная компания свежа COMPANY_CACHE_TTL секунд, «не найдена» — COMPANY_NEGATIVE_TTL;
+в последней доле COMPANY_REFRESH_AHEAD срока запись отдаётся и обновляется в фоне.
+Одновременные запросы одного ИНН делают один вызов Dadata: в экземпляре — общий
+Future, между экземплярами — advisory-блокировка по ИНН. Без DATABASE_URL работает
+только LRU. Файл одинаковый в dadata и company-save.
+'''
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, Optional, Tuple
+from psycopg2.extras import Json
+from db import get_connection, release_connection
+from http_client import request_json
+
+DADATA_PARTY_URL = 'https://suggestions.dadata.ru/suggestions/api/4_1/rs/findById/party'
+
+CACHE_TABLE = 't_p43707323_map_portal_creation.company_lookup_cache'
+
+GET_SQL = (
+    "SELECT found, payload, EXTRACT(EPOCH FROM expires_at - LOCALTIMESTAMP) AS ttl_left "
+    "FROM " + CACHE_TABLE + " WHERE inn = %s"
+)
+
+PUT_SQL = (
+    "INSERT INTO " + CACHE_TABLE + " (inn, found, payload, fetched_at, expires_at) "
+    "VALUES (%s, %s, %s, LOCALTIMESTAMP, LOCALTIMESTAMP + make_interval(secs => %s)) "
+    "ON CONFLICT (inn) DO UPDATE SET "
+    "found = EXCLUDED.found, payload = EXCLUDED.payload, "
+    "fetched_at = EXCLUDED.fetched_at, expires_at = EXCLUDED.expires_at"
+)
+
+# Блокировка на время запроса к Dadata: второй экземпляр дождётся записи первого
+LOCK_SQL = "SELECT pg_advisory_xact_lock(hashtext('company_lookup:' || %s))"
+
+_lock = threading.Lock()
+# inn -> (data, expires_at, refresh_at) по time.monotonic()
+_lru: 'OrderedDict[str, Tuple[Optional[Dict[str, Any]], float, float]]' = OrderedDict()
+_inflight: Dict[str, Future] = {}
+_refreshing: set = set()
+
+
+def _ttl(found: bool) -> float:
+    if found:
+        return float(os.environ.get('COMPANY_CACHE_TTL', str(24 * 3600)))
+    return float(os.environ.get('COMPANY_NEGATIVE_TTL', '3600'))
+
+
+def _refresh_ahead(found: bool) -> float:
+    '''Сколько секунд до конца свежести запись уже обновляется в фоне'''
+    return _ttl(found) * float(os.environ.get('COMPANY_REFRESH_AHEAD', '0.2'))
+
+
+def _lru_size() -> int:
+    return int(os.environ.get('COMPANY_LRU_SIZE', '512'))
+
+
+def cache_enabled() -> bool:
+    return bool(os.environ.get('DATABASE_URL')) and os.environ.get('COMPANY_CACHE', '1') != '0'
+
+
+def fetch_from_dadata(inn: str) -> Optional[Dict[str, Any]]:
+    '''data первой подсказки Dadata или None, если компания не найдена; ошибки HTTP пробрасываются'''
+    api_key = os.environ.get('DADATA_API_KEY')
+    if not api_key:
+        raise RuntimeError('DADATA_API_KEY не настроен')
+    response_data = request_json('POST', DADATA_PARTY_URL, {'query': inn},
+                                 headers={'Authorization': f'Token {api_key}'}, timeout=10)
+    if not response_data.get('suggestions'):
+        return None
+    return response_data['suggestions'][0].get('data', {})
+
+
+def _remember(inn: str, data: Optional[Dict[str, Any]], ttl_left: float) -> None:
+    now = time.monotonic()
+    expires_at = now + ttl_left
+    with _lock:
+        _lru[inn] = (data, expires_at, expires_at - _refresh_ahead(data is not None))
+        _lru.move_to_end(inn)
+        while len(_lru) > _lru_size():
+            _lru.popitem(last=False)
+
+
+def _single_flight(inn: str, load) -> Tuple[Optional[Dict[str, Any]], str]:
+    '''Один load() на ИНН в экземпляре: остальные потоки ждут его результат'''
+    with _lock:
+        future = _inflight.get(inn)
+        leader = future is None
+        if leader:
+            future = _inflight[inn] = Future()
+    if not leader:
+        return future.result()
+    try:
+        result = load()
+        future.set_result(result)
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            del _inflight[inn]
+
+
+def _load(inn: str, conn, force: bool = False) -> Tuple[Optional[Dict[str, Any]], str]:
+    '''Запись из таблицы кэша, а если её нет или она просрочена (или force) — из Dadata'''
+    if conn is not None:
+        try:
+            with conn.cursor() as cur:
+                cur.execute(GET_SQL, (inn,))
+                row = cur.fetchone()
+                if row is not None and row[2] > 0 and not force:
+                    conn.rollback()
+                    found, payload, ttl_left = row
+                    _remember(inn, payload if found else None, float(ttl_left))
+                    if ttl_left < _refresh_ahead(found):
+                        _refresh_in_background(inn)
+                    return (payload if found else None), 'HIT'
+                cur.execute(LOCK_SQL, (inn,))
+                # Пока ждали блокировку, запись мог обновить другой экземпляр
+                cur.execute(GET_SQL, (inn,))
+                row = cur.fetchone()
+                if row is not None and row[2] > _refresh_ahead(row[0]):
+                    conn.rollback()
+                    found, payload, ttl_left = row
+                    _remember(inn, payload if found else None, float(ttl_left))
+                    return (payload if found else None), 'HIT'
+        except Exception as e:
+            print(f"DEBUG: company cache unavailable: {e}")
+            conn.rollback()
+            conn = None
+
+    try:
+        data = fetch_from_dadata(inn)
+    except Exception:
+        if conn is not None:
+            conn.rollback()
+        raise
+
+    if conn is not None:
+        try:
+            with conn.cursor() as cur:
+                cur.execute(PUT_SQL, (inn, data is not None, Json(data) if data is not None else None,
+                                      _ttl(data is not None)))
+            conn.commit()
+        except Exception as e:
+            print(f"DEBUG: company cache write failed: {e}")
+            conn.rollback()
+    _remember(inn, data, _ttl(data is not None))
+    return data, 'MISS'
+
+
+def _load_with_connection(inn: str, conn, force: bool = False) -> Tuple[Optional[Dict[str, Any]], str]:
+    '''_load на соединении вызывающего или на своём из пула (берётся только ведущим запросом)'''
+    own_conn = None
+    if conn is None and cache_enabled():
+        try:
+            conn = own_conn = get_connection()
+        except Exception as e:
+            print(f"DEBUG: company cache unavailable: {e}")
+    try:
+        return _load(inn, conn, force)
+    finally:
+        release_connection(own_conn)
+
+
+def _refresh_in_background(inn: str) -> None:
+    '''Обновление записи до истечения срока; ошибки только логируются'''
+    with _lock:
+        if inn in _refreshing:
+            return
+        _refreshing.add(inn)
+
+    def refresh():
+        # Мимо _single_flight: иначе обновление присоединится к идущей обычной загрузке
+        # и вернёт её результат без force; повторы отсекает _refreshing
+        try:
+            _load_with_connection(inn, None, force=True)
+        except Exception as e:
+            print(f"DEBUG: company refresh-ahead for {inn} failed: {e}")
+        finally:
+            with _lock:
+                _refreshing.discard(inn)
+
+    threading.Thread(target=refresh, daemon=True).start()
+
+
+def lookup_company(inn: str, conn=None) -> Tuple[Optional[Dict[str, Any]], str]:
+    '''
+    (data, cache_status): data из Dadata или None, если компания не найдена;
+    cache_status — LRU, HIT (таблица кэша) или MISS. conn — соединение вызывающего
+    (транзакция будет завершена) или None, тогда берётся своё из пула
+    '''
+    if not cache_enabled():
+        conn = None
+    now = time.monotonic()
+    with _lock:
+        cached = _lru.get(inn)
+        if cached is not None:
+            _lru.move_to_end(inn)
+    if cached is not None and cached[1] > now:
+        if cached[2] <= now:
+            _refresh_in_background(inn)
+        return cached[0], 'LRU'
+    return _single_flight(inn, lambda: _load_with_connection(inn, conn))
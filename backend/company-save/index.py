@@ -1,10 +1,10 @@
 import json
 import os
 from typing import Dict, Any
-import urllib.request
 import urllib.error
-import psycopg2
 from psycopg2.extras import RealDictCursor
+from db import get_connection, release_connection
+from company_lookup import lookup_company
 from datetime import datetime
 import uuid
 
@@ -81,7 +81,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    conn = psycopg2.connect(database_url)
+    conn = get_connection()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     
     try:
@@ -104,102 +104,72 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'isBase64Encoded': False
             }
         
-        # Получаем API ключ Dadata
-        dadata_key = os.environ.get('DADATA_API_KEY')
-        if not dadata_key:
+        # Запрашиваем данные из кэша поиска или Dadata
+        data, _ = lookup_company(inn, conn)
+        
+        if data is None:
             return {
-                'statusCode': 500,
+                'statusCode': 404,
                 'headers': {
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps({'error': 'DADATA_API_KEY не настроен'}),
+                'body': json.dumps({'error': 'Компания не найдена в ЕГРЮЛ'}),
                 'isBase64Encoded': False
             }
         
-        # Запрашиваем данные из Dadata
-        url = 'https://suggestions.dadata.ru/suggestions/api/4_1/rs/findById/party'
-        request_data = json.dumps({'query': inn}).encode('utf-8')
+        # Создаем новую компанию в базе
+        company_id = str(uuid.uuid4())
+        now = datetime.utcnow()
+        
+        registration_date = None
+        if data.get('state', {}).get('registration_date'):
+            reg_timestamp = data['state']['registration_date']
+            if reg_timestamp:
+                registration_date = datetime.fromtimestamp(reg_timestamp / 1000).date()
+        
+        cursor.execute("""
+            INSERT INTO t_p43707323_map_portal_creation.companies 
+            (id, name, short_name, inn, kpp, ogrn, address, phone, email, website, 
+             description, status, company_type, registration_date, okved, 
+             management_name, management_post, created_at, updated_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING *
+        """, (
+            company_id,
+            data.get('name', {}).get('full_with_opf', ''),
+            data.get('name', {}).get('short_with_opf', ''),
+            data.get('inn', ''),
+            data.get('kpp', ''),
+            data.get('ogrn', ''),
+            data.get('address', {}).get('unrestricted_value', ''),
+            '',  # phone
+            '',  # email
+            '',  # website
+            f"Автоматически добавлено из ЕГРЮЛ по ИНН {inn}",
+            data.get('state', {}).get('status', 'ACTIVE'),
+            data.get('type', ''),
+            registration_date,
+            data.get('okved', ''),
+            data.get('management', {}).get('name', ''),
+            data.get('management', {}).get('post', ''),
+            now,
+            now
+        ))
         
-        req = urllib.request.Request(
-            url,
-            data=request_data,
-            headers={
+        conn.commit()
+        new_company = cursor.fetchone()
+        
+        return {
+            'statusCode': 200,
+            'headers': {
                 'Content-Type': 'application/json',
-                'Authorization': f'Token {dadata_key}'
-            }
-        )
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps(dict(new_company), default=str, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
         
-        with urllib.request.urlopen(req, timeout=10) as response:
-            response_data = json.loads(response.read().decode('utf-8'))
-            
-            if not response_data.get('suggestions'):
-                return {
-                    'statusCode': 404,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({'error': 'Компания не найдена в ЕГРЮЛ'}),
-                    'isBase64Encoded': False
-                }
-            
-            # Извлекаем данные
-            suggestion = response_data['suggestions'][0]
-            data = suggestion.get('data', {})
-            
-            # Создаем новую компанию в базе
-            company_id = str(uuid.uuid4())
-            now = datetime.utcnow()
-            
-            registration_date = None
-            if data.get('state', {}).get('registration_date'):
-                reg_timestamp = data['state']['registration_date']
-                if reg_timestamp:
-                    registration_date = datetime.fromtimestamp(reg_timestamp / 1000).date()
-            
-            cursor.execute("""
-                INSERT INTO t_p43707323_map_portal_creation.companies 
-                (id, name, short_name, inn, kpp, ogrn, address, phone, email, website, 
-                 description, status, company_type, registration_date, okved, 
-                 management_name, management_post, created_at, updated_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING *
-            """, (
-                company_id,
-                data.get('name', {}).get('full_with_opf', ''),
-                data.get('name', {}).get('short_with_opf', ''),
-                data.get('inn', ''),
-                data.get('kpp', ''),
-                data.get('ogrn', ''),
-                data.get('address', {}).get('unrestricted_value', ''),
-                '',  # phone
-                '',  # email
-                '',  # website
-                f"Автоматически добавлено из ЕГРЮЛ по ИНН {inn}",
-                data.get('state', {}).get('status', 'ACTIVE'),
-                data.get('type', ''),
-                registration_date,
-                data.get('okved', ''),
-                data.get('management', {}).get('name', ''),
-                data.get('management', {}).get('post', ''),
-                now,
-                now
-            ))
-            
-            conn.commit()
-            new_company = cursor.fetchone()
-            
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps(dict(new_company), default=str, ensure_ascii=False),
-                'isBase64Encoded': False
-            }
-            
     except urllib.error.HTTPError as e:
         conn.rollback()
         return {
@@ -224,4 +194,4 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     finally:
         cursor.close()
-        conn.close()
+        release_connection(conn)
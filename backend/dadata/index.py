@@ -1,8 +1,7 @@
 import json
-import os
 from typing import Dict, Any
-import urllib.request
 import urllib.error
+from company_lookup import lookup_company
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -64,79 +63,52 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    # Получаем API ключ из переменных окружения
-    api_key = os.environ.get('DADATA_API_KEY')
-    if not api_key:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'API ключ Dadata не настроен'}),
-            'isBase64Encoded': False
-        }
-    
-    # Формируем запрос к Dadata API
-    url = 'https://suggestions.dadata.ru/suggestions/api/4_1/rs/findById/party'
-    request_data = json.dumps({'query': inn}).encode('utf-8')
-    
-    req = urllib.request.Request(
-        url,
-        data=request_data,
-        headers={
-            'Content-Type': 'application/json',
-            'Authorization': f'Token {api_key}'
-        }
-    )
-    
     try:
-        with urllib.request.urlopen(req, timeout=10) as response:
-            response_data = json.loads(response.read().decode('utf-8'))
-            
-            if not response_data.get('suggestions'):
-                return {
-                    'statusCode': 404,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({'error': 'Компания с таким ИНН не найдена'}),
-                    'isBase64Encoded': False
-                }
-            
-            # Извлекаем данные первой найденной компании
-            suggestion = response_data['suggestions'][0]
-            data = suggestion.get('data', {})
-            
-            # Формируем структурированный ответ
-            company_data = {
-                'inn': data.get('inn', ''),
-                'kpp': data.get('kpp', ''),
-                'ogrn': data.get('ogrn', ''),
-                'name': data.get('name', {}).get('full_with_opf', ''),
-                'short_name': data.get('name', {}).get('short_with_opf', ''),
-                'address': data.get('address', {}).get('unrestricted_value', ''),
-                'management': {
-                    'name': data.get('management', {}).get('name', ''),
-                    'post': data.get('management', {}).get('post', '')
-                },
-                'okved': data.get('okved', ''),
-                'registration_date': data.get('state', {}).get('registration_date', ''),
-                'status': data.get('state', {}).get('status', ''),
-                'type': data.get('type', '')
-            }
-            
+        # Данные первой найденной компании: из кэша или из Dadata
+        data, cache_status = lookup_company(inn)
+        
+        if data is None:
             return {
-                'statusCode': 200,
+                'statusCode': 404,
                 'headers': {
                     'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
+                    'Access-Control-Allow-Origin': '*',
+                    'X-Cache': cache_status
                 },
-                'body': json.dumps(company_data, ensure_ascii=False),
+                'body': json.dumps({'error': 'Компания с таким ИНН не найдена'}),
                 'isBase64Encoded': False
             }
-            
+        
+        # Формируем структурированный ответ
+        company_data = {
+            'inn': data.get('inn', ''),
+            'kpp': data.get('kpp', ''),
+            'ogrn': data.get('ogrn', ''),
+            'name': data.get('name', {}).get('full_with_opf', ''),
+            'short_name': data.get('name', {}).get('short_with_opf', ''),
+            'address': data.get('address', {}).get('unrestricted_value', ''),
+            'management': {
+                'name': data.get('management', {}).get('name', ''),
+                'post': data.get('management', {}).get('post', '')
+            },
+            'okved': data.get('okved', ''),
+            'registration_date': data.get('state', {}).get('registration_date', ''),
+            'status': data.get('state', {}).get('status', ''),
+            'type': data.get('type', '')
+        }
+        
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Expose-Headers': 'X-Cache',
+                'X-Cache': cache_status
+            },
+            'body': json.dumps(company_data, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+        
     except urllib.error.HTTPError as e:
         error_body = e.read().decode('utf-8') if e.fp else 'Unknown error'
         return {
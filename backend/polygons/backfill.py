@@ -0,0 +1,102 @@
+'''
+Досчёт производных колонок геометрии (упрощённая геометрия, packed, bbox, метрики)
+для объектов, записанных до появления этих колонок: POST {"action": "backfill_geometry"}.
+Объекты обходятся пачками по id, каждая пачка — отдельная транзакция; по истечении
+бюджета времени задание останавливается и возвращает курсор after для продолжения.
+'''
+
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from psycopg2.extras import Json, execute_values
+from geometry import BBOX_COLUMNS, METRIC_COLUMNS, bbox_values, metric_values, build_simplified_levels
+from packed import encode_coordinates
+
+DERIVED_COLUMNS = ('coordinates_simplified', 'coordinates_packed') + BBOX_COLUMNS + METRIC_COLUMNS
+
+DERIVED_SQL = (
+    "UPDATE polygon_objects AS p SET " +
+    ', '.join(col + ' = v.' + col for col in DERIVED_COLUMNS) + " "
+    "FROM (VALUES %s) AS v (id, " + ', '.join(DERIVED_COLUMNS) + ") WHERE p.id = v.id"
+)
+DERIVED_TEMPLATE = (
+    '(%s, %s::jsonb, %s::bytea' + ', %s::double precision' * (len(BBOX_COLUMNS) + len(METRIC_COLUMNS)) + ')'
+)
+
+# Объект, у которого не заполнена хотя бы одна производная колонка
+MISSING_SQL = (
+    "(coordinates_simplified IS NULL OR coordinates_packed IS NULL "
+    "OR bbox_min_lon IS NULL OR area_m2 IS NULL)"
+)
+
+BATCH_SQL = (
+    "SELECT id, coordinates FROM polygon_objects "
+    "WHERE id > %s AND " + MISSING_SQL + " ORDER BY id LIMIT %s"
+)
+
+MAX_BATCH_SIZE = 5000
+
+
+def backfill_settings(body: Dict[str, Any]) -> Tuple[int, Optional[str]]:
+    '''(batch_size, after) из тела запроса; бросает ValueError'''
+    batch_size = body.get('batch_size')
+    batch_size = int(batch_size if batch_size is not None else os.environ.get('BACKFILL_BATCH_SIZE', '500'))
+    if not 1 <= batch_size <= MAX_BATCH_SIZE:
+        raise ValueError(f'batch_size must be between 1 and {MAX_BATCH_SIZE}')
+    after = body.get('after')
+    if after is not None and not isinstance(after, str):
+        raise ValueError('after must be a polygon id')
+    return batch_size, after
+
+
+def update_derived(cur, rows: List[Tuple[str, Any]]) -> int:
+    '''
+    Пересчитывает производные колонки для пар (id, coordinates).
+    Возвращает число объектов с непригодной геометрией (метрики остаются пустыми)
+    '''
+    values = [
+        (polygon_id, Json(build_simplified_levels(coordinates)), encode_coordinates(coordinates))
+        + tuple(bbox_values(coordinates)) + tuple(metric_values(coordinates))
+        for polygon_id, coordinates in rows
+    ]
+    execute_values(cur, DERIVED_SQL, values, template=DERIVED_TEMPLATE, page_size=1000)
+    return sum(1 for row in values if row[-1] is None)
+
+
+def run_backfill(conn, batch_size: int, after: Optional[str] = None,
+                 time_budget: Optional[float] = None) -> Dict[str, Any]:
+    '''
+    Заполняет производные колонки объектов с id > after. Возвращает число
+    обработанных объектов (invalid — из них с непригодной геометрией, они остаются
+    незаполненными), скорость и курсор after; done=False значит, что бюджет
+    BACKFILL_TIME_BUDGET исчерпан и задание нужно вызвать ещё раз с этим after
+    '''
+    if time_budget is None:
+        time_budget = float(os.environ.get('BACKFILL_TIME_BUDGET', '20'))
+    started = time.monotonic()
+    total = invalid = 0
+    done = False
+    with conn.cursor() as cur:
+        while True:
+            cur.execute(BATCH_SQL, (after or '', batch_size))
+            rows = cur.fetchall()
+            if rows:
+                invalid += update_derived(cur, rows)
+            conn.commit()
+            if rows:
+                total += len(rows)
+                after = rows[-1][0]
+            if len(rows) < batch_size:
+                done = True
+                break
+            if time.monotonic() - started > time_budget:
+                break
+    elapsed = time.monotonic() - started
+    return {
+        'processed': total,
+        'invalid': invalid,
+        'done': done,
+        'after': after,
+        'elapsed_s': round(elapsed, 3),
+        'rows_per_s': round(total / elapsed, 1) if elapsed > 0 else None
+    }
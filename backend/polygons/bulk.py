@@ -0,0 +1,99 @@
+'''
+Массовое создание и обновление полигонов одной транзакцией (action=bulk).
+Строки пишутся через execute_values: один INSERT для новых объектов и один
+UPDATE ... FROM (VALUES ...) для существующих.
+'''
+
+import os
+from typing import Any, Dict, List, Optional, Tuple
+from psycopg2.extras import Json, execute_values
+from geometry import BBOX_COLUMNS, METRIC_COLUMNS, compute_bbox, metric_values, build_simplified_levels
+from packed import encode_coordinates
+
+# area необязательна: без неё берётся площадь, посчитанная по координатам
+REQUIRED_FIELDS = ('id', 'name', 'type', 'status', 'coordinates')
+
+# Колонки, которые задаёт элемент пакета (в порядке item_values)
+ITEM_COLUMNS = (
+    'id', 'name', 'type', 'area', 'population', 'status', 'coordinates', 'color', 'segment',
+    'visible', 'attributes', 'user_id', 'row_version', 'coordinates_simplified', 'coordinates_packed'
+) + BBOX_COLUMNS + METRIC_COLUMNS
+
+_ITEM_TYPES = (
+    'text', 'text', 'text', 'numeric', 'integer', 'text', 'jsonb', 'text', 'text',
+    'boolean', 'jsonb', 'text', 'bigint', 'jsonb', 'bytea'
+) + ('double precision',) * (len(BBOX_COLUMNS) + len(METRIC_COLUMNS))
+
+INSERT_SQL = (
+    "INSERT INTO polygon_objects (" + ', '.join(ITEM_COLUMNS) + ") VALUES %s "
+    "ON CONFLICT (id) DO NOTHING RETURNING id"
+)
+INSERT_TEMPLATE = '(' + ', '.join(['%s'] * len(ITEM_COLUMNS)) + ')'
+
+# user_id владельца при обновлении не меняется
+UPDATE_SQL = (
+    "UPDATE polygon_objects AS p SET " +
+    ', '.join(col + ' = v.' + col for col in ITEM_COLUMNS if col not in ('id', 'user_id')) +
+    ", updated_at = CURRENT_TIMESTAMP "
+    "FROM (VALUES %s) AS v (" + ', '.join(ITEM_COLUMNS) + ") "
+    "WHERE p.id = v.id RETURNING p.id"
+)
+# Типы явно, иначе в VALUES всё придёт как text
+UPDATE_TEMPLATE = '(' + ', '.join('%s::' + t for t in _ITEM_TYPES) + ')'
+
+
+def max_items() -> int:
+    return int(os.environ.get('BULK_MAX_ITEMS', '10000'))
+
+
+def item_segment(item: Dict[str, Any]) -> str:
+    return item.get('segment') or item.get('layer', '')
+
+
+def validate_item(item: Any) -> Optional[str]:
+    '''Текст ошибки для элемента пакета или None, если элемент корректен'''
+    if not isinstance(item, dict):
+        return 'Item must be an object'
+    missing = [f for f in REQUIRED_FIELDS if item.get(f) is None]
+    if missing:
+        return 'Missing fields: ' + ', '.join(missing)
+    if not isinstance(item['id'], str) or not item['id']:
+        return 'id must be a non-empty string'
+    try:
+        if item.get('area') is not None:
+            float(item['area'])
+        if item.get('population') is not None:
+            int(item['population'])
+        if compute_bbox(item['coordinates']) is None:
+            return 'coordinates must contain at least one point'
+    except (TypeError, ValueError):
+        return 'Invalid numeric value in area, population or coordinates'
+    return None
+
+
+def item_values(item: Dict[str, Any], color: str, user_id: str, version: int) -> Tuple:
+    '''Значения строки в порядке ITEM_COLUMNS'''
+    coordinates = item['coordinates']
+    metrics = metric_values(coordinates)
+    return (
+        item['id'], item['name'], item['type'], item['area'] if item.get('area') is not None else metrics[0],
+        item.get('population') or None, item['status'], Json(coordinates), color,
+        item_segment(item), bool(item.get('visible', True)), Json(item.get('attributes', {})),
+        user_id, version, Json(build_simplified_levels(coordinates)), encode_coordinates(coordinates)
+    ) + tuple(compute_bbox(coordinates)) + tuple(metrics)
+
+
+def insert_items(cur, rows: List[Tuple]) -> List[str]:
+    '''Вставляет новые объекты; возвращает id вставленных (занятые id пропускаются)'''
+    if not rows:
+        return []
+    result = execute_values(cur, INSERT_SQL, rows, template=INSERT_TEMPLATE, page_size=1000, fetch=True)
+    return [row['id'] for row in result]
+
+
+def update_items(cur, rows: List[Tuple]) -> List[str]:
+    '''Обновляет существующие объекты; возвращает id обновлённых'''
+    if not rows:
+        return []
+    result = execute_values(cur, UPDATE_SQL, rows, template=UPDATE_TEMPLATE, page_size=1000, fetch=True)
+    return [row['id'] for row in result]
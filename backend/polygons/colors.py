@@ -0,0 +1,77 @@
+'''
+Цвета сегментов и смешивание цветов объектов с несколькими сегментами.
+Таблица цветов кэшируется в процессе и перечитывается при смене версии
+сегментов (data_versions.segments увеличивает функция segments).
+'''
+
+import threading
+from typing import Dict, Optional, Tuple
+from data_version import get_versions, SEGMENTS_VERSION_NAME
+
+DEFAULT_COLOR = '#3b82f6'
+
+_lock = threading.Lock()
+_segment_colors: Dict[str, str] = {}
+_segments_version: Optional[int] = None
+# Кэш смешанных цветов: нормализованная комбинация сегментов -> цвет (None, если цветов нет)
+_blends: Dict[Tuple[str, ...], Optional[str]] = {}
+
+
+def hex_to_rgb(hex_color: str) -> tuple:
+    hex_color = hex_color.lstrip('#')
+    return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+
+
+def rgb_to_hex(r: int, g: int, b: int) -> str:
+    return f'#{r:02x}{g:02x}{b:02x}'
+
+
+def blend_colors(colors: list) -> str:
+    if not colors:
+        return DEFAULT_COLOR
+    if len(colors) == 1:
+        return colors[0]
+
+    rgb_colors = [hex_to_rgb(c) for c in colors]
+    avg_r = sum(r for r, g, b in rgb_colors) // len(rgb_colors)
+    avg_g = sum(g for r, g, b in rgb_colors) // len(rgb_colors)
+    avg_b = sum(b for r, g, b in rgb_colors) // len(rgb_colors)
+
+    return rgb_to_hex(avg_r, avg_g, avg_b)
+
+
+def get_segment_colors(cur, segments_version: Optional[int] = None) -> Dict[str, str]:
+    '''
+    Таблица имя сегмента -> цвет. Если версия сегментов уже известна вызывающему
+    (например, из get_versions для ETag), лишний запрос не выполняется
+    '''
+    global _segment_colors, _segments_version
+    if segments_version is None:
+        segments_version = get_versions(cur)[SEGMENTS_VERSION_NAME]
+    if segments_version == _segments_version:
+        return _segment_colors
+
+    cur.execute("SELECT name, color FROM segments")
+    colors = {seg['name']: seg['color'] for seg in cur.fetchall()}
+    with _lock:
+        _segment_colors = colors
+        _segments_version = segments_version
+        _blends.clear()
+    return colors
+
+
+def segment_color(segment: Optional[str], segment_colors: Dict[str, str], default: str) -> str:
+    '''Цвет объекта по его сегментам (через запятую); default, если цветов сегментов нет'''
+    if not segment:
+        return default
+    key = tuple(sorted(s.strip() for s in segment.split(',')))
+    # Мемоизация только для актуальной таблицы, чтобы не смешать версии
+    memo = _blends if segment_colors is _segment_colors else None
+    if memo is not None and key in memo:
+        blended = memo[key]
+    else:
+        colors = [segment_colors[s] for s in key if s in segment_colors]
+        blended = blend_colors(colors) if colors else None
+        if memo is not None:
+            memo[key] = blended
+    return blended if blended is not None else default
@@ -0,0 +1,47 @@
+'''
+Счётчики версий данных. Версия полигонов увеличивается в той же транзакции,
+что и изменение polygon_objects, и служит ключом инвалидации кэшей и
+дельта-синхронизации; версию сегментов увеличивает функция segments.
+'''
+
+from typing import Dict
+from db import execute_prepared
+
+DATA_VERSION_NAME = 'polygons'
+SEGMENTS_VERSION_NAME = 'segments'
+
+
+def get_data_version(cur) -> int:
+    '''Текущая версия данных полигонов'''
+    execute_prepared(cur, "SELECT version FROM data_versions WHERE name = %s", (DATA_VERSION_NAME,))
+    row = cur.fetchone()
+    return row['version'] if row else 0
+
+
+def get_versions(cur) -> Dict[str, int]:
+    '''Версии полигонов и сегментов одним запросом'''
+    execute_prepared(
+        cur,
+        "SELECT name, version FROM data_versions WHERE name IN (%s, %s)",
+        (DATA_VERSION_NAME, SEGMENTS_VERSION_NAME)
+    )
+    versions = {DATA_VERSION_NAME: 0, SEGMENTS_VERSION_NAME: 0}
+    for row in cur.fetchall():
+        versions[row['name']] = row['version']
+    return versions
+
+
+def bump_data_version(cur) -> int:
+    '''
+    Увеличивает версию полигонов и возвращает новое значение.
+    Вызывается в начале изменяющей транзакции: блокировка строки счётчика
+    упорядочивает коммиты по версиям
+    '''
+    execute_prepared(
+        cur,
+        "INSERT INTO data_versions (name, version, updated_at) VALUES (%s, 1, CURRENT_TIMESTAMP) "
+        "ON CONFLICT (name) DO UPDATE SET version = data_versions.version + 1, updated_at = CURRENT_TIMESTAMP "
+        "RETURNING version",
+        (DATA_VERSION_NAME,)
+    )
+    return cur.fetchone()['version']
@@ -0,0 +1,360 @@
+import math
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Координаты полигонов хранятся в нормализованном виде [x, y] в диапазоне 0..100:
+# x = (lng + 180) / 360 * 100, y = (90 - lat) / 180 * 100 (см. GeoImportDialog / YandexMap)
+
+BBox = Tuple[float, float, float, float]
+
+
+def normalized_to_lonlat(x: float, y: float) -> Tuple[float, float]:
+    '''Переводит нормализованную точку [x, y] в (lon, lat)'''
+    return x * 3.6 - 180, 90 - y * 1.8
+
+
+def is_multi_ring(coordinates: Any) -> bool:
+    '''Проверяет, хранит ли объект список колец, а не одно кольцо'''
+    return (
+        isinstance(coordinates, list) and len(coordinates) > 0
+        and isinstance(coordinates[0], list) and len(coordinates[0]) > 0
+        and isinstance(coordinates[0][0], list)
+    )
+
+
+def iter_rings(coordinates: Any) -> Iterator[List[List[float]]]:
+    '''Итерирует кольца полигона независимо от формата хранения'''
+    if not isinstance(coordinates, list) or not coordinates:
+        return
+    if is_multi_ring(coordinates):
+        for ring in coordinates:
+            if ring:
+                yield ring
+    else:
+        yield coordinates
+
+
+def compute_bbox(coordinates: Any) -> Optional[BBox]:
+    '''Возвращает охватывающий прямоугольник (min_lon, min_lat, max_lon, max_lat) или None'''
+    min_x = min_y = float('inf')
+    max_x = max_y = float('-inf')
+    for ring in iter_rings(coordinates):
+        for point in ring:
+            if not isinstance(point, (list, tuple)) or len(point) < 2:
+                continue
+            x, y = float(point[0]), float(point[1])
+            if x < min_x:
+                min_x = x
+            if x > max_x:
+                max_x = x
+            if y < min_y:
+                min_y = y
+            if y > max_y:
+                max_y = y
+    if min_x == float('inf'):
+        return None
+    min_lon, max_lat = normalized_to_lonlat(min_x, min_y)
+    max_lon, min_lat = normalized_to_lonlat(max_x, max_y)
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def parse_bbox(value: Optional[str]) -> Optional[BBox]:
+    '''Разбирает параметр bbox=minLon,minLat,maxLon,maxLat; бросает ValueError при ошибке'''
+    if value is None or value == '':
+        return None
+    parts = [p.strip() for p in value.split(',')]
+    if len(parts) != 4:
+        raise ValueError('bbox must be minLon,minLat,maxLon,maxLat')
+    min_lon, min_lat, max_lon, max_lat = (float(p) for p in parts)
+    if not all(math.isfinite(v) for v in (min_lon, min_lat, max_lon, max_lat)):
+        raise ValueError('bbox values must be finite numbers')
+    if min_lon > max_lon or min_lat > max_lat:
+        raise ValueError('bbox min values must not exceed max values')
+    return min_lon, min_lat, max_lon, max_lat
+
+
+BBOX_COLUMNS = ('bbox_min_lon', 'bbox_min_lat', 'bbox_max_lon', 'bbox_max_lat')
+
+# Пересечение сохранённого охвата полигона с окном карты; выражение совпадает
+# с GiST-индексом idx_polygon_objects_bbox, поэтому запрос идёт по индексу
+BBOX_OVERLAP_SQL = (
+    "box(point(bbox_min_lon, bbox_min_lat), point(bbox_max_lon, bbox_max_lat)) "
+    "&& box(point(%s, %s), point(%s, %s))"
+)
+
+
+def bbox_values(coordinates: Any) -> List[Optional[float]]:
+    '''Значения bbox-колонок (в порядке BBOX_COLUMNS) для параметров INSERT/UPDATE'''
+    bbox = compute_bbox(coordinates)
+    if not bbox:
+        return [None] * len(BBOX_COLUMNS)
+    return [float(v) for v in bbox]
+
+
+# Уровни упрощения геометрии: максимальный зум уровня -> допуск Дугласа–Пекера.
+# Допуск ~ размер пикселя на этом зуме в нормализованных единицах (100 / (256 * 2^zoom))
+SIMPLIFY_LEVELS = {zoom: 100 / (256 * 2 ** zoom) for zoom in (8, 11, 14)}
+
+
+def _segment_distance_sq(p: List[float], a: List[float], b: List[float]) -> float:
+    ax, ay = a[0], a[1]
+    dx, dy = b[0] - ax, b[1] - ay
+    if dx == 0 and dy == 0:
+        return (p[0] - ax) ** 2 + (p[1] - ay) ** 2
+    t = ((p[0] - ax) * dx + (p[1] - ay) * dy) / (dx * dx + dy * dy)
+    t = max(0.0, min(1.0, t))
+    return (p[0] - ax - t * dx) ** 2 + (p[1] - ay - t * dy) ** 2
+
+
+def _douglas_peucker(points: List[List[float]], tolerance: float) -> List[List[float]]:
+    '''Итеративный Дуглас–Пекер для ломаной (концы сохраняются)'''
+    if len(points) < 3:
+        return list(points)
+    tolerance_sq = tolerance * tolerance
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        max_dist, index = 0.0, 0
+        for i in range(first + 1, last):
+            dist = _segment_distance_sq(points[i], points[first], points[last])
+            if dist > max_dist:
+                max_dist, index = dist, i
+        if max_dist > tolerance_sq:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [p for p, k in zip(points, keep) if k]
+
+
+def simplify_ring(ring: List[List[float]], tolerance: float) -> List[List[float]]:
+    '''Упрощает незамкнутое кольцо, сохраняя минимум три вершины'''
+    if len(ring) <= 3:
+        return ring
+    start = ring[0]
+    far = max(range(1, len(ring)), key=lambda i: (ring[i][0] - start[0]) ** 2 + (ring[i][1] - start[1]) ** 2)
+    first_half = _douglas_peucker(ring[:far + 1], tolerance)
+    second_half = _douglas_peucker(ring[far:] + [start], tolerance)
+    simplified = first_half[:-1] + second_half[:-1]
+    return simplified if len(simplified) >= 3 else ring
+
+
+def simplify_coordinates(coordinates: Any, tolerance: float) -> Any:
+    '''Упрощает геометрию в том же формате хранения (кольцо или список колец)'''
+    if is_multi_ring(coordinates):
+        return [simplify_ring(ring, tolerance) for ring in coordinates]
+    if isinstance(coordinates, list) and coordinates:
+        return simplify_ring(coordinates, tolerance)
+    return coordinates
+
+
+def build_simplified_levels(coordinates: Any) -> Dict[str, Any]:
+    '''Предрасчёт упрощённых версий геометрии для всех уровней SIMPLIFY_LEVELS'''
+    levels = {}
+    source = coordinates
+    # От детального уровня к грубому: каждый следующий упрощает предыдущий результат
+    for zoom in sorted(SIMPLIFY_LEVELS, reverse=True):
+        source = simplify_coordinates(source, SIMPLIFY_LEVELS[zoom])
+        levels[str(zoom)] = source
+    return levels
+
+
+def pick_simplified_level(zoom: Optional[float] = None, tolerance: Optional[float] = None) -> Optional[str]:
+    '''
+    Выбирает ключ уровня упрощения по зуму карты или допуску;
+    None означает полную геометрию
+    '''
+    if zoom is not None:
+        for level_zoom in sorted(SIMPLIFY_LEVELS):
+            if zoom <= level_zoom:
+                return str(level_zoom)
+        return None
+    if tolerance is not None:
+        for level_zoom in sorted(SIMPLIFY_LEVELS):
+            if SIMPLIFY_LEVELS[level_zoom] <= tolerance:
+                return str(level_zoom)
+        return None
+    return None
+
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = EARTH_RADIUS_M * math.pi / 180
+
+
+def lonlat_to_normalized(lon: float, lat: float) -> Tuple[float, float]:
+    '''Обратное к normalized_to_lonlat'''
+    return (lon + 180) / 3.6, (90 - lat) / 1.8
+
+
+def _ring_contains(ring: List[List[float]], px: float, py: float) -> bool:
+    '''Правило чётности для одного кольца в нормализованных координатах'''
+    inside = False
+    prev = ring[-1]
+    for point in ring:
+        x1, y1 = point[0], point[1]
+        x2, y2 = prev[0], prev[1]
+        if (y1 > py) != (y2 > py) and px < (x2 - x1) * (py - y1) / (y2 - y1) + x1:
+            inside = not inside
+        prev = point
+    return inside
+
+
+def contains_point(coordinates: Any, lon: float, lat: float) -> bool:
+    '''
+    Попадает ли точка в полигон (правило чётности по всем кольцам,
+    поэтому внутренние кольца работают как дырки). Проверка идёт в нормализованных
+    координатах: перевод из lon/lat аффинный и на результат не влияет
+    '''
+    px, py = lonlat_to_normalized(lon, lat)
+    inside = False
+    for ring in iter_rings(coordinates):
+        if _ring_contains(ring, px, py):
+            inside = not inside
+    return inside
+
+
+def distance_to_polygon_m(coordinates: Any, lon: float, lat: float) -> Optional[float]:
+    '''
+    Расстояние от точки до полигона в метрах (0, если точка внутри); None для пустой геометрии.
+    Вершины проецируются на касательную плоскость в точке (равнопромежуточная проекция),
+    чего достаточно для радиусов поиска до десятков километров
+    '''
+    if contains_point(coordinates, lon, lat):
+        return 0.0
+    kx = METERS_PER_DEGREE * math.cos(math.radians(lat))
+    ky = METERS_PER_DEGREE
+    origin = [0.0, 0.0]
+    best = None
+    for ring in iter_rings(coordinates):
+        projected = []
+        for point in ring:
+            point_lon, point_lat = normalized_to_lonlat(point[0], point[1])
+            projected.append([(point_lon - lon) * kx, (point_lat - lat) * ky])
+        prev = projected[-1]
+        for point in projected:
+            dist = _segment_distance_sq(origin, prev, point)
+            if best is None or dist < best:
+                best = dist
+            prev = point
+    return math.sqrt(best) if best is not None else None
+
+
+def radius_bbox(lon: float, lat: float, radius_m: float) -> BBox:
+    '''Прямоугольник lon/lat, гарантированно покрывающий круг радиуса radius_m вокруг точки'''
+    dlat = radius_m / METERS_PER_DEGREE
+    dlon = dlat / max(math.cos(math.radians(lat)), 0.01)
+    return lon - dlon, max(lat - dlat, -90.0), lon + dlon, min(lat + dlat, 90.0)
+
+
+# Метрики геометрии, которые сервер считает при записи (V0026); area_m2 — геодезическая
+# площадь, в отличие от колонки area, которую задаёт клиент
+METRIC_COLUMNS = ('area_m2', 'perimeter_m', 'centroid_lon', 'centroid_lat')
+CENTROID_COLUMNS = ('centroid_lon', 'centroid_lat')
+
+# Площадь считается на сфере радиуса WGS84, как turf.area на клиенте
+WGS84_RADIUS_M = 6378137.0
+
+
+def _ring_metrics(ring: List[List[float]]) -> Optional[Tuple[float, float, float, float, int]]:
+    '''(площадь м², периметр м, lon и lat центроида, число вершин) одного кольца за один проход по рёбрам'''
+    points = [p for p in ring if isinstance(p, (list, tuple)) and len(p) >= 2]
+    if len(points) > 1 and points[0][0] == points[-1][0] and points[0][1] == points[-1][1]:
+        points = points[:-1]
+    n = len(points)
+    if not n:
+        return None
+    lons = [float(p[0]) * 3.6 - 180 for p in points]
+    lats = [90 - float(p[1]) * 1.8 for p in points]
+    lam = [math.radians(v) for v in lons]
+    phi = [math.radians(v) for v in lats]
+    sin_phi = [math.sin(v) for v in phi]
+    cos_phi = [math.cos(v) for v in phi]
+    # Центроид считается в равнопромежуточной проекции вокруг средней широты
+    kx = math.cos(math.radians(sum(lats) / n))
+    xs = [v * kx for v in lons]
+
+    excess = half_chords = double_area = cx = cy = 0.0
+    j = n - 1
+    for i in range(n):
+        dl = lam[i] - lam[j]
+        # Сферический избыток (Chamberlain–Duquette, как turf.area)
+        excess += dl * (sin_phi[j] + sin_phi[i])
+        # Гаверсинус ребра
+        half_chords += math.asin(min(1.0, math.sqrt(
+            math.sin((phi[i] - phi[j]) / 2) ** 2 + cos_phi[j] * cos_phi[i] * math.sin(dl / 2) ** 2
+        )))
+        cross = xs[j] * lats[i] - xs[i] * lats[j]
+        double_area += cross
+        cx += (xs[j] + xs[i]) * cross
+        cy += (lats[j] + lats[i]) * cross
+        j = i
+
+    area = abs(excess) * WGS84_RADIUS_M ** 2 / 2 if n >= 3 else 0.0
+    # У отрезка замыкающее ребро совпадает с единственным
+    perimeter = 2 * EARTH_RADIUS_M * half_chords / (2 if n == 2 else 1)
+    if n >= 3 and abs(double_area) > 1e-18:
+        lon, lat = cx / (3 * double_area) / kx, cy / (3 * double_area)
+    else:
+        lon, lat = sum(lons) / n, sum(lats) / n
+    return area, perimeter, lon, lat, n
+
+
+def _ring_signs(rings: List[List[List[float]]]) -> List[int]:
+    '''
+    +1 для внешнего кольца, -1 для дырки: по чётности числа колец, внутри которых
+    лежит первая вершина кольца (то же правило, что в contains_point)
+    '''
+    boxes = []
+    for ring in rings:
+        xs, ys = [p[0] for p in ring], [p[1] for p in ring]
+        boxes.append((min(xs), min(ys), max(xs), max(ys)))
+    signs = []
+    for i, ring in enumerate(rings):
+        px, py = ring[0][0], ring[0][1]
+        depth = 0
+        for j, other in enumerate(rings):
+            box = boxes[j]
+            if j != i and box[0] <= px <= box[2] and box[1] <= py <= box[3] and _ring_contains(other, px, py):
+                depth += 1
+        signs.append(-1 if depth % 2 else 1)
+    return signs
+
+
+def compute_metrics(coordinates: Any) -> Optional[Tuple[float, float, float, float]]:
+    '''
+    (площадь м², периметр м, lon и lat центроида). Кольца разбираются по правилу
+    чётности, как в contains_point: отдельные части (импорт мультиполигонов) складываются,
+    кольцо внутри другого — дырка и вычитается. Периметр — сумма длин всех колец,
+    центроид взвешивается по площади со знаком. None для пустой геометрии
+    '''
+    rings, parts = [], []
+    for ring in iter_rings(coordinates):
+        metrics = _ring_metrics(ring)
+        if metrics:
+            rings.append([p for p in ring if isinstance(p, (list, tuple)) and len(p) >= 2])
+            parts.append(metrics)
+    if not parts:
+        return None
+    signs = _ring_signs(rings) if len(rings) > 1 else [1]
+    area = sum(sign * m[0] for sign, m in zip(signs, parts))
+    perimeter = sum(m[1] for m in parts)
+    if area > 0:
+        lon = sum(sign * m[0] * m[2] for sign, m in zip(signs, parts)) / area
+        lat = sum(sign * m[0] * m[3] for sign, m in zip(signs, parts)) / area
+    else:
+        area = 0.0
+        count = sum(m[4] for m in parts)
+        lon = sum(m[2] * m[4] for m in parts) / count
+        lat = sum(m[3] * m[4] for m in parts) / count
+    return area, perimeter, lon, lat
+
+
+def metric_values(coordinates: Any) -> List[Optional[float]]:
+    '''Значения колонок METRIC_COLUMNS для параметров INSERT/UPDATE'''
+    try:
+        metrics = compute_metrics(coordinates)
+    except (TypeError, ValueError):
+        metrics = None
+    if not metrics:
+        return [None] * len(METRIC_COLUMNS)
+    return [float(v) for v in metrics]
@@ -1,10 +1,35 @@
+import base64
+import io
 import json
 import os
 from typing import Dict, Any
 from decimal import Decimal
 from datetime import datetime
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, Json
+from db import get_connection, release_connection, execute_prepared
+from geometry import parse_bbox, bbox_values, metric_values, BBOX_COLUMNS, METRIC_COLUMNS, BBOX_OVERLAP_SQL, build_simplified_levels, pick_simplified_level
+from permissions import load_read_access, read_filter_sql
+from listing import parse_fields, parse_limit, select_columns, project_row, apply_simplified, encode_cursor, decode_cursor
+from data_version import get_data_version, get_versions, bump_data_version
+from colors import get_segment_colors, segment_color
+from sync import filter_hash, make_sync_token, parse_sync_token, make_etag, etag_matches
+from tiles import parse_tile, tile_bounds, build_tile, get_cached_tile, put_cached_tile, invalidate_tile_cache
+from streaming import open_stream_cursor, write_rows, encode_value, lod_column_sql
+from bulk import max_items as bulk_max_items, item_segment, validate_item, item_values, insert_items, update_items
+from audit import AuditLog
+import trash
+from stats import parse_group_by, load_stats
+from spatial import parse_point, parse_radius, find_at, find_near
+from search import DEFAULT_SEARCH_LIMIT, parse_query, parse_attribute, search_polygons
+from packed import wants_packed, pack_row, encode_coordinates
+from backfill import backfill_settings, run_backfill
+
+BBOX_COLUMNS_SQL = ', '.join(BBOX_COLUMNS)
+METRIC_COLUMNS_SQL = ', '.join(METRIC_COLUMNS)
+
+USER_ROLE_SQL = "SELECT role FROM users WHERE id = %s"
+POLYGON_BY_ID_SQL = "SELECT * FROM polygon_objects WHERE id = %s"
+TRASH_DELETE_SQL = "DELETE FROM trash_polygons WHERE id = %s"
 
 def json_serializer(obj):
     if isinstance(obj, Decimal):
@@ -13,28 +38,8 @@ def json_serializer(obj):
         return obj.isoformat()
     raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
 
-def hex_to_rgb(hex_color: str) -> tuple:
-    hex_color = hex_color.lstrip('#')
-    return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-
-def rgb_to_hex(r: int, g: int, b: int) -> str:
-    return f'#{r:02x}{g:02x}{b:02x}'
-
-def blend_colors(colors: list) -> str:
-    if not colors:
-        return '#3b82f6'
-    if len(colors) == 1:
-        return colors[0]
-    
-    rgb_colors = [hex_to_rgb(c) for c in colors]
-    avg_r = sum(r for r, g, b in rgb_colors) // len(rgb_colors)
-    avg_g = sum(g for r, g, b in rgb_colors) // len(rgb_colors)
-    avg_b = sum(b for r, g, b in rgb_colors) // len(rgb_colors)
-    
-    return rgb_to_hex(avg_r, avg_g, avg_b)
-
 def check_permission(cur, user_id: str, resource_type: str, resource_id: str = None, required_level: str = 'read') -> bool:
-    cur.execute("SELECT role FROM users WHERE id = '" + user_id.replace("'", "''") + "'")
+    execute_prepared(cur, USER_ROLE_SQL, (user_id,))
     user = cur.fetchone()
     
     if not user:
@@ -44,17 +49,19 @@ def check_permission(cur, user_id: str, resource_type: str, resource_id: str = N
         return True
     
     if resource_id:
-        cur.execute(
-            "SELECT permission_level FROM permissions WHERE user_id = '" + user_id.replace("'", "''") + "' "
-            "AND resource_type = '" + resource_type.replace("'", "''") + "' "
-            "AND (resource_id = '" + resource_id.replace("'", "''") + "' OR resource_id IS NULL) "
-            "AND permission_level != 'revoked' ORDER BY resource_id DESC LIMIT 1"
+        execute_prepared(
+            cur,
+            "SELECT permission_level FROM permissions WHERE user_id = %s AND resource_type = %s "
+            "AND (resource_id = %s OR resource_id IS NULL) "
+            "AND permission_level != 'revoked' ORDER BY resource_id DESC LIMIT 1",
+            (user_id, resource_type, resource_id)
         )
     else:
-        cur.execute(
-            "SELECT permission_level FROM permissions WHERE user_id = '" + user_id.replace("'", "''") + "' "
-            "AND resource_type = '" + resource_type.replace("'", "''") + "' "
-            "AND resource_id IS NULL AND permission_level != 'revoked' LIMIT 1"
+        execute_prepared(
+            cur,
+            "SELECT permission_level FROM permissions WHERE user_id = %s AND resource_type = %s "
+            "AND resource_id IS NULL AND permission_level != 'revoked' LIMIT 1",
+            (user_id, resource_type)
         )
     
     perm = cur.fetchone()
@@ -79,17 +86,6 @@ def check_permission(cur, user_id: str, resource_type: str, resource_id: str = N
     
     return False
 
-def log_action(cur, conn, user_id: str, action: str, resource_type: str, resource_id: str = None, details: str = None):
-    details_sql = "'" + details.replace("'", "''") + "'" if details else 'NULL'
-    resource_id_sql = "'" + resource_id.replace("'", "''") + "'" if resource_id else 'NULL'
-    
-    cur.execute(
-        "INSERT INTO audit_log (user_id, action, resource_type, resource_id, details) "
-        "VALUES ('" + user_id.replace("'", "''") + "', '" + action.replace("'", "''") + "', "
-        "'" + resource_type.replace("'", "''") + "', " + resource_id_sql + ", " + details_sql + ")"
-    )
-    conn.commit()
-
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: CRUD операции с полигональными объектами карты
@@ -105,7 +101,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token, Cache-Control, Pragma, Expires',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token, Cache-Control, Pragma, Expires, If-None-Match',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
@@ -128,17 +124,110 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     try:
-        conn = psycopg2.connect(database_url)
+        conn = get_connection()
         cur = conn.cursor(cursor_factory=RealDictCursor)
+        audit = AuditLog(user_id)
         
         if method == 'GET':
             source = event.get('queryStringParameters', {}).get('source', 'active')
             polygon_id = event.get('queryStringParameters', {}).get('id')
             
+            params = event.get('queryStringParameters', {})
+            paginated = 'limit' in params or 'cursor' in params
+            
+            try:
+                bbox = parse_bbox(params.get('bbox'))
+                fields = parse_fields(params.get('fields'))
+                limit = parse_limit(params.get('limit')) if paginated else None
+                cursor_key = decode_cursor(params['cursor']) if params.get('cursor') else None
+                simplified_level = pick_simplified_level(
+                    zoom=float(params['zoom']) if params.get('zoom') else None,
+                    tolerance=float(params['tolerance']) if params.get('tolerance') else None
+                )
+                tile = parse_tile(event)
+                packed = wants_packed(params, event.get('headers', {}) or {})
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Invalid query parameters: ' + str(e)})
+                }
+            
             print(f"DEBUG GET: user_id={user_id}, polygon_id={polygon_id}, source={source}")
             
+            if params.get('action') == 'stats':
+                try:
+                    group_by = parse_group_by(params.get('group_by'))
+                except ValueError as e:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Invalid query parameters: ' + str(e)})
+                    }
+                
+                access = load_read_access(cur, user_id)
+                where_sql, where_params = read_filter_sql(access, user_id)
+                result = load_stats(cur, group_by, where_sql, where_params)
+                result['version'] = get_data_version(cur)
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps(result)
+                }
+            
+            if 'q' in params or params.get('attr'):
+                try:
+                    query = parse_query(params.get('q'))
+                    attribute = parse_attribute(params.get('attr'))
+                    search_limit = parse_limit(params.get('limit') or str(DEFAULT_SEARCH_LIMIT))
+                except ValueError as e:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Invalid query parameters: ' + str(e)})
+                    }
+                
+                access = load_read_access(cur, user_id)
+                where_sql, where_params = read_filter_sql(access, user_id)
+                found = search_polygons(cur, query, attribute, fields, search_limit, where_sql, where_params)
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps(found, default=json_serializer)
+                }
+            
+            if params.get('at') or params.get('near'):
+                try:
+                    if params.get('at'):
+                        lon, lat = parse_point(params['at'])
+                    else:
+                        lon, lat = parse_point(params['near'])
+                        radius = parse_radius(params.get('radius'))
+                    spatial_limit = parse_limit(params.get('limit'))
+                except ValueError as e:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Invalid query parameters: ' + str(e)})
+                    }
+                
+                access = load_read_access(cur, user_id)
+                where_sql, where_params = read_filter_sql(access, user_id)
+                if params.get('at'):
+                    found = find_at(cur, lon, lat, fields, spatial_limit, where_sql, where_params)
+                else:
+                    found = find_near(cur, lon, lat, radius, fields, spatial_limit, where_sql, where_params)
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps(found, default=json_serializer)
+                }
+            
             if source == 'trash':
-                cur.execute("SELECT role FROM users WHERE id = '" + user_id.replace("'", "''") + "'")
+                execute_prepared(cur, USER_ROLE_SQL, (user_id,))
                 user = cur.fetchone()
                 
                 if not user or user['role'] != 'admin':
@@ -151,7 +240,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 cur.execute("SELECT * FROM trash_polygons ORDER BY moved_to_trash_at DESC")
                 trash_results = cur.fetchall()
                 
-                trash_items = [dict(row) for row in trash_results]
+                trash_items = [project_row(dict(row), None) for row in trash_results]
                 
                 return {
                     'statusCode': 200,
@@ -165,10 +254,43 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'body': json.dumps(trash_items, default=json_serializer)
                 }
             
+            if tile:
+                z, x, y = tile
+                access = load_read_access(cur, user_id)
+                where_sql, where_params = read_filter_sql(access, user_id)
+                # Кэш ключуется версией данных и фильтром видимости пользователя
+                cache_key = (z, x, y, get_data_version(cur), where_sql, json.dumps(where_params))
+                tile_bytes = get_cached_tile(cache_key)
+                
+                if tile_bytes is None:
+                    cur.execute(
+                        "SELECT id, name, color, coordinates, coordinates_simplified FROM polygon_objects "
+                        "WHERE " + where_sql + " AND " + BBOX_OVERLAP_SQL,
+                        where_params + list(tile_bounds(z, x, y))
+                    )
+                    level = pick_simplified_level(zoom=z)
+                    rows = []
+                    for row in cur.fetchall():
+                        row = dict(row)
+                        apply_simplified(row, level)
+                        rows.append(row)
+                    
+                    tile_bytes = build_tile(rows, z, x, y)
+                    put_cached_tile(cache_key, tile_bytes)
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/vnd.mapbox-vector-tile',
+                        'Access-Control-Allow-Origin': '*',
+                        'Cache-Control': 'no-cache'
+                    },
+                    'isBase64Encoded': True,
+                    'body': base64.b64encode(tile_bytes).decode('ascii')
+                }
+            
             if polygon_id:
-                cur.execute(
-                    "SELECT * FROM polygon_objects WHERE id = '" + polygon_id.replace("'", "''") + "'"
-                )
+                execute_prepared(cur, POLYGON_BY_ID_SQL, (polygon_id,))
                 result = cur.fetchone()
                 
                 if not result:
@@ -187,6 +309,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'body': json.dumps({'error': 'Access denied'})
                         }
                 
+                result = dict(result)
+                if packed:
+                    pack_row(result)
+                
                 return {
                     'statusCode': 200,
                     'headers': {
@@ -196,59 +322,261 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'Pragma': 'no-cache',
                         'Expires': '0'
                     },
-                    'body': json.dumps(dict(result), default=json_serializer)
+                    'body': json.dumps(project_row(result, None), default=json_serializer)
                 }
             else:
-                cur.execute("SELECT id, name, color FROM segments")
-                segments = cur.fetchall()
-                segment_colors = {seg['name']: seg['color'] for seg in segments}
-                
-                cur.execute("SELECT * FROM polygon_objects ORDER BY created_at DESC")
-                all_results = cur.fetchall()
+                # Права пользователя резолвятся один раз, видимость фильтруется в SQL
+                access = load_read_access(cur, user_id)
+                visibility_sql, visibility_params = read_filter_sql(access, user_id)
+                versions = get_versions(cur)
+                visibility_hash = filter_hash(visibility_sql, visibility_params)
+                sync_token = make_sync_token(versions, visibility_hash)
+                # Формат может прийти в Accept, поэтому явно входит в ETag
+                etag = make_etag(sync_token, dict(params, format='packed' if packed else 'json'))
+                
+                list_headers = {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Expose-Headers': 'ETag',
+                    'Cache-Control': 'no-cache',
+                    'Vary': 'Accept',
+                    'ETag': etag
+                }
                 
-                print(f"DEBUG: Total polygons in DB: {len(all_results)}")
-                if all_results:
-                    print(f"DEBUG: First polygon user_id: {all_results[0].get('user_id')}")
+                if etag_matches(event, etag):
+                    return {
+                        'statusCode': 304,
+                        'headers': list_headers,
+                        'body': ''
+                    }
                 
-                filtered_results = []
-                for row in all_results:
-                    if row['user_id'] == user_id or row['user_id'] is None:
+                since = None
+                if params.get('since'):
+                    try:
+                        since_polygons, since_segments, since_hash = parse_sync_token(params['since'])
+                    except ValueError as e:
+                        return {
+                            'statusCode': 400,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'body': json.dumps({'error': str(e)})
+                        }
+                    # Дельта возможна, только если не менялись цвета сегментов и права пользователя;
+                    # иначе клиент получает полный список с full=true
+                    if since_segments == versions['segments'] and since_hash == visibility_hash:
+                        since = since_polygons
+                
+                if since is not None:
+                    # Изменённые строки выбираются без фильтра видимости: ставшие недоступными
+                    # уходят клиенту как удалённые. Дельта обычно мала, поэтому собирается в памяти
+                    cur.execute(
+                        "SELECT " + select_columns(fields, simplified_level is not None, packed) + ", (" + visibility_sql + ") AS readable "
+                        "FROM polygon_objects WHERE row_version > %s ORDER BY created_at DESC, id DESC",
+                        list(visibility_params) + [since]
+                    )
+                    changed = []
+                    deleted_ids = []
+                    for row in cur.fetchall():
+                        if not row['readable']:
+                            deleted_ids.append(row['id'])
+                            continue
                         polygon_dict = dict(row)
-                        if polygon_dict.get('segment'):
-                            segments_list = [s.strip() for s in polygon_dict['segment'].split(',')]
-                            colors = [segment_colors[s] for s in segments_list if s in segment_colors]
-                            if colors:
-                                polygon_dict['color'] = blend_colors(colors)
-                        filtered_results.append(polygon_dict)
-                    else:
-                        segment_name = row.get('segment') or row.get('layer', '')
-                        if check_permission(cur, user_id, 'layer', segment_name, 'read'):
-                            polygon_dict = dict(row)
-                            if polygon_dict.get('segment'):
-                                segments_list = [s.strip() for s in polygon_dict['segment'].split(',')]
-                                colors = [segment_colors[s] for s in segments_list if s in segment_colors]
-                                if colors:
-                                    polygon_dict['color'] = blend_colors(colors)
-                            filtered_results.append(polygon_dict)
-                
-                print(f"DEBUG: Filtered polygons: {len(filtered_results)}")
+                        polygon_dict.pop('readable')
+                        apply_simplified(polygon_dict, simplified_level)
+                        if packed:
+                            pack_row(polygon_dict, use_stored=simplified_level is None)
+                        changed.append(project_row(polygon_dict, fields))
+                    
+                    cur.execute("SELECT id FROM polygon_tombstones WHERE version > %s", (since,))
+                    deleted_ids.extend(row['id'] for row in cur.fetchall())
+                    
+                    return {
+                        'statusCode': 200,
+                        'headers': list_headers,
+                        'body': json.dumps({
+                            'version': sync_token,
+                            'full': False,
+                            'items': changed,
+                            'deleted': deleted_ids
+                        }, default=json_serializer)
+                    }
+                
+                where_sql, where_params = visibility_sql, list(visibility_params)
+                if bbox:
+                    where_sql += " AND " + BBOX_OVERLAP_SQL
+                    where_params += list(bbox)
+                if cursor_key:
+                    where_sql += " AND (created_at, id) < (%s, %s)"
+                    where_params += list(cursor_key)
+                
+                columns_sql = select_columns(fields, packed=packed and simplified_level is None)
+                if simplified_level is not None and (fields is None or 'coordinates' in fields):
+                    columns_sql += ", " + lod_column_sql(simplified_level)
+                
+                # Keyset-пагинация по (created_at, id); берём на одну строку больше,
+                # чтобы узнать, есть ли следующая страница
+                sql = (
+                    "SELECT " + columns_sql + " FROM polygon_objects WHERE " + where_sql +
+                    " ORDER BY created_at DESC, id DESC"
+                )
+                if limit:
+                    sql += " LIMIT %s"
+                    where_params.append(limit + 1)
+                
+                # Полный список пишется в буфер прямо из серверного курсора, без списка словарей
+                out = io.StringIO()
+                if 'since' in params:
+                    out.write('{"version": ' + encode_value(sync_token) + ', "full": true, "items": [')
+                elif paginated:
+                    out.write('{"items": [')
+                else:
+                    out.write('[')
+                
+                stream_cur = open_stream_cursor(conn, sql, where_params)
+                try:
+                    count, last_key = write_rows(out, stream_cur, fields, limit, packed)
+                finally:
+                    stream_cur.close()
+                
+                if 'since' in params:
+                    out.write('], "deleted": []}')
+                elif paginated:
+                    next_cursor = encode_cursor(*last_key) if last_key else None
+                    out.write('], "next_cursor": ' + encode_value(next_cursor) + '}')
+                else:
+                    out.write(']')
+                
+                print(f"DEBUG: Filtered polygons: {count}")
                 
                 return {
                     'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*',
-                        'Cache-Control': 'no-cache, no-store, must-revalidate',
-                        'Pragma': 'no-cache',
-                        'Expires': '0'
-                    },
-                    'body': json.dumps(filtered_results, default=json_serializer)
+                    'headers': list_headers,
+                    'body': out.getvalue()
                 }
         
         elif method == 'POST':
             body = json.loads(event.get('body', '{}'))
             action = body.get('action', 'create')
             
+            if action == 'backfill_geometry':
+                execute_prepared(cur, USER_ROLE_SQL, (user_id,))
+                user = cur.fetchone()
+                
+                if not user or user['role'] != 'admin':
+                    return {
+                        'statusCode': 403,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Only admin can run geometry backfill'})
+                    }
+                
+                try:
+                    batch_size, after = backfill_settings(body)
+                except ValueError as e:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': str(e)})
+                    }
+                
+                result = run_backfill(conn, batch_size, after)
+                backfilled = result['processed'] > result['invalid']
+                if backfilled:
+                    # Меняется содержимое ответов (метрики, упрощённая геометрия тайлов), но не
+                    # row_version: сбрасываем ETag и кэш тайлов, дельта-синхронизацию не трогаем
+                    bump_data_version(cur)
+                audit.add('backfill_geometry', 'polygon', None, json.dumps(result))
+                audit.flush(cur)
+                conn.commit()
+                if backfilled:
+                    invalidate_tile_cache()
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps(result)
+                }
+            
+            if action == 'move_to_trash' or (action == 'restore_from_trash' and 'id' not in body):
+                restore = action == 'restore_from_trash'
+                try:
+                    where_sql, where_params, requested_ids = trash.parse_selection(body, 'layer' if restore else 'segment')
+                except ValueError as e:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': str(e)})
+                    }
+                
+                execute_prepared(cur, USER_ROLE_SQL, (user_id,))
+                user = cur.fetchone()
+                is_admin = bool(user) and user['role'] == 'admin'
+                
+                if restore and not is_admin:
+                    return {
+                        'statusCode': 403,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Only admin can restore from trash'})
+                    }
+                
+                version = bump_data_version(cur)
+                if restore:
+                    segment_colors = get_segment_colors(cur)
+                    layer_colors = {}
+                    for layer in trash.trash_layers(cur, where_sql, where_params):
+                        color = segment_color(layer, segment_colors, None)
+                        if color:
+                            layer_colors[layer] = color
+                    done = trash.restore_from_trash(cur, where_sql, where_params, version, layer_colors)
+                elif is_admin:
+                    done = trash.move_to_trash(cur, where_sql, where_params, user_id, version)
+                else:
+                    # Чужие объекты переносятся только из сегментов с правом delete
+                    allowed_segments = trash.deletable_segments(
+                        cur, where_sql, where_params, user_id,
+                        lambda segment: check_permission(cur, user_id, 'layer', segment, 'delete')
+                    )
+                    done = trash.move_to_trash(
+                        cur, "(" + where_sql + ") AND (user_id = %s OR COALESCE(segment, '') = ANY(%s))",
+                        where_params + [user_id, allowed_segments], user_id, version
+                    )
+                
+                for row in done:
+                    if restore:
+                        audit.add('restore_from_trash', 'polygon', row['id'], 'Restored: ' + row['name'])
+                    else:
+                        audit.add('move_to_trash', 'polygon', row['id'], 'Moved to trash: ' + row['name'])
+                audit.flush(cur)
+                
+                # Что осталось от выборки: в корзине — id, занятые новыми объектами,
+                # среди объектов — чужие объекты без права на удаление
+                cur.execute(
+                    "SELECT id FROM " + ('trash_polygons' if restore else 'polygon_objects') + " WHERE " + where_sql,
+                    where_params
+                )
+                skipped = [
+                    {'id': row['id'], 'error': 'Object with this id already exists' if restore else 'No permission to delete this object'}
+                    for row in cur.fetchall()
+                ]
+                if requested_ids:
+                    found = {row['id'] for row in done} | {item['id'] for item in skipped}
+                    skipped.extend(
+                        {'id': polygon_id, 'error': 'Polygon not found in trash' if restore else 'Polygon not found'}
+                        for polygon_id in requested_ids if polygon_id not in found
+                    )
+                
+                conn.commit()
+                if done:
+                    invalidate_tile_cache()
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({
+                        'restored' if restore else 'moved': len(done),
+                        'ids': [row['id'] for row in done],
+                        'skipped': skipped
+                    })
+                }
+            
             if action == 'restore_from_trash':
                 polygon_id = body.get('id')
                 
@@ -259,7 +587,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'body': json.dumps({'error': 'Polygon ID required'})
                     }
                 
-                cur.execute("SELECT role FROM users WHERE id = '" + user_id.replace("'", "''") + "'")
+                execute_prepared(cur, USER_ROLE_SQL, (user_id,))
                 user = cur.fetchone()
                 
                 if not user or user['role'] != 'admin':
@@ -269,9 +597,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'body': json.dumps({'error': 'Only admin can restore from trash'})
                     }
                 
-                cur.execute(
-                    "SELECT * FROM trash_polygons WHERE id = '" + polygon_id.replace("'", "''") + "'"
-                )
+                cur.execute("SELECT name, layer FROM trash_polygons WHERE id = %s", (polygon_id,))
                 trash_item = cur.fetchone()
                 
                 if not trash_item:
@@ -281,36 +607,118 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'body': json.dumps({'error': 'Polygon not found in trash'})
                     }
                 
-                cur.execute(
-                    "INSERT INTO polygon_objects (id, name, type, area, population, status, coordinates, color, layer, visible, attributes, user_id, created_at) "
-                    "VALUES ('" + trash_item['id'].replace("'", "''") + "', "
-                    "'" + trash_item['name'].replace("'", "''") + "', "
-                    "'" + trash_item['type'].replace("'", "''") + "', "
-                    "" + (str(trash_item['area']) if trash_item.get('area') else 'NULL') + ", "
-                    "" + (str(trash_item['population']) if trash_item.get('population') else 'NULL') + ", "
-                    "'" + trash_item['status'].replace("'", "''") + "', "
-                    "'" + json.dumps(trash_item['coordinates']).replace("'", "''") + "', "
-                    "'" + trash_item['color'].replace("'", "''") + "', "
-                    "'" + trash_item['layer'].replace("'", "''") + "', "
-                    "" + str(trash_item.get('visible', True)).lower() + ", "
-                    "'" + json.dumps(trash_item.get('attributes', {})).replace("'", "''") + "', "
-                    "'" + trash_item['user_id'].replace("'", "''") + "', "
-                    "'" + trash_item['original_created_at'].isoformat() + "') "
-                    "RETURNING *"
-                )
-                restored = cur.fetchone()
+                version = bump_data_version(cur)
+                restored_color = segment_color(trash_item['layer'], get_segment_colors(cur), None)
+                layer_colors = {trash_item['layer']: restored_color} if restored_color else {}
                 
-                cur.execute(
-                    "DELETE FROM trash_polygons WHERE id = '" + polygon_id.replace("'", "''") + "'"
-                )
+                if not trash.restore_from_trash(cur, "id = %s", [polygon_id], version, layer_colors):
+                    conn.rollback()
+                    return {
+                        'statusCode': 409,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Object with this id already exists'})
+                    }
+                
+                execute_prepared(cur, POLYGON_BY_ID_SQL, (polygon_id,))
+                restored = cur.fetchone()
+                audit.add('restore_from_trash', 'polygon', polygon_id, 'Restored: ' + trash_item['name'])
+                audit.flush(cur)
                 conn.commit()
+                invalidate_tile_cache()
                 
-                log_action(cur, conn, user_id, 'restore_from_trash', 'polygon', polygon_id, 'Restored: ' + trash_item['name'])
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps(project_row(dict(restored), None), default=json_serializer)
+                }
+            
+            if action == 'bulk':
+                items = body.get('items')
+                if not isinstance(items, list) or not items:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'items must be a non-empty array'})
+                    }
+                if len(items) > bulk_max_items():
+                    return {
+                        'statusCode': 413,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': f'Too many items, limit is {bulk_max_items()}'})
+                    }
+                
+                results = [{'index': i, 'id': item.get('id') if isinstance(item, dict) else None} for i, item in enumerate(items)]
+                valid = []
+                seen_ids = set()
+                for i, item in enumerate(items):
+                    error = validate_item(item)
+                    if not error and item['id'] in seen_ids:
+                        error = 'Duplicate id in request'
+                    if error:
+                        results[i].update(status='error', error=error)
+                    else:
+                        seen_ids.add(item['id'])
+                        valid.append(i)
+                
+                existing = {}
+                if seen_ids:
+                    cur.execute("SELECT id, user_id, segment FROM polygon_objects WHERE id = ANY(%s)", (list(seen_ids),))
+                    existing = {row['id']: row for row in cur.fetchall()}
+                
+                # Права проверяются один раз на каждый сегмент пакета
+                segments = {item_segment(items[i]) for i in valid}
+                segments.update(row['segment'] or '' for row in existing.values() if row['user_id'] != user_id)
+                writable = {seg: check_permission(cur, user_id, 'layer', seg, 'write') for seg in segments}
+                
+                segment_colors = get_segment_colors(cur)
+                accepted = []
+                for i in valid:
+                    item = items[i]
+                    segment = item_segment(item)
+                    current = existing.get(item['id'])
+                    if not writable[segment] or (current and current['user_id'] != user_id and not writable[current['segment'] or '']):
+                        results[i].update(status='error', error='No permission to write objects in this segment')
+                        continue
+                    results[i]['color'] = segment_color(segment, segment_colors, item.get('color', '#3b82f6'))
+                    accepted.append(i)
+                
+                insert_rows, update_rows = [], []
+                if accepted:
+                    version = bump_data_version(cur)
+                    for i in accepted:
+                        row = item_values(items[i], results[i]['color'], user_id, version)
+                        (update_rows if items[i]['id'] in existing else insert_rows).append(row)
+                
+                created = set(insert_items(cur, insert_rows))
+                updated = set(update_items(cur, update_rows))
+                
+                for i in accepted:
+                    result = results[i]
+                    if result['id'] in created:
+                        result['status'] = 'created'
+                        audit.add('create_object', 'polygon', result['id'], 'Created ' + items[i]['name'])
+                    elif result['id'] in updated:
+                        result['status'] = 'updated'
+                        audit.add('update_object', 'polygon', result['id'], 'Updated ' + items[i]['name'])
+                    else:
+                        # id занят строкой, появившейся после проверки существующих
+                        result.pop('color', None)
+                        result.update(status='error', error='Object was created concurrently, retry the item')
+                audit.flush(cur)
+                
+                conn.commit()
+                if created or updated:
+                    invalidate_tile_cache()
                 
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps(dict(restored), default=json_serializer)
+                    'body': json.dumps({
+                        'created': len(created),
+                        'updated': len(updated),
+                        'failed': sum(1 for r in results if r['status'] == 'error'),
+                        'items': results
+                    }, ensure_ascii=False)
                 }
             
             segment = body.get('segment') or body.get('layer', '')
@@ -322,45 +730,39 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'body': json.dumps({'error': 'No permission to create objects in this segment'})
                 }
             
-            cur.execute("SELECT id, name, color FROM segments")
-            segments = cur.fetchall()
-            segment_colors = {seg['name']: seg['color'] for seg in segments}
-            
-            segments_list = [s.strip() for s in segment.split(',')]
-            colors = [segment_colors[s] for s in segments_list if s in segment_colors]
-            final_color = blend_colors(colors) if colors else body.get('color', '#3b82f6')
-            
-            print(f"DEBUG: Creating polygon with data: id={body['id']}, name={body['name']}, area={body['area']}, type={body['type']}")
-            
-            sql_query = (
-                "INSERT INTO polygon_objects (id, name, type, area, population, status, coordinates, color, segment, visible, attributes, user_id) "
-                "VALUES ('" + body['id'].replace("'", "''") + "', "
-                "'" + body['name'].replace("'", "''") + "', "
-                "'" + body['type'].replace("'", "''") + "', "
-                "" + str(body['area']) + ", "
-                "" + (str(body['population']) if body.get('population') else 'NULL') + ", "
-                "" + ("'" + body['status'].replace("'", "''") + "'" if body.get('status') else 'NULL') + ", "
-                "'" + json.dumps(body['coordinates']).replace("'", "''") + "', "
-                "'" + final_color.replace("'", "''") + "', "
-                "'" + segment.replace("'", "''") + "', "
-                "" + str(body.get('visible', True)).lower() + ", "
-                "'" + json.dumps(body.get('attributes', {})).replace("'", "''") + "', "
-                "'" + user_id.replace("'", "''") + "') "
-                "RETURNING *"
-            )
+            final_color = segment_color(segment, get_segment_colors(cur), body.get('color', '#3b82f6'))
+            
+            metrics = metric_values(body['coordinates'])
+            # Без заявленной площади берётся посчитанная по координатам
+            area = body['area'] if body.get('area') is not None else metrics[0]
             
-            print(f"DEBUG SQL: {sql_query[:500]}")
+            print(f"DEBUG: Creating polygon with data: id={body['id']}, name={body['name']}, area={area}, type={body['type']}")
             
-            cur.execute(sql_query)
+            version = bump_data_version(cur)
+            
+            execute_prepared(
+                cur,
+                "INSERT INTO polygon_objects (id, name, type, area, population, status, coordinates, color, segment, visible, attributes, user_id, row_version, coordinates_simplified, coordinates_packed, " + BBOX_COLUMNS_SQL + ", " + METRIC_COLUMNS_SQL + ") "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s) "
+                "RETURNING *",
+                [
+                    body['id'], body['name'], body['type'], area,
+                    body.get('population') or None, body.get('status') or None,
+                    Json(body['coordinates']), final_color, segment, body.get('visible', True),
+                    Json(body.get('attributes', {})), user_id, version,
+                    Json(build_simplified_levels(body['coordinates'])), encode_coordinates(body['coordinates'])
+                ] + bbox_values(body['coordinates']) + metrics
+            )
             result = cur.fetchone()
+            audit.add('create_object', 'polygon', result['id'], 'Created ' + body['name'])
+            audit.flush(cur)
             conn.commit()
-            
-            log_action(cur, conn, user_id, 'create_object', 'polygon', result['id'], 'Created ' + body['name'])
+            invalidate_tile_cache()
             
             return {
                 'statusCode': 201,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps(dict(result), default=json_serializer)
+                'body': json.dumps(project_row(dict(result), None), default=json_serializer)
             }
         
         elif method == 'PUT':
@@ -372,9 +774,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'body': json.dumps({'error': 'Polygon ID required'})
                 }
             
-            cur.execute(
-                "SELECT user_id, segment FROM polygon_objects WHERE id = '" + polygon_id.replace("'", "''") + "'"
-            )
+            execute_prepared(cur, "SELECT user_id, segment FROM polygon_objects WHERE id = %s", (polygon_id,))
             existing = cur.fetchone()
             
             if not existing:
@@ -396,39 +796,37 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             body = json.loads(event.get('body', '{}'))
             segment = body.get('segment') or body.get('layer', '')
             
-            cur.execute("SELECT id, name, color FROM segments")
-            segments = cur.fetchall()
-            segment_colors = {seg['name']: seg['color'] for seg in segments}
-            
-            segments_list = [s.strip() for s in segment.split(',')]
-            colors = [segment_colors[s] for s in segments_list if s in segment_colors]
-            final_color = blend_colors(colors) if colors else body.get('color', '#3b82f6')
-            
-            cur.execute(
-                "UPDATE polygon_objects SET "
-                "name = '" + body['name'].replace("'", "''") + "', "
-                "type = '" + body['type'].replace("'", "''") + "', "
-                "area = " + str(body['area']) + ", "
-                "population = " + (str(body['population']) if body.get('population') else 'NULL') + ", "
-                "status = '" + body['status'].replace("'", "''") + "', "
-                "coordinates = '" + json.dumps(body['coordinates']).replace("'", "''") + "', "
-                "color = '" + final_color.replace("'", "''") + "', "
-                "segment = '" + segment.replace("'", "''") + "', "
-                "visible = " + str(body.get('visible', True)).lower() + ", "
-                "attributes = '" + json.dumps(body.get('attributes', {})).replace("'", "''") + "', "
-                "updated_at = CURRENT_TIMESTAMP "
-                "WHERE id = '" + polygon_id.replace("'", "''") + "' "
-                "RETURNING *"
+            final_color = segment_color(segment, get_segment_colors(cur), body.get('color', '#3b82f6'))
+            metrics = metric_values(body['coordinates'])
+            area = body['area'] if body.get('area') is not None else metrics[0]
+            
+            version = bump_data_version(cur)
+            
+            execute_prepared(
+                cur,
+                "UPDATE polygon_objects SET name = %s, type = %s, area = %s, population = %s, status = %s, "
+                "coordinates = %s, color = %s, segment = %s, visible = %s, attributes = %s, coordinates_simplified = %s, coordinates_packed = %s, "
+                "" + ', '.join(col + ' = %s' for col in BBOX_COLUMNS + METRIC_COLUMNS) + ", "
+                "row_version = %s, updated_at = CURRENT_TIMESTAMP "
+                "WHERE id = %s "
+                "RETURNING *",
+                [
+                    body['name'], body['type'], area, body.get('population') or None, body['status'],
+                    Json(body['coordinates']), final_color, segment, body.get('visible', True),
+                    Json(body.get('attributes', {})), Json(build_simplified_levels(body['coordinates'])),
+                    encode_coordinates(body['coordinates'])
+                ] + bbox_values(body['coordinates']) + metrics + [version, polygon_id]
             )
             result = cur.fetchone()
+            audit.add('update_object', 'polygon', polygon_id, 'Updated ' + body['name'])
+            audit.flush(cur)
             conn.commit()
-            
-            log_action(cur, conn, user_id, 'update_object', 'polygon', polygon_id, 'Updated ' + body['name'])
+            invalidate_tile_cache()
             
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps(dict(result), default=json_serializer)
+                'body': json.dumps(project_row(dict(result), None), default=json_serializer)
             }
         
         elif method == 'DELETE':
@@ -436,7 +834,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             polygon_id = event.get('queryStringParameters', {}).get('id')
             
             if action == 'delete_all':
-                cur.execute("SELECT role FROM users WHERE id = '" + user_id.replace("'", "''") + "'")
+                execute_prepared(cur, USER_ROLE_SQL, (user_id,))
                 user = cur.fetchone()
                 
                 if not user or user['role'] != 'admin':
@@ -450,10 +848,17 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 count_result = cur.fetchone()
                 count = count_result['count'] if count_result else 0
                 
+                version = bump_data_version(cur)
+                cur.execute(
+                    "INSERT INTO polygon_tombstones (id, version) SELECT id, %s FROM polygon_objects "
+                    "ON CONFLICT (id) DO UPDATE SET version = EXCLUDED.version, deleted_at = CURRENT_TIMESTAMP",
+                    (version,)
+                )
                 cur.execute("DELETE FROM polygon_objects")
+                audit.add('delete_all', 'polygon', None, f'Deleted all objects: {count} items')
+                audit.flush(cur)
                 conn.commit()
-                
-                log_action(cur, conn, user_id, 'delete_all', 'polygon', None, f'Deleted all objects: {count} items')
+                invalidate_tile_cache()
                 
                 return {
                     'statusCode': 200,
@@ -462,7 +867,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 }
             
             if action == 'empty_trash':
-                cur.execute("SELECT role FROM users WHERE id = '" + user_id.replace("'", "''") + "'")
+                execute_prepared(cur, USER_ROLE_SQL, (user_id,))
                 user = cur.fetchone()
                 
                 if not user or user['role'] != 'admin':
@@ -477,10 +882,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 count = count_result['count'] if count_result else 0
                 
                 cur.execute("DELETE FROM trash_polygons")
+                audit.add('empty_trash', 'polygon', None, f'Emptied trash: {count} items')
+                audit.flush(cur)
                 conn.commit()
                 
-                log_action(cur, conn, user_id, 'empty_trash', 'polygon', None, f'Emptied trash: {count} items')
-                
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -495,9 +900,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 }
             
             if action == 'move_to_trash':
-                cur.execute(
-                    "SELECT * FROM polygon_objects WHERE id = '" + polygon_id.replace("'", "''") + "'"
-                )
+                execute_prepared(cur, POLYGON_BY_ID_SQL, (polygon_id,))
                 existing = cur.fetchone()
                 
                 if not existing:
@@ -508,7 +911,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     }
                 
                 if existing['user_id'] != user_id:
-                    cur.execute("SELECT role FROM users WHERE id = '" + user_id.replace("'", "''") + "'")
+                    execute_prepared(cur, USER_ROLE_SQL, (user_id,))
                     user = cur.fetchone()
                     
                     if not user or user['role'] != 'admin':
@@ -520,36 +923,12 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                                 'body': json.dumps({'error': 'No permission to delete this object'})
                             }
                 
-                segment_value = existing.get('segment') or existing.get('layer', '')
-                
-                cur.execute(
-                    "DELETE FROM trash_polygons WHERE id = '" + polygon_id.replace("'", "''") + "'"
-                )
-                
-                cur.execute(
-                    "INSERT INTO trash_polygons (id, name, type, area, population, status, coordinates, color, layer, visible, attributes, user_id, original_created_at, moved_by_user) "
-                    "VALUES ('" + existing['id'].replace("'", "''") + "', "
-                    "'" + existing['name'].replace("'", "''") + "', "
-                    "'" + existing['type'].replace("'", "''") + "', "
-                    "" + (str(existing['area']) if existing.get('area') else 'NULL') + ", "
-                    "" + (str(existing['population']) if existing.get('population') else 'NULL') + ", "
-                    "'" + existing['status'].replace("'", "''") + "', "
-                    "'" + json.dumps(existing['coordinates']).replace("'", "''") + "', "
-                    "'" + existing['color'].replace("'", "''") + "', "
-                    "'" + segment_value.replace("'", "''") + "', "
-                    "" + str(existing.get('visible', True)).lower() + ", "
-                    "'" + json.dumps(existing.get('attributes', {})).replace("'", "''") + "', "
-                    "'" + existing['user_id'].replace("'", "''") + "', "
-                    "'" + existing['created_at'].isoformat() + "', "
-                    "'" + user_id.replace("'", "''") + "')"
-                )
-                
-                cur.execute(
-                    "DELETE FROM polygon_objects WHERE id = '" + polygon_id.replace("'", "''") + "'"
-                )
+                version = bump_data_version(cur)
+                trash.move_to_trash(cur, "id = %s", [polygon_id], user_id, version)
+                audit.add('move_to_trash', 'polygon', polygon_id, 'Moved to trash: ' + existing['name'])
+                audit.flush(cur)
                 conn.commit()
-                
-                log_action(cur, conn, user_id, 'move_to_trash', 'polygon', polygon_id, 'Moved to trash: ' + existing['name'])
+                invalidate_tile_cache()
                 
                 return {
                     'statusCode': 200,
@@ -558,7 +937,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 }
             
             elif action == 'permanent':
-                cur.execute("SELECT role FROM users WHERE id = '" + user_id.replace("'", "''") + "'")
+                execute_prepared(cur, USER_ROLE_SQL, (user_id,))
                 user = cur.fetchone()
                 
                 if not user or user['role'] != 'admin':
@@ -568,9 +947,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'body': json.dumps({'error': 'Only admin can permanently delete'})
                     }
                 
-                cur.execute(
-                    "SELECT name FROM trash_polygons WHERE id = '" + polygon_id.replace("'", "''") + "'"
-                )
+                cur.execute("SELECT name FROM trash_polygons WHERE id = %s", (polygon_id,))
                 trash_item = cur.fetchone()
                 
                 if not trash_item:
@@ -580,13 +957,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'body': json.dumps({'error': 'Polygon not found in trash'})
                     }
                 
-                cur.execute(
-                    "DELETE FROM trash_polygons WHERE id = '" + polygon_id.replace("'", "''") + "'"
-                )
+                execute_prepared(cur, TRASH_DELETE_SQL, (polygon_id,))
+                audit.add('permanent_delete', 'polygon', polygon_id, 'Permanently deleted: ' + trash_item['name'])
+                audit.flush(cur)
                 conn.commit()
                 
-                log_action(cur, conn, user_id, 'permanent_delete', 'polygon', polygon_id, 'Permanently deleted: ' + trash_item['name'])
-                
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -603,4 +978,4 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         if 'cur' in locals():
             cur.close()
         if 'conn' in locals():
-            conn.close()
\ No newline at end of file
+            release_connection(conn)
\ No newline at end of file
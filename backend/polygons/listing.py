@@ -0,0 +1,117 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from geometry import BBOX_COLUMNS, CENTROID_COLUMNS
+
+DEFAULT_PAGE_LIMIT = 200
+MAX_PAGE_LIMIT = 1000
+
+# Поля, доступные в параметре fields=; составные поля разворачиваются в несколько колонок
+LIST_FIELDS = (
+    'id', 'name', 'type', 'area', 'population', 'status', 'coordinates', 'color',
+    'segment', 'visible', 'attributes', 'user_id', 'created_at', 'updated_at', 'bbox',
+    'area_m2', 'perimeter_m', 'centroid'
+)
+
+# Составное поле -> колонки; в ответе массив значений или null, если колонки не заполнены
+COMPOSITE_FIELDS = {
+    'bbox': BBOX_COLUMNS,
+    'centroid': CENTROID_COLUMNS,
+}
+
+# Служебные колонки, которые не отдаются клиенту
+INTERNAL_COLUMNS = ('coordinates_simplified', 'coordinates_packed')
+
+# Колонки polygon_objects без служебных в порядке таблицы: ответ без fields=.
+# Новую колонку таблицы, которую нужно отдавать клиенту, добавлять сюда
+ROW_COLUMNS = (
+    'id', 'name', 'type', 'area', 'population', 'status', 'coordinates', 'color',
+    'segment', 'visible', 'attributes', 'user_id', 'created_at', 'updated_at'
+) + BBOX_COLUMNS + ('row_version', 'area_m2', 'perimeter_m') + CENTROID_COLUMNS
+
+
+def parse_fields(value: Optional[str]) -> Optional[List[str]]:
+    '''Разбирает fields=id,name,...; None означает все колонки. Бросает ValueError'''
+    if not value:
+        return None
+    fields = []
+    for field in (f.strip() for f in value.split(',')):
+        if not field:
+            continue
+        if field not in LIST_FIELDS:
+            raise ValueError('Unknown field: ' + field)
+        if field not in fields:
+            fields.append(field)
+    return fields or None
+
+
+def select_columns(fields: Optional[List[str]], simplified: bool = False, packed: bool = False) -> str:
+    '''
+    Список колонок для SELECT; без fields — ROW_COLUMNS. Всегда добавляет id и created_at
+    (нужны курсору), coordinates_simplified, если нужна упрощённая геометрия,
+    и coordinates_packed для format=packed
+    '''
+    columns = list(ROW_COLUMNS) if fields is None else []
+    for field in fields or ():
+        if field in COMPOSITE_FIELDS:
+            columns.extend(COMPOSITE_FIELDS[field])
+        else:
+            columns.append(field)
+    for required in ('id', 'created_at'):
+        if required not in columns:
+            columns.append(required)
+    if simplified and 'coordinates' in columns:
+        columns.append('coordinates_simplified')
+    if packed and 'coordinates' in columns:
+        columns.append('coordinates_packed')
+    return ', '.join(columns)
+
+
+def apply_simplified(row: Dict[str, Any], level: Optional[str]) -> None:
+    '''Подменяет coordinates предрасчитанной упрощённой геометрией уровня level'''
+    simplified = row.get('coordinates_simplified')
+    if level and simplified and level in simplified:
+        row['coordinates'] = simplified[level]
+
+
+def project_row(row: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    '''Оставляет в строке только запрошенные поля (без служебных колонок)'''
+    if fields is None:
+        for column in INTERNAL_COLUMNS:
+            row.pop(column, None)
+        return row
+    result = {}
+    for field in fields:
+        if field in COMPOSITE_FIELDS:
+            values = [row.get(col) for col in COMPOSITE_FIELDS[field]]
+            result[field] = None if any(v is None for v in values) else values
+        else:
+            result[field] = row.get(field)
+    return result
+
+
+def parse_limit(value: Optional[str]) -> int:
+    '''Размер страницы в пределах 1..MAX_PAGE_LIMIT. Бросает ValueError'''
+    if not value:
+        return DEFAULT_PAGE_LIMIT
+    limit = int(value)
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return min(limit, MAX_PAGE_LIMIT)
+
+
+def encode_cursor(created_at: datetime, polygon_id: str) -> str:
+    '''Непрозрачный курсор по ключу сортировки (created_at, id)'''
+    raw = json.dumps([created_at.isoformat(), polygon_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    '''Разбирает курсор, выданный encode_cursor. Бросает ValueError'''
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, polygon_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(created_at), str(polygon_id)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError('Invalid cursor') from e
@@ -0,0 +1,127 @@
+'''
+Компактное двоичное представление геометрии (format=packed).
+Нормализованные координаты квантуются до PACKED_PRECISION знаков и пишутся
+разностями от предыдущей точки в zigzag-varint (как в Google polyline / TWKB).
+Формат v1: [версия][точность][флаги] varint(число колец), затем для каждого кольца
+varint(число точек) и пары разностей dx, dy; разности продолжаются через кольца.
+Закодированная геометрия хранится в coordinates_packed (BYTEA) и отдаётся клиенту
+строкой base64 в поле coordinates; декодер для клиента — src/utils/packedGeometry.ts.
+'''
+
+import base64
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+PACKED_COLUMN = 'coordinates_packed'
+PACKED_VERSION = 1
+PACKED_MEDIA_TYPE = 'application/vnd.map-portal.packed+json'
+
+FLAG_MULTI_RING = 1
+
+
+def _precision() -> int:
+    # 7 знаков в нормализованных единицах: шаг 3.6e-7° по долготе (~4 см на экваторе)
+    return int(os.environ.get('PACKED_PRECISION', '7'))
+
+
+def wants_packed(params: Dict[str, Any], headers: Dict[str, Any]) -> bool:
+    '''Клиент просит компактную геометрию: format=packed или Accept с PACKED_MEDIA_TYPE'''
+    if params.get('format'):
+        if params['format'] not in ('json', 'packed'):
+            raise ValueError('format must be json or packed')
+        return params['format'] == 'packed'
+    accept = headers.get('Accept') or headers.get('accept') or ''
+    return PACKED_MEDIA_TYPE in accept
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode_coordinates(coordinates: Any) -> Optional[bytes]:
+    '''Кодирует кольцо или список колец; None, если геометрия не из пар чисел'''
+    if not isinstance(coordinates, list) or not coordinates:
+        return None
+    multi = isinstance(coordinates[0], list) and bool(coordinates[0]) and isinstance(coordinates[0][0], list)
+    rings = coordinates if multi else [coordinates]
+    precision = _precision()
+    scale = 10 ** precision
+    out = bytearray((PACKED_VERSION, precision, FLAG_MULTI_RING if multi else 0))
+    _write_varint(out, len(rings))
+    prev_x = prev_y = 0
+    try:
+        for ring in rings:
+            _write_varint(out, len(ring))
+            for point in ring:
+                if len(point) != 2:
+                    return None
+                x, y = round(point[0] * scale), round(point[1] * scale)
+                dx, dy = x - prev_x, y - prev_y
+                _write_varint(out, dx << 1 if dx >= 0 else (-dx << 1) - 1)
+                _write_varint(out, dy << 1 if dy >= 0 else (-dy << 1) - 1)
+                prev_x, prev_y = x, y
+    except (TypeError, ValueError, OverflowError):
+        # не число, NaN/inf
+        return None
+    return bytes(out)
+
+
+def decode_coordinates(data: bytes) -> Any:
+    '''Обратное к encode_coordinates; бросает ValueError на повреждённых данных'''
+    if len(data) < 3 or data[0] != PACKED_VERSION:
+        raise ValueError('Unsupported packed geometry')
+    scale = 10 ** data[1]
+    multi = bool(data[2] & FLAG_MULTI_RING)
+    pos = 3
+
+    def read() -> int:
+        nonlocal pos
+        value = shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            value |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    try:
+        rings: List[List[List[float]]] = []
+        x = y = 0
+        for _ in range(read()):
+            ring = []
+            for _ in range(read()):
+                dx, dy = read(), read()
+                x += (dx >> 1) ^ -(dx & 1)
+                y += (dy >> 1) ^ -(dy & 1)
+                ring.append([x / scale, y / scale])
+            rings.append(ring)
+    except IndexError as e:
+        raise ValueError('Truncated packed geometry') from e
+    # Ни одного кольца (пустая геометрия) — пустой список
+    return rings if multi or not rings else rings[0]
+
+
+def packed_text(packed: Optional[bytes], coordinates: Any) -> Optional[str]:
+    '''
+    base64 для ответа: сохранённое значение coordinates_packed или, если его нет
+    (объекты до V0025, упрощённая геометрия), кодирование на лету из coordinates
+    '''
+    if packed is None and coordinates is not None:
+        if isinstance(coordinates, str):
+            coordinates = json.loads(coordinates)
+        packed = encode_coordinates(coordinates)
+    if packed is None:
+        return None
+    return base64.b64encode(packed).decode('ascii')
+
+
+def pack_row(row: Dict[str, Any], use_stored: bool = True) -> None:
+    '''Заменяет coordinates строки на base64; use_stored=False, если координаты подменены упрощёнными'''
+    packed = row.pop(PACKED_COLUMN, None)
+    if 'coordinates' in row:
+        row['coordinates'] = packed_text(bytes(packed) if packed is not None and use_stored else None, row['coordinates'])
@@ -0,0 +1,84 @@
+from typing import Any, Dict, List, Optional, Tuple
+from db import execute_prepared
+
+READ_LEVELS = ('read', 'write', 'admin')
+DEFAULT_READ_ROLES = ('editor', 'user')
+
+
+def load_read_access(cur, user_id: str) -> Optional[Dict[str, Any]]:
+    '''
+    Загружает роль пользователя и все его права на сегменты за один проход.
+    Возвращает None, если пользователь не найден.
+    '''
+    execute_prepared(cur, "SELECT role FROM users WHERE id = %s", (user_id,))
+    user = cur.fetchone()
+    if not user:
+        return None
+
+    access = {'role': user['role'], 'global_level': None, 'segment_levels': {}}
+    if user['role'] == 'admin':
+        return access
+
+    execute_prepared(
+        cur,
+        "SELECT resource_id, permission_level FROM permissions "
+        "WHERE user_id = %s AND resource_type = 'layer' AND permission_level != 'revoked' "
+        "ORDER BY id",
+        (user_id,)
+    )
+    for perm in cur.fetchall():
+        if perm['resource_id'] is None:
+            # Глобальное право на все сегменты перекрывает точечные (как в check_permission)
+            if access['global_level'] is None:
+                access['global_level'] = perm['permission_level']
+        elif perm['resource_id'] and perm['resource_id'] not in access['segment_levels']:
+            access['segment_levels'][perm['resource_id']] = perm['permission_level']
+    return access
+
+
+def can_read(access: Optional[Dict[str, Any]], segment_name: str) -> bool:
+    '''Эквивалент check_permission(..., 'layer', segment_name, 'read') по загруженным правам'''
+    if access is None:
+        return False
+    if access['role'] == 'admin':
+        return True
+
+    level = access['global_level']
+    if level is None and segment_name:
+        level = access['segment_levels'].get(segment_name)
+
+    if level is None:
+        return access['role'] in DEFAULT_READ_ROLES
+    return level in READ_LEVELS
+
+
+def read_filter_sql(access: Optional[Dict[str, Any]], user_id: str) -> Tuple[str, List[Any]]:
+    '''
+    SQL-условие видимости полигонов для пользователя: свои и общие объекты
+    плюс чужие объекты в сегментах, доступных на чтение
+    '''
+    own_sql = "user_id = %s OR user_id IS NULL"
+    params: List[Any] = [user_id]
+
+    if access is None:
+        return "(" + own_sql + ")", params
+    if access['role'] == 'admin':
+        return "TRUE", []
+    if access['global_level'] is not None:
+        if access['global_level'] in READ_LEVELS:
+            return "TRUE", []
+        return "(" + own_sql + ")", params
+
+    segment_levels = access['segment_levels']
+    if access['role'] in DEFAULT_READ_ROLES:
+        denied = [seg for seg, level in segment_levels.items() if level not in READ_LEVELS]
+        if not denied:
+            return "TRUE", []
+        params.append(denied)
+        return "(" + own_sql + " OR NOT (COALESCE(segment, '') = ANY(%s)))", params
+
+    allowed = [seg for seg, level in segment_levels.items() if level in READ_LEVELS]
+    if not allowed:
+        return "(" + own_sql + ")", params
+    params.append(allowed)
+    return "(" + own_sql + " OR COALESCE(segment, '') = ANY(%s))", params
@@ -0,0 +1,95 @@
+'''
+Поиск объектов: GET ?q=текст[&attr=Ключ:Значение].
+Ищет подстроку и нечёткое совпадение слов (pg_trgm) в названии, типе и значениях
+атрибутов по индексу idx_polygon_objects_search_trgm. Порядок: точное совпадение
+названия, затем префикс названия, затем по сходству (word_similarity).
+'''
+
+import json
+from typing import Any, Dict, List, Optional
+from listing import select_columns, project_row
+
+SEARCH_DOCUMENT_SQL = "polygon_search_text(name, type, attributes)"
+DEFAULT_SEARCH_LIMIT = 20
+MAX_QUERY_LENGTH = 200
+# Короче этого триграммный индекс не работает, ищется только префикс названия
+MIN_TRIGRAM_QUERY = 3
+
+
+def parse_query(value: Optional[str]) -> Optional[str]:
+    '''Нормализует q (нижний регистр, одинарные пробелы); бросает ValueError'''
+    if value is None:
+        return None
+    query = ' '.join(value.lower().split())
+    if not query:
+        raise ValueError('q must not be empty')
+    if len(query) > MAX_QUERY_LENGTH:
+        raise ValueError(f'q must not exceed {MAX_QUERY_LENGTH} characters')
+    return query
+
+
+def parse_attribute(value: Optional[str]) -> Optional[Dict[str, str]]:
+    '''Разбирает attr=Ключ:Значение; бросает ValueError'''
+    if not value:
+        return None
+    key, sep, attr_value = value.partition(':')
+    if not sep or not key.strip():
+        raise ValueError('attr must be key:value')
+    return {key.strip(): attr_value.strip()}
+
+
+def _like_pattern(query: str) -> str:
+    return query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_polygons(cur, query: Optional[str], attribute: Optional[Dict[str, str]],
+                    fields: Optional[List[str]], limit: int,
+                    where_sql: str, where_params: List[Any]) -> List[Dict[str, Any]]:
+    '''
+    Найденные объекты (видимые по where_sql) с полем score: 1 для точного совпадения
+    названия, иначе сходство запроса со словами документа (0..1).
+    Без q (только attr) объекты идут по названию
+    '''
+    conditions = [where_sql]
+    params: List[Any] = list(where_params)
+    rank_sql = "1.0 AS search_score"
+    order_sql = "name, id"
+    rank_params: List[Any] = []
+
+    if attribute:
+        conditions.append("attributes @> %s::jsonb")
+        params.append(json.dumps(attribute, ensure_ascii=False))
+
+    if query:
+        prefix = _like_pattern(query) + '%'
+        if len(query) < MIN_TRIGRAM_QUERY:
+            conditions.append("lower(name) LIKE %s")
+            params.append(prefix)
+        else:
+            conditions.append("(" + SEARCH_DOCUMENT_SQL + " LIKE %s OR %s <%% " + SEARCH_DOCUMENT_SQL + ")")
+            params.extend(['%' + _like_pattern(query) + '%', query])
+        rank_sql = (
+            "lower(name) = %s AS name_exact, lower(name) LIKE %s AS name_prefix, "
+            "word_similarity(%s, " + SEARCH_DOCUMENT_SQL + ") AS search_score"
+        )
+        rank_params = [query, prefix, query]
+        order_sql = "name_exact DESC, name_prefix DESC, search_score DESC, name, id"
+
+    cur.execute(
+        "SELECT " + select_columns(fields) + ", " + rank_sql + " "
+        "FROM polygon_objects WHERE " + " AND ".join(conditions) + " "
+        "ORDER BY " + order_sql + " LIMIT %s",
+        rank_params + params + [limit]
+    )
+
+    result = []
+    for row in cur.fetchall():
+        row = dict(row)
+        score = float(row.pop('search_score'))
+        if row.pop('name_exact', False):
+            score = 1.0
+        row.pop('name_prefix', None)
+        item = project_row(row, fields)
+        item['score'] = round(score, 3)
+        result.append(item)
+    return result
@@ -0,0 +1,87 @@
+'''
+Точечные запросы к полигонам: GET ?at=lon,lat (объекты под точкой) и
+GET ?near=lon,lat&radius=м (объекты в радиусе, по возрастанию расстояния).
+Кандидаты выбираются по GiST-индексу idx_polygon_objects_bbox (R-дерево по охватам),
+точная проверка геометрии выполняется только для них.
+'''
+
+import os
+from typing import Any, Dict, List, Optional, Tuple
+from geometry import BBox, BBOX_OVERLAP_SQL, contains_point, distance_to_polygon_m, radius_bbox
+from listing import select_columns, project_row
+
+DEFAULT_NEAR_RADIUS_M = 500.0
+
+
+def _max_radius() -> float:
+    return float(os.environ.get('NEAR_MAX_RADIUS_M', '50000'))
+
+
+def parse_point(value: str) -> Tuple[float, float]:
+    '''Разбирает lon,lat; бросает ValueError'''
+    parts = [p.strip() for p in value.split(',')]
+    if len(parts) != 2:
+        raise ValueError('point must be lon,lat')
+    lon, lat = float(parts[0]), float(parts[1])
+    if not (-180 <= lon <= 180 and -90 <= lat <= 90):
+        raise ValueError('point is out of range')
+    return lon, lat
+
+
+def parse_radius(value: Optional[str]) -> float:
+    '''Радиус поиска в метрах в пределах NEAR_MAX_RADIUS_M; бросает ValueError'''
+    if not value:
+        return DEFAULT_NEAR_RADIUS_M
+    radius = float(value)
+    if not radius > 0:
+        raise ValueError('radius must be positive')
+    if radius > _max_radius():
+        raise ValueError(f'radius must not exceed {_max_radius():g} m')
+    return radius
+
+
+def _candidates(cur, bounds: BBox, fields: Optional[List[str]], where_sql: str,
+                where_params: List[Any], extra_columns: Tuple[str, ...] = ()) -> List[Dict[str, Any]]:
+    '''Кандидаты по охвату; coordinates и extra_columns выбираются всегда, project_row их потом отбросит'''
+    columns_sql = select_columns(fields)
+    if fields is not None:
+        for column in ('coordinates',) + extra_columns:
+            if column not in fields:
+                columns_sql += ', ' + column
+    cur.execute(
+        "SELECT " + columns_sql + " FROM polygon_objects WHERE " + where_sql + " AND " + BBOX_OVERLAP_SQL,
+        list(where_params) + list(bounds)
+    )
+    return [dict(row) for row in cur.fetchall()]
+
+
+def find_at(cur, lon: float, lat: float, fields: Optional[List[str]], limit: int,
+            where_sql: str, where_params: List[Any]) -> List[Dict[str, Any]]:
+    '''
+    Объекты, содержащие точку; сначала самые маленькие (вложенный участок раньше охватывающего).
+    Порядок — по вычисленной сервером area_m2, для объектов без неё — по area, независимо от fields
+    '''
+    rows = [
+        row for row in _candidates(cur, (lon, lat, lon, lat), fields, where_sql, where_params, ('area_m2', 'area'))
+        if contains_point(row['coordinates'], lon, lat)
+    ]
+    rows.sort(key=lambda row: (row['area_m2'] is None, row['area_m2'] or 0,
+                               row['area'] is None, row['area'] or 0, row['id']))
+    return [project_row(row, fields) for row in rows[:limit]]
+
+
+def find_near(cur, lon: float, lat: float, radius: float, fields: Optional[List[str]], limit: int,
+              where_sql: str, where_params: List[Any]) -> List[Dict[str, Any]]:
+    '''Объекты не дальше radius метров от точки с полем distance (м), по возрастанию расстояния'''
+    found = []
+    for row in _candidates(cur, radius_bbox(lon, lat, radius), fields, where_sql, where_params):
+        distance = distance_to_polygon_m(row['coordinates'], lon, lat)
+        if distance is not None and distance <= radius:
+            found.append((distance, row))
+    found.sort(key=lambda item: (item[0], item[1]['id']))
+    result = []
+    for distance, row in found[:limit]:
+        item = project_row(row, fields)
+        item['distance'] = round(distance, 1)
+        result.append(item)
+    return result
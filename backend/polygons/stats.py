@@ -0,0 +1,76 @@
+'''
+Сводная статистика по объектам (GET ?action=stats).
+Читается из таблицы polygon_stats, которую триггеры поддерживают при каждом
+изменении polygon_objects, поэтому время ответа не зависит от числа объектов.
+'''
+
+from typing import Any, Dict, List, Optional
+
+# Измерение group_by -> выражение над polygon_stats.
+# Объект с несколькими сегментами учитывается в каждом из них
+GROUP_COLUMNS = {
+    'segment': 'btrim(part.name)',
+    'type': 'type',
+    'status': 'status',
+    'owner': 'user_id',
+}
+
+SEGMENT_PARTS_SQL = (
+    " CROSS JOIN LATERAL unnest("
+    "CASE WHEN segment = '' THEN ARRAY[''] ELSE string_to_array(segment, ',') END"
+    ") AS part(name)"
+)
+
+
+def parse_group_by(value: Optional[str]) -> List[str]:
+    '''Разбирает group_by=segment,status,...; бросает ValueError'''
+    if not value:
+        return []
+    group_by = []
+    for name in (v.strip() for v in value.split(',')):
+        if not name:
+            continue
+        if name not in GROUP_COLUMNS:
+            raise ValueError('Unknown group_by: ' + name + ' (allowed: ' + ', '.join(GROUP_COLUMNS) + ')')
+        if name not in group_by:
+            group_by.append(name)
+    return group_by
+
+
+def _totals(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'count': int(row['count'] or 0),
+        'area': float(row['area'] or 0),
+        'population': int(row['population'] or 0),
+    }
+
+
+def load_stats(cur, group_by: List[str], where_sql: str, where_params: List[Any]) -> Dict[str, Any]:
+    '''
+    Итоги по видимым пользователю объектам (where_sql из read_filter_sql)
+    и, если задан group_by, разбивка по измерениям
+    '''
+    cur.execute(
+        "SELECT SUM(object_count) AS count, SUM(total_area) AS area, SUM(total_population) AS population "
+        "FROM polygon_stats WHERE " + where_sql,
+        where_params
+    )
+    result: Dict[str, Any] = {'total': _totals(cur.fetchone())}
+    if not group_by:
+        return result
+
+    columns = [GROUP_COLUMNS[name] + ' AS ' + name for name in group_by]
+    cur.execute(
+        "SELECT " + ', '.join(columns) + ", "
+        "SUM(object_count) AS count, SUM(total_area) AS area, SUM(total_population) AS population "
+        "FROM polygon_stats" + (SEGMENT_PARTS_SQL if 'segment' in group_by else '') + " "
+        "WHERE " + where_sql + " "
+        "GROUP BY " + ', '.join(str(i + 1) for i in range(len(group_by))) + " "
+        "ORDER BY count DESC, " + ', '.join(str(i + 1) for i in range(len(group_by))),
+        where_params
+    )
+    result['groups'] = [
+        dict({name: row[name] for name in group_by}, **_totals(row))
+        for row in cur.fetchall()
+    ]
+    return result
@@ -0,0 +1,180 @@
+'''
+Потоковая сериализация списка полигонов в JSON.
+Строки читаются серверным (именованным) курсором пачками и сразу пишутся
+в выходной буфер, без промежуточных словарей и без default-колбэка json.dumps.
+JSONB-колонки приходят из базы готовым текстом и вставляются как есть.
+'''
+
+import json
+import math
+import os
+import re
+from datetime import datetime
+from decimal import Decimal
+from json.encoder import encode_basestring_ascii
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+import psycopg2.extensions
+from listing import INTERNAL_COLUMNS, COMPOSITE_FIELDS
+from packed import PACKED_COLUMN, packed_text
+
+JSON_OIDS = (114, 3802)
+# Колонка с геометрией нужного уровня упрощения (см. lod_column_sql)
+LOD_COLUMN = 'coordinates_lod'
+
+
+def _batch_size() -> int:
+    return int(os.environ.get('STREAM_BATCH_SIZE', '1000'))
+
+
+_NON_ASCII_RE = re.compile(r'[^\x00-\x7f]+')
+
+
+class RawJSON(str):
+    '''Текст JSON/JSONB-колонки, который пишется в ответ без разбора'''
+
+
+def _escape_non_ascii(match) -> str:
+    # Внутри серии нет кавычек и обратных слешей, остаются только \uXXXX
+    return encode_basestring_ascii(match.group())[1:-1]
+
+
+def _cast_raw_json(value: Optional[str], cur) -> Optional[RawJSON]:
+    '''
+    Оставляет JSON текстом. Не-ASCII символы экранируются, как в json.dumps:
+    иначе одна кириллическая буква переводит всю строку ответа в 2 байта на символ
+    '''
+    if value is None:
+        return None
+    if not value.isascii():
+        value = _NON_ASCII_RE.sub(_escape_non_ascii, value)
+    return RawJSON(value)
+
+
+RAW_JSON = psycopg2.extensions.new_type(JSON_OIDS, 'RAW_JSON', _cast_raw_json)
+
+
+def _encode_float(value: float) -> str:
+    return float.__repr__(value) if math.isfinite(value) else json.dumps(value)
+
+
+_ENCODERS: Dict[type, Callable[[Any], str]] = {
+    str: encode_basestring_ascii,
+    RawJSON: str,
+    int: int.__repr__,
+    float: _encode_float,
+    bool: lambda value: 'true' if value else 'false',
+    type(None): lambda value: 'null',
+    Decimal: lambda value: _encode_float(float(value)),
+    datetime: lambda value: '"' + value.isoformat() + '"',
+}
+
+
+def encode_value(value: Any) -> str:
+    '''JSON-представление значения колонки; dict/list (если встретятся) идут через json.dumps'''
+    encoder = _ENCODERS.get(type(value))
+    if encoder is None:
+        return json.dumps(value)
+    return encoder(value)
+
+
+def lod_column_sql(level: str) -> str:
+    '''Выражение для геометрии уровня level (ключ SIMPLIFY_LEVELS) с откатом на исходные координаты'''
+    if not level.isdigit():
+        raise ValueError('Invalid simplification level')
+    return "COALESCE(coordinates_simplified -> '" + level + "', coordinates) AS " + LOD_COLUMN
+
+
+class _PackedSource(NamedTuple):
+    '''Источник coordinates для format=packed: сохранённая колонка (если подходит) и JSON'''
+    packed: Optional[int]
+    coordinates: int
+
+
+def _row_plan(columns: List[str], fields: Optional[List[str]], packed: bool = False) -> List[Tuple[str, Any]]:
+    '''
+    Порядок вывода: (префикс '"name": ', индекс колонки, кортеж индексов для составного поля
+    или _PackedSource). Повторяет project_row/apply_simplified/pack_row для строк-кортежей
+    '''
+    index = {name: i for i, name in enumerate(columns)}
+
+    def source(name: str) -> int:
+        if name == 'coordinates' and LOD_COLUMN in index:
+            return index[LOD_COLUMN]
+        return index[name]
+
+    if fields is None:
+        names = [c for c in columns if c not in INTERNAL_COLUMNS and c != LOD_COLUMN]
+    else:
+        names = fields
+    plan = []
+    for name in names:
+        prefix = encode_basestring_ascii(name) + ': '
+        if name in COMPOSITE_FIELDS and fields is not None:
+            plan.append((prefix, tuple(index[c] for c in COMPOSITE_FIELDS[name])))
+        elif name == 'coordinates' and packed:
+            # Сохранённая packed-геометрия полная; упрощённая кодируется на лету
+            stored = index.get(PACKED_COLUMN) if LOD_COLUMN not in index else None
+            plan.append((prefix, _PackedSource(stored, source(name))))
+        else:
+            plan.append((prefix, source(name)))
+    return plan
+
+
+def write_rows(out, cur, fields: Optional[List[str]], limit: Optional[int] = None,
+               packed: bool = False) -> Tuple[int, Optional[Tuple[datetime, str]]]:
+    '''
+    Пишет строки уже выполненного курсора как элементы JSON-массива (без скобок).
+    При packed=True coordinates пишутся строкой base64 (см. packed.py).
+    Возвращает число записанных строк и ключ (created_at, id) последней из них,
+    если после limit строк в курсоре осталась ещё одна (значит, есть следующая страница)
+    '''
+    batch = cur.fetchmany(_batch_size())
+    # У серверного курсора description появляется только после первой выборки
+    columns = [col[0] for col in cur.description]
+    plan = _row_plan(columns, fields, packed)
+    created_at_index = columns.index('created_at')
+    id_index = columns.index('id')
+    encoders = _ENCODERS
+    count = 0
+    last_row = None
+
+    while batch:
+        for row in batch:
+            if limit is not None and count == limit:
+                return count, (last_row[created_at_index], last_row[id_index])
+            out.write(', {' if count else '{')
+            first = True
+            for prefix, source in plan:
+                if first:
+                    first = False
+                else:
+                    out.write(', ')
+                out.write(prefix)
+                if type(source) is tuple:
+                    values = [row[i] for i in source]
+                    out.write('null' if any(v is None for v in values) else '[' + ', '.join(encode_value(v) for v in values) + ']')
+                elif type(source) is _PackedSource:
+                    stored = row[source.packed] if source.packed is not None else None
+                    out.write(encode_value(packed_text(
+                        bytes(stored) if stored is not None else None, row[source.coordinates]
+                    )))
+                else:
+                    value = row[source]
+                    encoder = encoders.get(type(value))
+                    out.write(encoder(value) if encoder is not None else json.dumps(value))
+            out.write('}')
+            count += 1
+            last_row = row
+        batch = cur.fetchmany(_batch_size())
+    return count, None
+
+
+def open_stream_cursor(conn, sql: str, params: List[Any]):
+    '''
+    Серверный курсор; write_rows выбирает из него пачками по STREAM_BATCH_SIZE.
+    JSON-колонки не разбираются, а приходят как RawJSON
+    '''
+    cur = conn.cursor(name='polygons_stream')
+    psycopg2.extensions.register_type(RAW_JSON, cur)
+    cur.execute(sql, params)
+    return cur
@@ -0,0 +1,46 @@
+'''
+ETag и дельта-синхронизация списка полигонов.
+Токен синхронизации: "<версия полигонов>-<версия сегментов>-<хэш фильтра видимости>".
+'''
+
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+# Параметры, не влияющие на содержимое ответа
+IGNORED_QUERY_PARAMS = ('nocache',)
+
+
+def filter_hash(where_sql: str, where_params: List[Any]) -> str:
+    '''Короткий хэш фильтра видимости пользователя'''
+    raw = where_sql + json.dumps(where_params, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:12]
+
+
+def make_sync_token(versions: Dict[str, int], visibility_hash: str) -> str:
+    return f"{versions['polygons']}-{versions['segments']}-{visibility_hash}"
+
+
+def parse_sync_token(token: str) -> Tuple[int, int, str]:
+    '''Разбирает токен since=; бросает ValueError'''
+    parts = token.split('-')
+    if len(parts) != 3:
+        raise ValueError('Invalid since token')
+    return int(parts[0]), int(parts[1]), parts[2]
+
+
+def make_etag(sync_token: str, params: Dict[str, Any]) -> str:
+    '''Сильный ETag: токен синхронизации плюс параметры запроса'''
+    significant = sorted((k, str(v)) for k, v in params.items() if k not in IGNORED_QUERY_PARAMS)
+    raw = sync_token + json.dumps(significant)
+    return '"' + hashlib.sha1(raw.encode('utf-8')).hexdigest() + '"'
+
+
+def etag_matches(event: Dict[str, Any], etag: str) -> bool:
+    '''Проверяет заголовок If-None-Match запроса'''
+    headers = event.get('headers', {}) or {}
+    value: Optional[str] = headers.get('If-None-Match') or headers.get('if-none-match')
+    if not value:
+        return False
+    candidates = [v.strip() for v in value.split(',')]
+    return '*' in candidates or etag in candidates or 'W/' + etag in candidates
@@ -0,0 +1,252 @@
+'''
+Генерация Mapbox Vector Tiles (MVT 2.1) из polygon_objects.
+Геометрия переводится в Web Mercator, обрезается по тайлу с буфером
+и квантуется в сетку EXTENT x EXTENT.
+'''
+
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from geometry import iter_rings, normalized_to_lonlat
+
+EXTENT = 4096
+BUFFER = 64
+LAYER_NAME = 'polygons'
+MAX_ZOOM = 22
+
+_GEOM_MOVE_TO = 1
+_GEOM_LINE_TO = 2
+_GEOM_CLOSE_PATH = 7
+_GEOM_TYPE_POLYGON = 3
+
+_TILE_PATH_RE = re.compile(r'(?:^|/)(\d+)/(\d+)/(\d+)(?:\.(?:mvt|pbf))?/?$')
+
+
+def parse_tile(event: Dict[str, Any]) -> Optional[Tuple[int, int, int]]:
+    '''
+    Достаёт z/x/y из пути запроса (/{z}/{x}/{y}[.mvt]) или параметра tile=z/x/y.
+    Возвращает None, если запрос не про тайл; бросает ValueError на неверных номерах
+    '''
+    params = event.get('queryStringParameters', {}) or {}
+    candidates = [params.get('tile')]
+    path_params = event.get('pathParams') or event.get('pathParameters') or {}
+    if path_params.get('proxy'):
+        candidates.append(path_params['proxy'])
+    candidates.append(event.get('path'))
+
+    for candidate in candidates:
+        if not candidate:
+            continue
+        match = _TILE_PATH_RE.search(candidate)
+        if not match:
+            continue
+        z, x, y = (int(v) for v in match.groups())
+        if z > MAX_ZOOM or x >= 2 ** z or y >= 2 ** z:
+            raise ValueError('Tile coordinates out of range')
+        return z, x, y
+    return None
+
+
+def tile_bounds(z: int, x: int, y: int, buffer: int = BUFFER) -> Tuple[float, float, float, float]:
+    '''Охват тайла (с буфером) в градусах: min_lon, min_lat, max_lon, max_lat'''
+    n = 2 ** z
+    pad = buffer / EXTENT
+
+    def lon(tx: float) -> float:
+        return tx / n * 360 - 180
+
+    def lat(ty: float) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / n))))
+
+    return lon(x - pad), lat(y + 1 + pad), lon(x + 1 + pad), lat(y - pad)
+
+
+def _project(lon: float, lat: float, z: int, x: int, y: int) -> Tuple[float, float]:
+    n = 2 ** z
+    lat = max(min(lat, 85.0511287798), -85.0511287798)
+    lat_rad = math.radians(lat)
+    world_x = (lon + 180) / 360 * n
+    world_y = (1 - math.log(math.tan(lat_rad) + 1 / math.cos(lat_rad)) / math.pi) / 2 * n
+    return (world_x - x) * EXTENT, (world_y - y) * EXTENT
+
+
+def _clip_ring(points: List[Tuple[float, float]], lo: float, hi: float) -> List[Tuple[float, float]]:
+    '''Отсечение Сазерленда–Ходжмана по квадрату [lo, hi] x [lo, hi]'''
+    edges = (
+        (lambda p: p[0] >= lo, lambda a, b: (lo, a[1] + (b[1] - a[1]) * (lo - a[0]) / (b[0] - a[0]))),
+        (lambda p: p[0] <= hi, lambda a, b: (hi, a[1] + (b[1] - a[1]) * (hi - a[0]) / (b[0] - a[0]))),
+        (lambda p: p[1] >= lo, lambda a, b: (a[0] + (b[0] - a[0]) * (lo - a[1]) / (b[1] - a[1]), lo)),
+        (lambda p: p[1] <= hi, lambda a, b: (a[0] + (b[0] - a[0]) * (hi - a[1]) / (b[1] - a[1]), hi)),
+    )
+    output = points
+    for inside, intersect in edges:
+        if not output:
+            break
+        source, output = output, []
+        prev = source[-1]
+        for point in source:
+            if inside(point):
+                if not inside(prev):
+                    output.append(intersect(prev, point))
+                output.append(point)
+            elif inside(prev):
+                output.append(intersect(prev, point))
+            prev = point
+    return output
+
+
+def _quantize_ring(points: List[Tuple[float, float]]) -> List[Tuple[int, int]]:
+    ring: List[Tuple[int, int]] = []
+    for px, py in points:
+        point = (int(round(px)), int(round(py)))
+        if not ring or ring[-1] != point:
+            ring.append(point)
+    if len(ring) > 1 and ring[0] == ring[-1]:
+        ring.pop()
+    if len(ring) < 3:
+        return []
+    # Внешнее кольцо в MVT должно иметь положительную площадь (по часовой при оси Y вниз)
+    area = sum(ring[i - 1][0] * ring[i][1] - ring[i][0] * ring[i - 1][1] for i in range(len(ring)))
+    if area == 0:
+        return []
+    if area < 0:
+        ring.reverse()
+    return ring
+
+
+def tile_rings(coordinates: Any, z: int, x: int, y: int) -> List[List[Tuple[int, int]]]:
+    '''Кольца полигона в координатах тайла: обрезанные, квантованные, с верной ориентацией'''
+    rings = []
+    for ring in iter_rings(coordinates):
+        projected = [_project(*normalized_to_lonlat(p[0], p[1]), z, x, y) for p in ring if len(p) >= 2]
+        clipped = _clip_ring(projected, -BUFFER, EXTENT + BUFFER)
+        quantized = _quantize_ring(clipped)
+        if quantized:
+            rings.append(quantized)
+    return rings
+
+
+# --- Protobuf ---
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 31)
+
+
+def _field(number: int, wire_type: int) -> bytes:
+    return _varint((number << 3) | wire_type)
+
+
+def _bytes_field(number: int, payload: bytes) -> bytes:
+    return _field(number, 2) + _varint(len(payload)) + payload
+
+
+def _packed_field(number: int, values: List[int]) -> bytes:
+    return _bytes_field(number, b''.join(_varint(v) for v in values))
+
+
+def _encode_geometry(rings: List[List[Tuple[int, int]]]) -> List[int]:
+    commands: List[int] = []
+    cx = cy = 0
+    for ring in rings:
+        for i, (px, py) in enumerate(ring):
+            if i == 0:
+                commands.append((1 << 3) | _GEOM_MOVE_TO)
+            elif i == 1:
+                commands.append(((len(ring) - 1) << 3) | _GEOM_LINE_TO)
+            commands.append(_zigzag(px - cx))
+            commands.append(_zigzag(py - cy))
+            cx, cy = px, py
+        commands.append((1 << 3) | _GEOM_CLOSE_PATH)
+    return commands
+
+
+def encode_tile(features: List[Dict[str, Any]]) -> bytes:
+    '''
+    Кодирует слой LAYER_NAME. Каждый feature: {'rings': [...], 'properties': {...}}
+    со строковыми значениями свойств
+    '''
+    keys: Dict[str, int] = {}
+    values: Dict[str, int] = {}
+    encoded_features = []
+    for feature in features:
+        tags: List[int] = []
+        for key, value in feature['properties'].items():
+            if value is None:
+                continue
+            value = str(value)
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault(value, len(values)))
+        body = (
+            _packed_field(2, tags)
+            + _field(3, 0) + _varint(_GEOM_TYPE_POLYGON)
+            + _packed_field(4, _encode_geometry(feature['rings']))
+        )
+        encoded_features.append(_bytes_field(2, body))
+
+    layer = _field(15, 0) + _varint(2) + _bytes_field(1, LAYER_NAME.encode('utf-8'))
+    layer += b''.join(encoded_features)
+    layer += b''.join(_bytes_field(3, key.encode('utf-8')) for key in keys)
+    layer += b''.join(_bytes_field(4, _bytes_field(1, value.encode('utf-8'))) for value in values)
+    layer += _field(5, 0) + _varint(EXTENT)
+    return _bytes_field(3, layer)
+
+
+def build_tile(rows: List[Dict[str, Any]], z: int, x: int, y: int) -> bytes:
+    '''Собирает тайл из строк polygon_objects (id, name, color, coordinates)'''
+    features = []
+    for row in rows:
+        rings = tile_rings(row['coordinates'], z, x, y)
+        if not rings:
+            continue
+        features.append({
+            'rings': rings,
+            'properties': {'id': row['id'], 'name': row['name'], 'color': row['color']}
+        })
+    return encode_tile(features)
+
+
+# --- Кэш тайлов ---
+
+_cache: 'OrderedDict[Tuple, bytes]' = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cache_size() -> int:
+    return int(os.environ.get('TILE_CACHE_SIZE', '512'))
+
+
+def get_cached_tile(key: Tuple) -> Optional[bytes]:
+    with _cache_lock:
+        tile = _cache.get(key)
+        if tile is not None:
+            _cache.move_to_end(key)
+        return tile
+
+
+def put_cached_tile(key: Tuple, tile: bytes) -> None:
+    with _cache_lock:
+        _cache[key] = tile
+        _cache.move_to_end(key)
+        while len(_cache) > _cache_size():
+            _cache.popitem(last=False)
+
+
+def invalidate_tile_cache() -> None:
+    '''Сбрасывает кэш после изменения полигонов в этом процессе'''
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,143 @@
+'''
+Пакетный перенос полигонов в корзину и восстановление из неё.
+Объекты выбираются списком id или фильтром (сегмент, владелец, bbox) и
+переносятся одним запросом: DELETE ... RETURNING в CTE и INSERT ... SELECT из него.
+'''
+
+from typing import Any, Dict, List, Optional, Tuple
+from geometry import parse_bbox, BBOX_COLUMNS, METRIC_COLUMNS, BBOX_OVERLAP_SQL
+from backfill import update_derived
+from bulk import max_items
+
+# Колонки, общие для polygon_objects и trash_polygons (сегмент в корзине называется layer)
+SHARED_COLUMNS = (
+    'id', 'name', 'type', 'area', 'population', 'status', 'coordinates', 'color',
+    'visible', 'attributes', 'user_id', 'coordinates_simplified', 'coordinates_packed'
+) + BBOX_COLUMNS + METRIC_COLUMNS
+_SHARED_SQL = ', '.join(SHARED_COLUMNS)
+
+MOVE_SQL = (
+    "WITH moved AS ("
+    "DELETE FROM polygon_objects WHERE {where} RETURNING *"
+    "), trashed AS ("
+    "INSERT INTO trash_polygons (" + _SHARED_SQL + ", layer, original_created_at, moved_by_user) "
+    "SELECT " + _SHARED_SQL + ", COALESCE(segment, ''), created_at, %s FROM moved "
+    "ON CONFLICT (id) DO UPDATE SET " +
+    ', '.join(col + ' = EXCLUDED.' + col for col in SHARED_COLUMNS[1:]) +
+    ", layer = EXCLUDED.layer, original_created_at = EXCLUDED.original_created_at, "
+    "moved_by_user = EXCLUDED.moved_by_user, moved_to_trash_at = CURRENT_TIMESTAMP"
+    "), tombstones AS ("
+    "INSERT INTO polygon_tombstones (id, version) SELECT id, %s FROM moved "
+    "ON CONFLICT (id) DO UPDATE SET version = EXCLUDED.version, deleted_at = CURRENT_TIMESTAMP"
+    ") SELECT id, name FROM moved"
+)
+
+_RESTORE_COLUMNS = tuple(col for col in SHARED_COLUMNS if col != 'color')
+
+# Занятые id (объект с таким id создан заново) пропускаются и остаются в корзине
+RESTORE_SQL = (
+    "WITH restored AS ("
+    "INSERT INTO polygon_objects (" + ', '.join(_RESTORE_COLUMNS) + ", color, segment, created_at, row_version) "
+    "SELECT " + ', '.join('t.' + col for col in _RESTORE_COLUMNS) + ", "
+    "COALESCE(c.color, t.color), t.layer, t.original_created_at, %s "
+    "FROM (SELECT * FROM trash_polygons WHERE {where}) AS t "
+    "LEFT JOIN unnest(%s::text[], %s::text[]) AS c (layer, color) ON c.layer = t.layer "
+    "ON CONFLICT (id) DO NOTHING "
+    "RETURNING id, name, coordinates_simplified IS NULL OR area_m2 IS NULL AS legacy"
+    "), removed AS ("
+    "DELETE FROM trash_polygons t USING restored r WHERE t.id = r.id"
+    "), cleared AS ("
+    "DELETE FROM polygon_tombstones d USING restored r WHERE d.id = r.id"
+    ") SELECT id, name, legacy FROM restored"
+)
+
+def parse_selection(body: Dict[str, Any], segment_column: str) -> Tuple[str, List[Any], Optional[List[str]]]:
+    '''
+    Условие WHERE по ids или filter {segment, owner, bbox} из тела запроса.
+    Сегмент сравнивается с каждым из сегментов объекта (через запятую).
+    Возвращает (sql, параметры, запрошенные ids или None). Бросает ValueError
+    '''
+    ids = body.get('ids')
+    selection = body.get('filter')
+    if ids is not None:
+        if selection is not None:
+            raise ValueError('Use either ids or filter')
+        if not isinstance(ids, list) or not ids or not all(isinstance(i, str) and i for i in ids):
+            raise ValueError('ids must be a non-empty list of strings')
+        if len(ids) > max_items():
+            raise ValueError(f'Too many ids, limit is {max_items()}')
+        ids = list(dict.fromkeys(ids))
+        return "id = ANY(%s)", [ids], ids
+
+    if not isinstance(selection, dict):
+        raise ValueError('ids or filter required')
+    conditions: List[str] = []
+    params: List[Any] = []
+    if selection.get('segment') is not None:
+        conditions.append(
+            "EXISTS (SELECT 1 FROM unnest(string_to_array(" + segment_column + ", ',')) AS ref(name) "
+            "WHERE btrim(ref.name) = %s)"
+        )
+        params.append(str(selection['segment']).strip())
+    if selection.get('owner') is not None:
+        conditions.append("user_id = %s")
+        params.append(str(selection['owner']))
+    bbox = selection.get('bbox')
+    if isinstance(bbox, list):
+        bbox = ','.join(str(v) for v in bbox)
+    bbox = parse_bbox(bbox)
+    if bbox:
+        conditions.append(BBOX_OVERLAP_SQL)
+        params.extend(bbox)
+    if not conditions:
+        raise ValueError('filter must contain segment, owner or bbox')
+    return ' AND '.join(conditions), params, None
+
+
+def deletable_segments(cur, where_sql: str, params: List[Any], user_id: str, check) -> List[str]:
+    '''
+    Сегменты чужих объектов выборки, из которых пользователь может удалять.
+    check(segment) -> bool проверяет право 'delete' на сегмент
+    '''
+    cur.execute(
+        "SELECT DISTINCT COALESCE(segment, '') AS segment FROM polygon_objects "
+        "WHERE (" + where_sql + ") AND user_id IS DISTINCT FROM %s",
+        params + [user_id]
+    )
+    return [row['segment'] for row in cur.fetchall() if check(row['segment'])]
+
+
+def move_to_trash(cur, where_sql: str, params: List[Any], user_id: str, version: int) -> List[Dict[str, Any]]:
+    '''Переносит выбранные объекты в корзину; возвращает id и name перенесённых'''
+    cur.execute(MOVE_SQL.format(where=where_sql), params + [user_id, version])
+    return cur.fetchall()
+
+
+def trash_layers(cur, where_sql: str, params: List[Any]) -> List[str]:
+    '''Сегменты (layer) выбранных объектов корзины'''
+    cur.execute("SELECT DISTINCT layer FROM trash_polygons WHERE " + where_sql, params)
+    return [row['layer'] for row in cur.fetchall()]
+
+
+def restore_from_trash(cur, where_sql: str, params: List[Any], version: int,
+                       layer_colors: Dict[str, str]) -> List[Dict[str, Any]]:
+    '''
+    Восстанавливает выбранные объекты из корзины с цветами сегментов layer_colors;
+    возвращает id и name восстановленных
+    '''
+    layers = list(layer_colors)
+    cur.execute(
+        RESTORE_SQL.format(where=where_sql),
+        [version] + params + [layers, [layer_colors[layer] for layer in layers]]
+    )
+    restored = cur.fetchall()
+    legacy = [row['id'] for row in restored if row['legacy']]
+    if legacy:
+        fill_legacy_geometry(cur, legacy)
+    return restored
+
+
+def fill_legacy_geometry(cur, ids: List[str]) -> None:
+    '''Досчитывает производные колонки объектов, попавших в корзину до V0021/V0026'''
+    cur.execute("SELECT id, coordinates FROM polygon_objects WHERE id = ANY(%s)", (ids,))
+    update_derived(cur, [(row['id'], row['coordinates']) for row in cur.fetchall()])
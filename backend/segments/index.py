@@ -1,15 +1,14 @@
 '''
 Business: Manage land plot segments with colors and order
 Args: event with httpMethod, body; context with request_id
-Returns: GET - list of segments, POST - updated segments
+Returns: GET - list of segments (or color drift report with action=check_colors), POST - updated segments
 '''
 
 import json
-import os
 from typing import Dict, Any, List, Optional
 from dataclasses import dataclass
-import psycopg2
 from psycopg2.extras import RealDictCursor
+from db import get_connection, release_connection
 
 @dataclass
 class Segment:
@@ -18,9 +17,93 @@ class Segment:
     color: str
     order_index: int
 
-def get_db_connection():
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn)
+def bump_segments_version(cur) -> None:
+    '''Increments segments data version so polygon list ETags and caches are invalidated'''
+    cur.execute('''
+        INSERT INTO t_p43707323_map_portal_creation.data_versions (name, version, updated_at)
+        VALUES ('segments', 1, CURRENT_TIMESTAMP)
+        ON CONFLICT (name) DO UPDATE
+        SET version = t_p43707323_map_portal_creation.data_versions.version + 1, updated_at = CURRENT_TIMESTAMP
+    ''')
+
+# Blended color of every polygon from its comma-separated segments.
+# Mirrors colors.segment_color in the polygons function: a single color is kept
+# as is, several colors are averaged per channel with integer division.
+# Migration V0029 applies the same blend once to all existing polygons.
+BLENDED_COLORS_CTE = '''
+    WITH parts AS (
+        SELECT p.id, s.color
+        FROM t_p43707323_map_portal_creation.polygon_objects p
+        CROSS JOIN LATERAL unnest(string_to_array(p.segment, ',')) AS part(name)
+        JOIN t_p43707323_map_portal_creation.segments s
+          ON s.name = btrim(part.name, E' \\t\\r\\n') AND s.color IS NOT NULL
+        WHERE {filter}
+    ),
+    blended AS (
+        SELECT id,
+               CASE WHEN count(*) = 1 THEN min(color) ELSE
+                   '#' || lpad(to_hex(sum(('x' || substr(ltrim(color, '#'), 1, 2))::bit(8)::int) / count(*)), 2, '0')
+                       || lpad(to_hex(sum(('x' || substr(ltrim(color, '#'), 3, 2))::bit(8)::int) / count(*)), 2, '0')
+                       || lpad(to_hex(sum(('x' || substr(ltrim(color, '#'), 5, 2))::bit(8)::int) / count(*)), 2, '0')
+               END AS color
+        FROM parts
+        GROUP BY id
+    )
+'''
+
+AFFECTED_POLYGONS_FILTER = '''
+    EXISTS (
+        SELECT 1 FROM unnest(string_to_array(p.segment, ',')) AS ref(name)
+        WHERE btrim(ref.name, E' \\t\\r\\n') = ANY(%s)
+    )
+'''
+
+def recompute_polygon_colors(cur, segment_names: Optional[List[str]] = None) -> int:
+    '''
+    Recomputes stored polygon colors in one set-based UPDATE.
+    Only polygons referencing segment_names are touched (all polygons if None).
+    Changed rows get a new polygons data version so caches and delta sync see them;
+    the version is not bumped when no stored color changes.
+    '''
+    if segment_names is not None and not segment_names:
+        return 0
+    
+    if segment_names is None:
+        filter_sql, params = 'TRUE', []
+    else:
+        filter_sql, params = AFFECTED_POLYGONS_FILTER, [list(segment_names)]
+    
+    cur.execute(BLENDED_COLORS_CTE.format(filter=filter_sql) + '''
+        , changed AS (
+            SELECT b.id, b.color
+            FROM t_p43707323_map_portal_creation.polygon_objects p
+            JOIN blended b ON b.id = p.id
+            WHERE p.color IS DISTINCT FROM b.color
+        ),
+        bumped AS (
+            INSERT INTO t_p43707323_map_portal_creation.data_versions (name, version, updated_at)
+            SELECT 'polygons', 1, CURRENT_TIMESTAMP WHERE EXISTS (SELECT 1 FROM changed)
+            ON CONFLICT (name) DO UPDATE
+            SET version = t_p43707323_map_portal_creation.data_versions.version + 1, updated_at = CURRENT_TIMESTAMP
+            RETURNING version
+        )
+        UPDATE t_p43707323_map_portal_creation.polygon_objects p
+        SET color = c.color, row_version = (SELECT version FROM bumped)
+        FROM changed c
+        WHERE p.id = c.id
+    ''', params)
+    return cur.rowcount
+
+def find_color_drift(cur) -> List[Dict[str, Any]]:
+    '''Polygons whose stored color differs from the color blended from current segments'''
+    cur.execute(BLENDED_COLORS_CTE.format(filter='TRUE') + '''
+        SELECT p.id, p.name, p.segment, p.color AS stored_color, b.color AS expected_color
+        FROM t_p43707323_map_portal_creation.polygon_objects p
+        JOIN blended b ON b.id = p.id
+        WHERE p.color IS DISTINCT FROM b.color
+        ORDER BY p.id
+    ''')
+    return [dict(row) for row in cur.fetchall()]
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
@@ -45,10 +128,36 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     }
     
     try:
-        conn = get_db_connection()
+        conn = get_connection()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         if method == 'GET':
+            params = event.get('queryStringParameters', {}) or {}
+            
+            if params.get('action') == 'check_colors':
+                # Consistency check: report polygons whose stored color has drifted
+                user_id = event.get('headers', {}).get('X-User-Id')
+                cur.execute(
+                    'SELECT role FROM t_p43707323_map_portal_creation.users WHERE id = %s',
+                    (user_id,)
+                )
+                user = cur.fetchone()
+                if not user or user['role'] != 'admin':
+                    return {
+                        'statusCode': 403,
+                        'headers': headers,
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'Admin role required'})
+                    }
+                
+                drift = find_color_drift(cur)
+                return {
+                    'statusCode': 200,
+                    'headers': headers,
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'drift_count': len(drift), 'items': drift}, ensure_ascii=False)
+                }
+            
             cur.execute('''
                 SELECT id, name, color, order_index 
                 FROM t_p43707323_map_portal_creation.segments 
@@ -120,6 +229,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 ''', (name, color, order_index))
                 new_id = cur.fetchone()['id']
             
+            # Bulk edits may recolor, rename or drop any segment: recompute every polygon
+            recompute_polygon_colors(cur, None if 'segments' in body else [name])
+            bump_segments_version(cur)
             conn.commit()
             
             # Return updated list
@@ -164,12 +276,24 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 values.append(body['order_index'])
             
             if updates:
+                cur.execute(
+                    'SELECT name FROM t_p43707323_map_portal_creation.segments WHERE id = %s',
+                    (seg_id,)
+                )
+                previous = cur.fetchone()
+                
                 values.append(seg_id)
                 cur.execute(f'''
                     UPDATE t_p43707323_map_portal_creation.segments
                     SET {', '.join(updates)}
                     WHERE id = %s
                 ''', values)
+                
+                affected_names = [body['name']] if 'name' in body else []
+                if previous:
+                    affected_names.append(previous['name'])
+                recompute_polygon_colors(cur, affected_names)
+                bump_segments_version(cur)
                 conn.commit()
             
             # Return updated list
@@ -203,7 +327,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             cur.execute('''
                 DELETE FROM t_p43707323_map_portal_creation.segments
                 WHERE id = %s
+                RETURNING name
             ''', (seg_id,))
+            deleted = cur.fetchone()
+            recompute_polygon_colors(cur, [deleted['name']] if deleted else [])
+            bump_segments_version(cur)
             conn.commit()
             
             # Return updated list
@@ -238,4 +366,4 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         if 'cur' in locals():
             cur.close()
         if 'conn' in locals():
-            conn.close()
\ No newline at end of file
+            release_connection(conn)
\ No newline at end of file
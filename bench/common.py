@@ -0,0 +1,111 @@
+'''
+Общее для бенчмарков: загрузка модулей функции (как в tests/conftest.py), вызов
+обработчика, синтетические участки. Бенчмарки с базой запускаются только с
+DATABASE_URL, создают объекты с префиксом bench- и удаляют их в конце.
+Каталог не входит ни в одну функцию и не деплоится.
+'''
+
+import contextlib
+import importlib
+import io
+import json
+import math
+import os
+import random
+import statistics
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+
+BENCH_PREFIX = 'bench-'
+BENCH_USER = 'bench-admin'
+
+
+def load_function(function: str, module: str = 'index'):
+    '''Импортирует module из backend/<function> вместе с его соседними модулями'''
+    function_dir = BACKEND_DIR / function
+    for path in function_dir.glob('*.py'):
+        sys.modules.pop(path.stem, None)
+    sys.path.insert(0, str(function_dir))
+    try:
+        return importlib.import_module(module)
+    finally:
+        sys.path.remove(str(function_dir))
+
+
+def require_dsn() -> str:
+    '''DATABASE_URL или выход с сообщением: без базы бенчмарк пропускается'''
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        print('DATABASE_URL not configured, skipping')
+        sys.exit(0)
+    return dsn
+
+
+def connect():
+    import psycopg2
+    conn = psycopg2.connect(require_dsn())
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("SET search_path TO t_p43707323_map_portal_creation, public")
+    return conn
+
+
+def seed_user(conn) -> None:
+    with conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO users (id, email, name, password_hash, role, status) "
+            "VALUES (%s, %s, 'Bench', 'x', 'admin', 'active') ON CONFLICT (id) DO NOTHING",
+            (BENCH_USER, BENCH_USER + '@example.com')
+        )
+
+
+def cleanup(conn) -> None:
+    '''Удаляет всё, что создал бенчмарк'''
+    pattern = BENCH_PREFIX + '%'
+    with conn.cursor() as cur:
+        for table in ('polygon_objects', 'trash_polygons', 'polygon_tombstones'):
+            cur.execute("DELETE FROM " + table + " WHERE id LIKE %s", (pattern,))
+        cur.execute("DELETE FROM audit_log WHERE user_id = %s", (BENCH_USER,))
+        cur.execute("DELETE FROM users WHERE id = %s", (BENCH_USER,))
+
+
+def call(index, method: str, params: Optional[Dict[str, str]] = None, body: Any = None) -> Tuple[int, str]:
+    '''Вызов обработчика от имени BENCH_USER; DEBUG-вывод обработчика подавляется'''
+    event = {'httpMethod': method, 'queryStringParameters': params or {},
+             'headers': {'X-User-Id': BENCH_USER}}
+    if body is not None:
+        event['body'] = json.dumps(body)
+    with contextlib.redirect_stdout(io.StringIO()):
+        response = index.handler(event, None)
+    return response['statusCode'], response.get('body') or ''
+
+
+def to_normalized(lon: float, lat: float) -> List[float]:
+    '''lon/lat в нормализованные координаты клиента (0..100)'''
+    return [(lon + 180) / 3.6, (90 - lat) / 1.8]
+
+
+def parcel(rng: random.Random, points: int, radius_deg: float, noise: float = 0.0,
+           center: Optional[Tuple[float, float]] = None) -> List[List[float]]:
+    '''
+    Участок вокруг center (по умолчанию случайная точка под Москвой): вытянутый
+    многоугольник из points вершин, noise — относительный шум радиуса (неровные границы)
+    '''
+    lon, lat = center or (rng.uniform(37, 38), rng.uniform(55, 56))
+    stretch = rng.uniform(0.5, 1.0)
+    ring = []
+    for k in range(points):
+        angle = 2 * math.pi * k / points
+        r = radius_deg * (1 + rng.uniform(-noise, noise))
+        ring.append(to_normalized(lon + r * math.cos(angle) / math.cos(math.radians(lat)),
+                                  lat + r * stretch * math.sin(angle)))
+    return ring
+
+
+def percentiles(samples: List[float]) -> Tuple[float, float]:
+    '''Медиана и p90'''
+    ordered = sorted(samples)
+    return statistics.median(ordered), ordered[int(len(ordered) * 0.9)]
@@ -0,0 +1,125 @@
+'''
+Задержка операций CRUD функции polygons на локальном PostgreSQL.
+Уровень запросов: literal (значения в тексте SQL) против execute_prepared.
+Уровень обработчика: create, get by id, update, list(50), move to trash —
+с подготовленными выражениями и без них (DB_PREPARED_STATEMENTS=0).
+Нужен DATABASE_URL; объекты bench-* удаляются в конце.
+
+    DATABASE_URL=... python bench/crud_latency.py [запусков]
+'''
+
+import json
+import os
+import random
+import sys
+import time
+
+from common import BENCH_PREFIX, call, cleanup, connect, load_function, parcel, percentiles, require_dsn, seed_user
+
+index = load_function('polygons')
+db = load_function('polygons', 'db')
+
+RING = parcel(random.Random(12), 200, 0.003, 0.01)
+
+
+def _polygon(i: int, name: str):
+    return {'id': '%sp%d' % (BENCH_PREFIX, i), 'name': name, 'type': 'land', 'area': 10.5, 'status': 'active',
+            'coordinates': RING, 'color': '#F59E0B', 'segment': 'Коммерция', 'visible': True,
+            'attributes': {'Кадастровый номер': '77:01:0000001'}}
+
+
+def _timed_us(fn, runs: int) -> float:
+    samples = []
+    for i in range(runs):
+        started = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - started) * 1e6)
+    return percentiles(samples)[0]
+
+
+def statements(runs: int) -> None:
+    import psycopg2
+    from psycopg2.extras import Json, RealDictCursor
+    conn = psycopg2.connect(require_dsn(), connection_factory=db.PooledConnection)
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur.execute("SET search_path TO t_p43707323_map_portal_creation, public")
+    polygon_id = BENCH_PREFIX + 'p0'
+    ring_literal = json.dumps(RING).replace("'", "''")
+
+    cases = (
+        ('select by id',
+         lambda i: cur.execute("SELECT * FROM polygon_objects WHERE id = '" + polygon_id + "'"),
+         lambda i: db.execute_prepared(cur, "SELECT * FROM polygon_objects WHERE id = %s", (polygon_id,))),
+        ('permission lookup',
+         lambda i: cur.execute(
+             "SELECT permission_level FROM permissions WHERE user_id = 'bench-admin' AND resource_type = 'layer' "
+             "AND (resource_id = 'Коммерция' OR resource_id IS NULL) AND permission_level != 'revoked' "
+             "ORDER BY resource_id DESC LIMIT 1"),
+         lambda i: db.execute_prepared(
+             cur,
+             "SELECT permission_level FROM permissions WHERE user_id = %s AND resource_type = %s "
+             "AND (resource_id = %s OR resource_id IS NULL) AND permission_level != 'revoked' "
+             "ORDER BY resource_id DESC LIMIT 1",
+             ('bench-admin', 'layer', 'Коммерция'))),
+        ('update 200-point ring',
+         lambda i: cur.execute(
+             "UPDATE polygon_objects SET name = 'n" + str(i) + "', coordinates = '" + ring_literal + "' "
+             "WHERE id = '" + polygon_id + "'"),
+         lambda i: db.execute_prepared(
+             cur, "UPDATE polygon_objects SET name = %s, coordinates = %s WHERE id = %s",
+             ('n%d' % i, Json(RING), polygon_id))),
+    )
+    print('statement, median of %d          literal   prepared' % runs)
+    for label, literal, prepared in cases:
+        literal_us = _timed_us(literal, runs)
+        conn.rollback()
+        prepared_us = _timed_us(prepared, runs)
+        conn.rollback()
+        print('  %-28s %7.0f us %7.0f us' % (label, literal_us, prepared_us))
+    conn.close()
+
+
+def requests(runs: int, prepared: bool) -> None:
+    os.environ['DB_PREPARED_STATEMENTS'] = '1' if prepared else '0'
+    operations = (
+        ('create', lambda i: call(index, 'POST', body=_polygon(i, 'created')), 201),
+        ('get by id', lambda i: call(index, 'GET', {'id': '%sp%d' % (BENCH_PREFIX, i)}), 200),
+        ('update', lambda i: call(index, 'PUT', {'id': '%sp%d' % (BENCH_PREFIX, i)}, _polygon(i, 'updated')), 200),
+        ('list (50)', lambda i: call(index, 'GET', {'limit': '50'}), 200),
+        ('move to trash', lambda i: call(index, 'DELETE', {'id': '%sp%d' % (BENCH_PREFIX, i),
+                                                           'action': 'move_to_trash'}), 200),
+    )
+    print('handler, prepared statements %s' % ('on' if prepared else 'off'))
+    for label, operation, expected in operations:
+        samples = []
+        for i in range(runs):
+            started = time.perf_counter()
+            status, body = operation(i)
+            samples.append((time.perf_counter() - started) * 1000)
+            if status != expected:
+                raise SystemExit('%s returned %d: %s' % (label, status, body[:200]))
+        median, p90 = percentiles(samples)
+        print('  %-14s median %6.2f ms  p90 %6.2f ms' % (label, median, p90))
+
+
+def main() -> None:
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    conn = connect()
+    cleanup(conn)
+    seed_user(conn)
+    try:
+        call(index, 'POST', body=_polygon(0, 'statement bench'))
+        statements(runs * 10)
+        cleanup(conn)
+        seed_user(conn)
+        for prepared in (False, True):
+            requests(runs, prepared)
+            cleanup(conn)
+            seed_user(conn)
+    finally:
+        cleanup(conn)
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+'''
+Компактная геометрия (format=packed) против JSON.
+Без базы: байты на объект, время кодирования и декодирования, максимальная
+ошибка квантования. С DATABASE_URL дополнительно: размер и время полного
+GET-списка из N участков в обоих форматах, после gzip и с fields=id,coordinates.
+Объекты bench-* удаляются в конце.
+
+    [DATABASE_URL=...] python bench/packed_size.py [участков]
+'''
+
+import base64
+import gzip
+import json
+import os
+import random
+import sys
+import time
+
+from common import BENCH_PREFIX, call, cleanup, connect, load_function, parcel, seed_user
+
+index = load_function('polygons')
+packed = load_function('polygons', 'packed')
+
+POINTS = 40
+BULK_CHUNK = 5000
+
+
+def geometry_only(rings) -> None:
+    count = len(rings)
+    started = time.perf_counter()
+    blobs = [packed.encode_coordinates(ring) for ring in rings]
+    encode_us = (time.perf_counter() - started) / count * 1e6
+    texts = [json.dumps(ring) for ring in rings]
+
+    started = time.perf_counter()
+    for text in texts:
+        json.loads(text)
+    json_us = (time.perf_counter() - started) / count * 1e6
+    started = time.perf_counter()
+    decoded = [packed.decode_coordinates(blob) for blob in blobs]
+    decode_us = (time.perf_counter() - started) / count * 1e6
+
+    error = max(abs(a - b) for ring, back in zip(rings, decoded)
+                for point, point_back in zip(ring, back) for a, b in zip(point, point_back))
+    print('geometry, %d objects of %d points:' % (count, POINTS))
+    print('  bytes/object: json %.0f, packed %.0f, packed base64 %.0f'
+          % (sum(map(len, texts)) / count, sum(map(len, blobs)) / count,
+             sum(len(base64.b64encode(blob)) for blob in blobs) / count))
+    print('  encode %.1f us/object; decode: json.loads %.1f us, decode_coordinates %.1f us'
+          % (encode_us, json_us, decode_us))
+    print('  max quantization error %.1e normalized units' % error)
+
+
+def list_responses(rings) -> None:
+    conn = connect()
+    cleanup(conn)
+    seed_user(conn)
+    try:
+        for first in range(0, len(rings), BULK_CHUNK):
+            items = [{'id': '%sk%d' % (BENCH_PREFIX, i), 'name': 'Участок %d' % i, 'type': 'land', 'area': 1,
+                      'status': 'active', 'segment': 'Bench', 'coordinates': rings[i]}
+                     for i in range(first, min(len(rings), first + BULK_CHUNK))]
+            status, body = call(index, 'POST', body={'action': 'bulk', 'items': items})
+            if status != 200:
+                raise SystemExit('bulk import returned %d: %s' % (status, body[:200]))
+
+        def best_of(params, runs=5):
+            best, body = None, ''
+            for _ in range(runs):
+                started = time.perf_counter()
+                status, body = call(index, 'GET', params)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            return best, body.encode('utf-8')
+
+        print('GET list, %d objects in the table:' % len(rings))
+        for label, params in (('full list', {}), ('fields=id,coordinates', {'fields': 'id,coordinates'})):
+            json_s, json_body = best_of(params)
+            packed_s, packed_body = best_of(dict(params, format='packed'))
+            print('  %-22s json %6.2f MB in %5.0f ms, packed %6.2f MB in %5.0f ms (%.2fx)'
+                  % (label, len(json_body) / 1e6, json_s * 1000, len(packed_body) / 1e6, packed_s * 1000,
+                     len(json_body) / len(packed_body)))
+            json_gz, packed_gz = len(gzip.compress(json_body, 6)), len(gzip.compress(packed_body, 6))
+            print('  %-22s gzip -6: json %6.2f MB, packed %6.2f MB (%.2fx)'
+                  % ('', json_gz / 1e6, packed_gz / 1e6, json_gz / packed_gz))
+    finally:
+        cleanup(conn)
+        conn.close()
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    rng = random.Random(19)
+    rings = [parcel(rng, POINTS, rng.uniform(0.001, 0.003), 0.2) for _ in range(count)]
+    geometry_only(rings)
+    if os.environ.get('DATABASE_URL'):
+        list_responses(rings)
+    else:
+        print('DATABASE_URL not configured, list responses skipped')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+'''
+Уровни упрощения геометрии (coordinates_simplified): сколько вершин и байт JSON
+остаётся на каждом уровне SIMPLIFY_LEVELS для участков разной детальности.
+База не нужна.
+
+    python bench/simplify_levels.py [объектов на форму]
+'''
+
+import json
+import random
+import sys
+import time
+
+from common import load_function, parcel
+
+geometry = load_function('polygons', 'geometry')
+
+# (название, вершин, радиус в градусах, шум границы)
+SHAPES = (
+    ('parcel 120 vertices', 120, 0.002, 0.02),
+    ('parcel 600 vertices', 600, 0.004, 0.01),
+    ('district 4000 vertices', 4000, 0.05, 0.005),
+)
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    levels = [str(zoom) for zoom in sorted(geometry.SIMPLIFY_LEVELS, reverse=True)]
+    print('%-24s %-8s %10s %10s' % ('shape', 'level', 'vertices', 'bytes'))
+    for name, points, radius, noise in SHAPES:
+        rng = random.Random(points)
+        rings = [parcel(rng, points, radius, noise) for _ in range(count)]
+        started = time.perf_counter()
+        built = [geometry.build_simplified_levels(ring) for ring in rings]
+        build_us = (time.perf_counter() - started) / count * 1e6
+
+        rows = [('full', rings)] + [('z<=' + level, [b[level] for b in built]) for level in levels]
+        for label, geometries in rows:
+            vertices = sum(len(g) for g in geometries) / count
+            size = sum(len(json.dumps(g)) for g in geometries) / count
+            print('%-24s %-8s %10.0f %10.0f' % (name, label, vertices, size))
+        print('%-24s build_simplified_levels %.0f us/object' % ('', build_us))
+
+
+if __name__ == '__main__':
+    main()
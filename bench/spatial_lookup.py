@@ -0,0 +1,105 @@
+'''
+Точечные запросы ?at= и ?near= по GiST-индексу охватов против перебора всех
+полигонов в памяти. Загружает N участков по 8 вершин (по умолчанию 100000)
+через bulk-импорт, сверяет ответы с перебором и печатает время на запрос.
+Нужен DATABASE_URL; объекты bench-* удаляются в конце.
+
+    DATABASE_URL=... python bench/spatial_lookup.py [участков]
+'''
+
+import json
+import random
+import sys
+import time
+
+from psycopg2.extras import RealDictCursor
+
+from common import BENCH_PREFIX, call, cleanup, connect, load_function, parcel, seed_user
+
+index = load_function('polygons')
+geometry = load_function('polygons', 'geometry')
+
+REGION = ((36.0, 39.0), (54.0, 57.0))
+CHECK_POINTS = 50
+BENCH_POINTS = 200
+NEAR_RADIUS_M = 1000
+BULK_CHUNK = 5000
+
+
+def load_parcels(count: int, rng: random.Random) -> None:
+    started = time.perf_counter()
+    for first in range(0, count, BULK_CHUNK):
+        items = []
+        for i in range(first, min(count, first + BULK_CHUNK)):
+            center = (rng.uniform(*REGION[0]), rng.uniform(*REGION[1]))
+            items.append({'id': '%ss%d' % (BENCH_PREFIX, i), 'name': 'Участок %d' % i, 'type': 'land',
+                          'area': rng.uniform(1, 10), 'status': 'active', 'segment': 'Bench',
+                          'coordinates': parcel(rng, 8, rng.uniform(0.001, 0.01), 0.2, center)})
+        status, body = call(index, 'POST', body={'action': 'bulk', 'items': items})
+        if status != 200:
+            raise SystemExit('bulk import returned %d: %s' % (status, body[:200]))
+    print('loaded %d parcels in %.1f s' % (count, time.perf_counter() - started))
+
+
+def query_ids(params):
+    status, body = call(index, 'GET', params)
+    if status != 200:
+        raise SystemExit('GET %s returned %d: %s' % (params, status, body[:200]))
+    return {item['id'] for item in json.loads(body)}
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rng = random.Random(17)
+    conn = connect()
+    cleanup(conn)
+    seed_user(conn)
+    try:
+        load_parcels(count, rng)
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("ANALYZE polygon_objects")
+            started = time.perf_counter()
+            cur.execute("SELECT id, coordinates FROM polygon_objects WHERE id LIKE %s", (BENCH_PREFIX + '%',))
+            rows = cur.fetchall()
+            load_ms = (time.perf_counter() - started) * 1000
+
+        margin = 0.1
+        points = [(rng.uniform(REGION[0][0] + margin, REGION[0][1] - margin),
+                   rng.uniform(REGION[1][0] + margin, REGION[1][1] - margin)) for _ in range(BENCH_POINTS)]
+
+        mismatches = 0
+        for lon, lat in points[:CHECK_POINTS]:
+            at = '%f,%f' % (lon, lat)
+            expected = {r['id'] for r in rows if geometry.contains_point(r['coordinates'], lon, lat)}
+            mismatches += query_ids({'at': at, 'fields': 'id', 'limit': '1000'}) != expected
+            expected = {r['id'] for r in rows
+                        if geometry.distance_to_polygon_m(r['coordinates'], lon, lat) <= NEAR_RADIUS_M}
+            mismatches += query_ids({'near': at, 'radius': str(NEAR_RADIUS_M), 'fields': 'id',
+                                     'limit': '1000'}) != expected
+        print('results vs brute force on %d points: %d mismatches' % (CHECK_POINTS, mismatches))
+
+        for label, make_params in (
+            ('at= (GiST)', lambda lon, lat: {'at': '%f,%f' % (lon, lat)}),
+            ('near= r=%d m (GiST)' % NEAR_RADIUS_M,
+             lambda lon, lat: {'near': '%f,%f' % (lon, lat), 'radius': str(NEAR_RADIUS_M)}),
+        ):
+            hits = 0
+            started = time.perf_counter()
+            for lon, lat in points:
+                hits += len(query_ids(make_params(lon, lat)))
+            elapsed = (time.perf_counter() - started) / len(points) * 1000
+            print('%-22s %7.2f ms/request, %.1f hits on average' % (label, elapsed, hits / len(points)))
+
+        started = time.perf_counter()
+        for lon, lat in points[:20]:
+            [r['id'] for r in rows if geometry.contains_point(r['coordinates'], lon, lat)]
+        elapsed = (time.perf_counter() - started) / 20 * 1000
+        print('%-22s %7.1f ms/point (rows already in memory; loading them took %.0f ms)'
+              % ('linear scan', elapsed, load_ms))
+    finally:
+        cleanup(conn)
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+'''
+Пиковая память и время сборки полного списка полигонов: построчная запись из
+серверного курсора (streaming.write_rows) против сборки списка словарей и
+json.dumps. Курсор поддельный: отдаёт строки той же формы, что psycopg2
+(кортежи с JSON-текстом или словари с разобранным JSON). База не нужна.
+Каждый замер идёт в отдельном процессе, пик — рост ru_maxrss; время сериализации
+считается без создания самих строк (это работа драйвера).
+
+    python bench/stream_memory.py [строк ...]        # по умолчанию 10000 100000
+'''
+
+import io
+import json
+import random
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Tuple
+
+from common import load_function, parcel
+
+index = load_function('polygons')
+listing = load_function('polygons', 'listing')
+streaming = load_function('polygons', 'streaming')
+
+COLUMNS = list(listing.ROW_COLUMNS)
+JSON_COLUMNS = ('coordinates', 'attributes')
+BASE_RING = parcel(random.Random(0), 40, 0.002)
+
+
+def make_row(i: int, raw: bool):
+    '''Строка списка: 40 вершин, кириллица в названии, сегменте и атрибутах'''
+    # Своя копия кольца в каждой строке, как после разбора JSON драйвером
+    offset = (i % 1000) * 1e-4
+    ring = [[x + offset, y - offset] for x, y in BASE_RING]
+    created = datetime(2024, 1, 1) + timedelta(seconds=i)
+    values = {
+        'id': 'poly-%d' % i, 'name': 'Участок %d' % i, 'type': 'land', 'area': Decimal('123.45'),
+        'population': i % 1000, 'status': 'active', 'coordinates': ring, 'color': '#3b82f6',
+        'segment': 'Сегмент А', 'visible': True,
+        'attributes': {'Кадастровый номер': '77:01:%07d' % i, 'Владелец': 'ООО Ромашка'},
+        'user_id': 'user-1', 'created_at': created, 'updated_at': created,
+        'bbox_min_lon': 37.1, 'bbox_min_lat': 55.1, 'bbox_max_lon': 37.2, 'bbox_max_lat': 55.2,
+        'row_version': i, 'area_m2': 25000.5, 'perimeter_m': 640.25,
+        'centroid_lon': 37.15, 'centroid_lat': 55.15,
+    }
+    if not raw:
+        return values
+    for column in JSON_COLUMNS:
+        values[column] = streaming._cast_raw_json(json.dumps(values[column], ensure_ascii=False), None)
+    return tuple(values[column] for column in COLUMNS)
+
+
+class FakeStreamCursor:
+    '''Серверный курсор: строки создаются пачками по мере fetchmany'''
+
+    def __init__(self, count: int):
+        self.count, self.position, self.description = count, 0, None
+        # Время создания строк (работа драйвера) не входит во время сериализации
+        self.generation = 0.0
+
+    def fetchmany(self, size: int):
+        started = time.perf_counter()
+        self.description = [(column,) for column in COLUMNS]
+        rows = [make_row(i, True) for i in range(self.position, min(self.count, self.position + size))]
+        self.position += len(rows)
+        self.generation += time.perf_counter() - started
+        return rows
+
+
+def buffered(count: int) -> Tuple[str, float]:
+    '''Список словарей (RealDictCursor.fetchall), project_row и json.dumps; (тело, секунды сериализации)'''
+    rows = [make_row(i, False) for i in range(count)]
+    started = time.perf_counter()
+    items = [listing.project_row(dict(row), None) for row in rows]
+    body = json.dumps(items, default=index.json_serializer)
+    return body, time.perf_counter() - started
+
+
+def streamed(count: int) -> Tuple[str, float]:
+    cursor = FakeStreamCursor(count)
+    started = time.perf_counter()
+    out = io.StringIO()
+    out.write('[')
+    streaming.write_rows(out, cursor, None)
+    out.write(']')
+    body = out.getvalue()
+    return body, time.perf_counter() - started - cursor.generation
+
+
+def measure(mode: str, count: int) -> None:
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    body, serialize = (buffered if mode == 'buffered' else streamed)(count)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print('%-9s %7d rows: serialize %6.0f ms, peak RSS +%5.0f MB, body %6.1f MB'
+          % (mode, count, serialize * 1000, (peak - base) / 1024, len(body) / 1e6), flush=True)
+
+
+def main() -> None:
+    if len(sys.argv) == 4 and sys.argv[1] == '--run':
+        measure(sys.argv[2], int(sys.argv[3]))
+        return
+    counts = [int(arg) for arg in sys.argv[1:]] or [10000, 100000]
+    for count in counts:
+        for mode in ('buffered', 'streamed'):
+            subprocess.run([sys.executable, __file__, '--run', mode, str(count)], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+-- Охватывающий прямоугольник полигона в градусах (lon/lat) для выборки по окну карты
+ALTER TABLE t_p43707323_map_portal_creation.polygon_objects
+ADD COLUMN IF NOT EXISTS bbox_min_lon DOUBLE PRECISION,
+ADD COLUMN IF NOT EXISTS bbox_min_lat DOUBLE PRECISION,
+ADD COLUMN IF NOT EXISTS bbox_max_lon DOUBLE PRECISION,
+ADD COLUMN IF NOT EXISTS bbox_max_lat DOUBLE PRECISION;
+
+-- Заполняем охват для существующих объектов.
+-- coordinates хранит нормализованные точки [x, y] (0..100), одно кольцо или список колец:
+-- lon = x * 3.6 - 180, lat = 90 - y * 1.8
+UPDATE t_p43707323_map_portal_creation.polygon_objects p
+SET bbox_min_lon = e.min_x * 3.6 - 180,
+    bbox_max_lon = e.max_x * 3.6 - 180,
+    bbox_min_lat = 90 - e.max_y * 1.8,
+    bbox_max_lat = 90 - e.min_y * 1.8
+FROM (
+    SELECT o.id,
+           MIN((pt->>0)::double precision) AS min_x,
+           MAX((pt->>0)::double precision) AS max_x,
+           MIN((pt->>1)::double precision) AS min_y,
+           MAX((pt->>1)::double precision) AS max_y
+    FROM t_p43707323_map_portal_creation.polygon_objects o,
+         jsonb_path_query(o.coordinates, 'strict $.**') AS pt
+    WHERE jsonb_typeof(pt) = 'array'
+      AND jsonb_typeof(pt->0) = 'number'
+      AND jsonb_typeof(pt->1) = 'number'
+    GROUP BY o.id
+) e
+WHERE e.id = p.id;
+
+-- GiST-индекс по выражению, которое использует запрос GET ?bbox=...
+CREATE INDEX IF NOT EXISTS idx_polygon_objects_bbox
+ON t_p43707323_map_portal_creation.polygon_objects
+USING gist (box(point(bbox_min_lon, bbox_min_lat), point(bbox_max_lon, bbox_max_lat)));
+
+COMMENT ON COLUMN t_p43707323_map_portal_creation.polygon_objects.bbox_min_lon IS 'Минимальная долгота охвата полигона';
+COMMENT ON COLUMN t_p43707323_map_portal_creation.polygon_objects.bbox_min_lat IS 'Минимальная широта охвата полигона';
+COMMENT ON COLUMN t_p43707323_map_portal_creation.polygon_objects.bbox_max_lon IS 'Максимальная долгота охвата полигона';
+COMMENT ON COLUMN t_p43707323_map_portal_creation.polygon_objects.bbox_max_lat IS 'Максимальная широта охвата полигона';
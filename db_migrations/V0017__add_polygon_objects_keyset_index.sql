@@ -0,0 +1,3 @@
+-- Индекс для keyset-пагинации списка объектов по (created_at, id)
+CREATE INDEX IF NOT EXISTS idx_polygon_objects_created_at_id
+ON t_p43707323_map_portal_creation.polygon_objects (created_at DESC, id DESC);
@@ -0,0 +1,7 @@
+-- Предрасчитанные упрощённые версии геометрии для мелких масштабов карты.
+-- Формат: {"8": [...], "11": [...], "14": [...]} — ключ = максимальный зум уровня.
+-- Для старых объектов колонка пустая, API отдаёт полную геометрию.
+ALTER TABLE t_p43707323_map_portal_creation.polygon_objects
+ADD COLUMN IF NOT EXISTS coordinates_simplified JSONB;
+
+COMMENT ON COLUMN t_p43707323_map_portal_creation.polygon_objects.coordinates_simplified IS 'Упрощённая геометрия по уровням зума (Дуглас–Пекер)';
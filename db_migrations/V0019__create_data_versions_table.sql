@@ -0,0 +1,12 @@
+-- Счётчики версий данных для инвалидации кэшей (тайлы, ETag списка объектов)
+CREATE TABLE IF NOT EXISTS t_p43707323_map_portal_creation.data_versions (
+    name VARCHAR(100) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO t_p43707323_map_portal_creation.data_versions (name, version)
+VALUES ('polygons', 1)
+ON CONFLICT (name) DO NOTHING;
+
+COMMENT ON TABLE t_p43707323_map_portal_creation.data_versions IS 'Версии наборов данных; увеличиваются в транзакции изменения';
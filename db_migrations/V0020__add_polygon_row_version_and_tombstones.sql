@@ -0,0 +1,23 @@
+-- Версия строки для дельта-синхронизации списка объектов (GET ?since=...)
+ALTER TABLE t_p43707323_map_portal_creation.polygon_objects
+ADD COLUMN IF NOT EXISTS row_version BIGINT NOT NULL DEFAULT 0;
+
+CREATE INDEX IF NOT EXISTS idx_polygon_objects_row_version
+ON t_p43707323_map_portal_creation.polygon_objects (row_version);
+
+-- Надгробия объектов, удалённых из списка (перенос в корзину, удаление всех)
+CREATE TABLE IF NOT EXISTS t_p43707323_map_portal_creation.polygon_tombstones (
+    id TEXT PRIMARY KEY,
+    version BIGINT NOT NULL,
+    deleted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_polygon_tombstones_version
+ON t_p43707323_map_portal_creation.polygon_tombstones (version);
+
+INSERT INTO t_p43707323_map_portal_creation.data_versions (name, version)
+VALUES ('segments', 1)
+ON CONFLICT (name) DO NOTHING;
+
+COMMENT ON COLUMN t_p43707323_map_portal_creation.polygon_objects.row_version IS 'Версия данных, в которой объект последний раз изменялся';
+COMMENT ON TABLE t_p43707323_map_portal_creation.polygon_tombstones IS 'Идентификаторы удалённых объектов для дельта-синхронизации';
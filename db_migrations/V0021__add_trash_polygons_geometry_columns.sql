@@ -0,0 +1,39 @@
+-- Корзина хранит те же производные колонки геометрии, что и polygon_objects,
+-- чтобы перенос в корзину и восстановление шли одним INSERT ... SELECT без пересчёта
+ALTER TABLE t_p43707323_map_portal_creation.trash_polygons
+ADD COLUMN IF NOT EXISTS coordinates_simplified JSONB,
+ADD COLUMN IF NOT EXISTS bbox_min_lon DOUBLE PRECISION,
+ADD COLUMN IF NOT EXISTS bbox_min_lat DOUBLE PRECISION,
+ADD COLUMN IF NOT EXISTS bbox_max_lon DOUBLE PRECISION,
+ADD COLUMN IF NOT EXISTS bbox_max_lat DOUBLE PRECISION;
+
+-- Общие объекты (user_id IS NULL) тоже можно перенести в корзину
+ALTER TABLE t_p43707323_map_portal_creation.trash_polygons
+ALTER COLUMN user_id DROP NOT NULL;
+
+-- Заполняем охват для объектов, уже лежащих в корзине (как в V0016).
+-- Упрощённая геометрия для них досчитывается при восстановлении
+UPDATE t_p43707323_map_portal_creation.trash_polygons t
+SET bbox_min_lon = e.min_x * 3.6 - 180,
+    bbox_max_lon = e.max_x * 3.6 - 180,
+    bbox_min_lat = 90 - e.max_y * 1.8,
+    bbox_max_lat = 90 - e.min_y * 1.8
+FROM (
+    SELECT o.id,
+           MIN((pt->>0)::double precision) AS min_x,
+           MAX((pt->>0)::double precision) AS max_x,
+           MIN((pt->>1)::double precision) AS min_y,
+           MAX((pt->>1)::double precision) AS max_y
+    FROM t_p43707323_map_portal_creation.trash_polygons o,
+         jsonb_path_query(o.coordinates, 'strict $.**') AS pt
+    WHERE jsonb_typeof(pt) = 'array'
+      AND jsonb_typeof(pt->0) = 'number'
+      AND jsonb_typeof(pt->1) = 'number'
+    GROUP BY o.id
+) e
+WHERE e.id = t.id;
+
+CREATE INDEX IF NOT EXISTS idx_trash_polygons_user_id
+ON t_p43707323_map_portal_creation.trash_polygons (user_id);
+
+COMMENT ON COLUMN t_p43707323_map_portal_creation.trash_polygons.coordinates_simplified IS 'Упрощённая геометрия объекта на момент переноса в корзину';
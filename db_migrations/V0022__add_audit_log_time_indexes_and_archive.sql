@@ -0,0 +1,38 @@
+-- Журнал аудита читается страницами от новых записей к старым по ключу (created_at, id)
+-- и чистится по возрасту; без индекса по времени каждый запрос сортирует всю таблицу
+UPDATE t_p43707323_map_portal_creation.audit_log
+SET created_at = '-infinity'
+WHERE created_at IS NULL;
+
+ALTER TABLE t_p43707323_map_portal_creation.audit_log
+ALTER COLUMN created_at SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_audit_log_created_at_id
+ON t_p43707323_map_portal_creation.audit_log (created_at, id);
+
+-- Фильтры журнала: по пользователю, действию и объекту, с тем же порядком внутри
+CREATE INDEX IF NOT EXISTS idx_audit_log_user_created_at
+ON t_p43707323_map_portal_creation.audit_log (user_id, created_at, id);
+
+CREATE INDEX IF NOT EXISTS idx_audit_log_action_created_at
+ON t_p43707323_map_portal_creation.audit_log (action, created_at, id);
+
+CREATE INDEX IF NOT EXISTS idx_audit_log_resource_created_at
+ON t_p43707323_map_portal_creation.audit_log (resource_type, resource_id, created_at, id);
+
+-- Архив записей, вынесенных из журнала заданием хранения (POST action=audit_retention)
+CREATE TABLE IF NOT EXISTS t_p43707323_map_portal_creation.audit_log_archive (
+    id INTEGER PRIMARY KEY,
+    user_id VARCHAR(255),
+    action VARCHAR(100) NOT NULL,
+    resource_type VARCHAR(50),
+    resource_id VARCHAR(255),
+    details TEXT,
+    created_at TIMESTAMP NOT NULL,
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_audit_log_archive_created_at
+ON t_p43707323_map_portal_creation.audit_log_archive USING brin (created_at);
+
+COMMENT ON TABLE t_p43707323_map_portal_creation.audit_log_archive IS 'Записи audit_log старше срока хранения';
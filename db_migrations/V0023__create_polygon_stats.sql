@@ -0,0 +1,87 @@
+-- Сводка по объектам карты для GET ?action=stats: число объектов, площадь и население
+-- по комбинации (сегмент, тип, статус, владелец).
+-- Поддерживается триггерами на уровне оператора, поэтому массовые операции
+-- (bulk, перенос в корзину по фильтру) обновляют её одним INSERT ... ON CONFLICT
+CREATE TABLE IF NOT EXISTS t_p43707323_map_portal_creation.polygon_stats (
+    segment TEXT NOT NULL,
+    type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    user_id TEXT,
+    object_count BIGINT NOT NULL DEFAULT 0,
+    total_area NUMERIC NOT NULL DEFAULT 0,
+    total_population BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_polygon_stats_key
+ON t_p43707323_map_portal_creation.polygon_stats (segment, type, status, (COALESCE(user_id, '')));
+
+-- Опустевшие группы удаляются в конце каждого срабатывания триггера; частичный индекс
+-- позволяет найти их, не просматривая всю сводку
+CREATE INDEX IF NOT EXISTS idx_polygon_stats_empty
+ON t_p43707323_map_portal_creation.polygon_stats (object_count) WHERE object_count = 0;
+
+CREATE OR REPLACE FUNCTION t_p43707323_map_portal_creation.polygon_stats_apply()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO t_p43707323_map_portal_creation.polygon_stats AS s
+            (segment, type, status, user_id, object_count, total_area, total_population)
+        SELECT COALESCE(segment, ''), type, status, user_id,
+               -count(*), -COALESCE(sum(area), 0), -COALESCE(sum(population), 0)
+        FROM old_rows
+        GROUP BY 1, 2, 3, 4
+        ORDER BY 1, 2, 3, 4
+        ON CONFLICT (segment, type, status, (COALESCE(user_id, ''))) DO UPDATE
+        SET object_count = s.object_count + EXCLUDED.object_count,
+            total_area = s.total_area + EXCLUDED.total_area,
+            total_population = s.total_population + EXCLUDED.total_population;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO t_p43707323_map_portal_creation.polygon_stats AS s
+            (segment, type, status, user_id, object_count, total_area, total_population)
+        SELECT COALESCE(segment, ''), type, status, user_id,
+               count(*), COALESCE(sum(area), 0), COALESCE(sum(population), 0)
+        FROM new_rows
+        GROUP BY 1, 2, 3, 4
+        ORDER BY 1, 2, 3, 4
+        ON CONFLICT (segment, type, status, (COALESCE(user_id, ''))) DO UPDATE
+        SET object_count = s.object_count + EXCLUDED.object_count,
+            total_area = s.total_area + EXCLUDED.total_area,
+            total_population = s.total_population + EXCLUDED.total_population;
+    END IF;
+
+    DELETE FROM t_p43707323_map_portal_creation.polygon_stats WHERE object_count = 0;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Переходные таблицы нельзя объявить у триггера на несколько событий, поэтому три триггера
+DROP TRIGGER IF EXISTS polygon_stats_insert ON t_p43707323_map_portal_creation.polygon_objects;
+CREATE TRIGGER polygon_stats_insert
+AFTER INSERT ON t_p43707323_map_portal_creation.polygon_objects
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p43707323_map_portal_creation.polygon_stats_apply();
+
+DROP TRIGGER IF EXISTS polygon_stats_update ON t_p43707323_map_portal_creation.polygon_objects;
+CREATE TRIGGER polygon_stats_update
+AFTER UPDATE ON t_p43707323_map_portal_creation.polygon_objects
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p43707323_map_portal_creation.polygon_stats_apply();
+
+DROP TRIGGER IF EXISTS polygon_stats_delete ON t_p43707323_map_portal_creation.polygon_objects;
+CREATE TRIGGER polygon_stats_delete
+AFTER DELETE ON t_p43707323_map_portal_creation.polygon_objects
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p43707323_map_portal_creation.polygon_stats_apply();
+
+-- Начальное заполнение по существующим объектам
+TRUNCATE t_p43707323_map_portal_creation.polygon_stats;
+INSERT INTO t_p43707323_map_portal_creation.polygon_stats
+    (segment, type, status, user_id, object_count, total_area, total_population)
+SELECT COALESCE(segment, ''), type, status, user_id,
+       count(*), COALESCE(sum(area), 0), COALESCE(sum(population), 0)
+FROM t_p43707323_map_portal_creation.polygon_objects
+GROUP BY 1, 2, 3, 4;
+
+COMMENT ON TABLE t_p43707323_map_portal_creation.polygon_stats IS 'Сводка по объектам карты, поддерживается триггерами polygon_stats_*';
@@ -0,0 +1,25 @@
+-- Поиск объектов GET ?q=...: по названию, типу и значениям атрибутов
+-- (кадастровый номер, бенефициар и т.п.) через триграммный индекс
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Текст для поиска: название, тип и все значения атрибутов в нижнем регистре
+CREATE OR REPLACE FUNCTION t_p43707323_map_portal_creation.polygon_search_text(name TEXT, type TEXT, attributes JSONB)
+RETURNS TEXT AS $$
+    SELECT lower(concat_ws(' ', name, type, (
+        SELECT string_agg(value, ' ')
+        FROM jsonb_each_text(CASE WHEN jsonb_typeof(attributes) = 'object' THEN attributes ELSE '{}'::jsonb END)
+    )))
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+CREATE INDEX IF NOT EXISTS idx_polygon_objects_search_trgm
+ON t_p43707323_map_portal_creation.polygon_objects
+USING gin (t_p43707323_map_portal_creation.polygon_search_text(name, type, attributes) gin_trgm_ops);
+
+-- Короткие запросы (1-2 символа) триграммы не покрывают: для них только префикс названия
+CREATE INDEX IF NOT EXISTS idx_polygon_objects_name_prefix
+ON t_p43707323_map_portal_creation.polygon_objects (lower(name) text_pattern_ops);
+
+-- Точный фильтр по атрибуту: attr=Ключ:Значение -> attributes @> {"Ключ": "Значение"}
+CREATE INDEX IF NOT EXISTS idx_polygon_objects_attributes
+ON t_p43707323_map_portal_creation.polygon_objects
+USING gin (attributes jsonb_path_ops);
@@ -0,0 +1,11 @@
+-- Компактная двоичная геометрия для format=packed (backend/polygons/packed.py):
+-- квантованные координаты разностями в zigzag-varint.
+-- Для старых объектов колонка пустая, API кодирует геометрию на лету
+ALTER TABLE t_p43707323_map_portal_creation.polygon_objects
+ADD COLUMN IF NOT EXISTS coordinates_packed BYTEA;
+
+-- Корзина хранит те же производные колонки, что и polygon_objects (см. V0021)
+ALTER TABLE t_p43707323_map_portal_creation.trash_polygons
+ADD COLUMN IF NOT EXISTS coordinates_packed BYTEA;
+
+COMMENT ON COLUMN t_p43707323_map_portal_creation.polygon_objects.coordinates_packed IS 'Геометрия в компактном формате packed v1 (квантование + дельты + varint)';
@@ -0,0 +1,19 @@
+-- Метрики геометрии, которые сервер считает при записи (geometry.compute_metrics):
+-- геодезическая площадь, периметр и центроид. Колонка area остаётся заявленной
+-- клиентом площадью (например, из кадастра). Существующие объекты заполняются
+-- командой POST /polygons {"action": "backfill_geometry"}
+ALTER TABLE t_p43707323_map_portal_creation.polygon_objects
+ADD COLUMN IF NOT EXISTS area_m2 DOUBLE PRECISION,
+ADD COLUMN IF NOT EXISTS perimeter_m DOUBLE PRECISION,
+ADD COLUMN IF NOT EXISTS centroid_lon DOUBLE PRECISION,
+ADD COLUMN IF NOT EXISTS centroid_lat DOUBLE PRECISION;
+
+-- Корзина хранит те же производные колонки, что и polygon_objects (см. V0021)
+ALTER TABLE t_p43707323_map_portal_creation.trash_polygons
+ADD COLUMN IF NOT EXISTS area_m2 DOUBLE PRECISION,
+ADD COLUMN IF NOT EXISTS perimeter_m DOUBLE PRECISION,
+ADD COLUMN IF NOT EXISTS centroid_lon DOUBLE PRECISION,
+ADD COLUMN IF NOT EXISTS centroid_lat DOUBLE PRECISION;
+
+COMMENT ON COLUMN t_p43707323_map_portal_creation.polygon_objects.area_m2 IS 'Геодезическая площадь по координатам, м² (считается сервером)';
+COMMENT ON COLUMN t_p43707323_map_portal_creation.polygon_objects.perimeter_m IS 'Периметр по координатам, м (считается сервером)';
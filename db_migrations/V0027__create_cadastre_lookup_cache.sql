@@ -0,0 +1,12 @@
+-- Кэш ответов НСПД для cadastre-search по нормализованному кадастровому номеру.
+-- found = false — отрицательный кэш («участок не найден»), payload тогда пустой.
+-- expires_at — конец свежести; просроченная запись ещё отдаётся, если НСПД недоступен
+CREATE TABLE IF NOT EXISTS t_p43707323_map_portal_creation.cadastre_lookup_cache (
+    cadastral_number TEXT PRIMARY KEY,
+    found BOOLEAN NOT NULL,
+    payload JSONB,
+    fetched_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL
+);
+
+COMMENT ON TABLE t_p43707323_map_portal_creation.cadastre_lookup_cache IS 'Кэш поиска участков в НСПД (cadastre-search)';
@@ -0,0 +1,12 @@
+-- Кэш ответов Dadata findById/party по ИНН, общий для dadata и company-save.
+-- payload — объект data первой подсказки; found = false — «компания не найдена», payload пустой.
+-- expires_at — конец свежести; ближе к концу запись обновляется заранее в фоне
+CREATE TABLE IF NOT EXISTS t_p43707323_map_portal_creation.company_lookup_cache (
+    inn TEXT PRIMARY KEY,
+    found BOOLEAN NOT NULL,
+    payload JSONB,
+    fetched_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL
+);
+
+COMMENT ON TABLE t_p43707323_map_portal_creation.company_lookup_cache IS 'Кэш поиска компаний в Dadata по ИНН (dadata, company-save)';
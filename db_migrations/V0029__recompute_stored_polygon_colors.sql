@@ -0,0 +1,33 @@
+-- Цвет объекта хранится и читается как есть (без смешивания при чтении), поэтому
+-- однократно пересчитываем polygon_objects.color из текущих сегментов для всех объектов.
+-- То же смешивание, что recompute_polygon_colors в backend/segments/index.py: один цвет
+-- берётся как есть, несколько — среднее по каналам с целочисленным делением.
+-- Изменённые строки получают новую версию polygons, чтобы кэши и since= их увидели.
+WITH bumped AS (
+    INSERT INTO t_p43707323_map_portal_creation.data_versions (name, version, updated_at)
+    VALUES ('polygons', 1, CURRENT_TIMESTAMP)
+    ON CONFLICT (name) DO UPDATE
+    SET version = t_p43707323_map_portal_creation.data_versions.version + 1, updated_at = CURRENT_TIMESTAMP
+    RETURNING version
+),
+parts AS (
+    SELECT p.id, s.color
+    FROM t_p43707323_map_portal_creation.polygon_objects p
+    CROSS JOIN LATERAL unnest(string_to_array(p.segment, ',')) AS part(name)
+    JOIN t_p43707323_map_portal_creation.segments s
+      ON s.name = btrim(part.name, E' \t\r\n') AND s.color IS NOT NULL
+),
+blended AS (
+    SELECT id,
+           CASE WHEN count(*) = 1 THEN min(color) ELSE
+               '#' || lpad(to_hex(sum(('x' || substr(ltrim(color, '#'), 1, 2))::bit(8)::int) / count(*)), 2, '0')
+                   || lpad(to_hex(sum(('x' || substr(ltrim(color, '#'), 3, 2))::bit(8)::int) / count(*)), 2, '0')
+                   || lpad(to_hex(sum(('x' || substr(ltrim(color, '#'), 5, 2))::bit(8)::int) / count(*)), 2, '0')
+           END AS color
+    FROM parts
+    GROUP BY id
+)
+UPDATE t_p43707323_map_portal_creation.polygon_objects p
+SET color = b.color, row_version = (SELECT version FROM bumped)
+FROM blended b
+WHERE p.id = b.id AND p.color IS DISTINCT FROM b.color;
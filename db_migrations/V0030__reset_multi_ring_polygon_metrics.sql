@@ -0,0 +1,9 @@
+-- compute_metrics разбирает кольца по правилу чётности, как contains_point: кольцо
+-- внутри другого — дырка и вычитается из area_m2. Метрики объектов из нескольких колец,
+-- посчитанные прежним способом (сумма колец), сбрасываются и заново заполняются
+-- командой POST /polygons {"action": "backfill_geometry"}
+UPDATE t_p43707323_map_portal_creation.polygon_objects
+SET area_m2 = NULL, perimeter_m = NULL, centroid_lon = NULL, centroid_lat = NULL
+WHERE jsonb_typeof(coordinates) = 'array'
+  AND jsonb_typeof(coordinates->0->0) = 'array'
+  AND jsonb_array_length(coordinates) > 1;
@@ -43,6 +43,11 @@ export default function AIAnalysisDialog({
           layer: object.layer,
           cadastralNumber: object.cadastralNumber,
           attributes: object.attributes,
+          geodesicAreaM2: object.area_m2 ?? undefined,
+          perimeterM: object.perimeter_m ?? undefined,
+          centroid: object.centroid_lon != null && object.centroid_lat != null
+            ? [object.centroid_lon, object.centroid_lat]
+            : undefined,
         },
         coordinates: object.coordinates,
         userQuery: customQuestion || question,
@@ -6,6 +6,8 @@ import { Progress } from '@/components/ui/progress';
 import { Card } from '@/components/ui/card';
 import Icon from '@/components/ui/icon';
 import { useToast } from '@/hooks/use-toast';
+import * as turf from '@turf/turf';
+import { cadastreApi, CadastreBatchItem } from '@/services/cadastreApi';
 
 interface CadastralData {
   cadastralNumber: string;
@@ -29,32 +31,19 @@ export default function BulkCadastralImport({ open, onOpenChange, onImportComple
   const [results, setResults] = useState<{ success: number; failed: number; total: number }>({ success: 0, failed: 0, total: 0 });
   const { toast } = useToast();
 
-  const fetchParcelData = async (cadastralNumber: string): Promise<CadastralData | null> => {
-    try {
-      const response = await fetch(
-        `https://pkk.rosreestr.ru/api/features/1/${cadastralNumber}`
-      );
-
-      if (!response.ok) {
-        return null;
-      }
-
-      const data = await response.json();
-      
-      if (data.feature?.center) {
-        const center = data.feature.center;
-        const attrs = data.feature.attrs;
-        
-        return {
-          cadastralNumber,
-          coordinates: [center.y, center.x],
-          area: attrs?.area_value ? parseFloat(attrs.area_value) : undefined,
-          address: attrs?.address || undefined,
-          category: attrs?.category_type || 'Земельный участок'
-        };
-      }
-      
+  const toCadastralData = (item: CadastreBatchItem): CadastralData | null => {
+    if (item.status !== 'found' || !item.result?.geometry) {
       return null;
+    }
+    try {
+      const [lon, lat] = turf.centroid(item.result.geometry as unknown as turf.AllGeoJSON).geometry.coordinates;
+      return {
+        cadastralNumber: item.cadastral_number,
+        coordinates: [lat, lon],
+        area: item.result.area || undefined,
+        address: item.result.address || undefined,
+        category: item.result.category || 'Земельный участок'
+      };
     } catch (error) {
       return null;
     }
@@ -65,7 +54,8 @@ export default function BulkCadastralImport({ open, onOpenChange, onImportComple
       .split('\n')
       .map(line => line.trim())
       .filter(line => line.length > 0)
-      .map(line => line.replace(/[^\d:]/g, ''));
+      .map(line => line.replace(/[^\d:]/g, ''))
+      .filter((line, index, all) => line.length > 0 && all.indexOf(line) === index);
 
     if (numbers.length === 0) {
       toast({
@@ -84,23 +74,26 @@ export default function BulkCadastralImport({ open, onOpenChange, onImportComple
     let successCount = 0;
     let failedCount = 0;
 
-    for (let i = 0; i < numbers.length; i++) {
-      const number = numbers[i];
-      setCurrentNumber(number);
-      
-      const parcelData = await fetchParcelData(number);
-      
-      if (parcelData) {
-        foundParcels.push(parcelData);
-        successCount++;
-      } else {
-        failedCount++;
-      }
-
-      setProgress(((i + 1) / numbers.length) * 100);
-      setResults({ success: successCount, failed: failedCount, total: numbers.length });
-
-      await new Promise(resolve => setTimeout(resolve, 500));
+    // Один пакетный запрос: сервер опрашивает НСПД параллельно и отдаёт номера по мере готовности
+    try {
+      await cadastreApi.lookupBatch(numbers, (item) => {
+        const parcelData = toCadastralData(item);
+        if (parcelData) {
+          foundParcels.push(parcelData);
+          successCount++;
+        } else {
+          failedCount++;
+        }
+        setCurrentNumber(item.cadastral_number);
+        setProgress(((successCount + failedCount) / numbers.length) * 100);
+        setResults({ success: successCount, failed: failedCount, total: numbers.length });
+      });
+    } catch (error) {
+      toast({
+        title: 'Ошибка',
+        description: error instanceof Error ? error.message : 'Не удалось выполнить импорт',
+        variant: 'destructive'
+      });
     }
 
     setIsImporting(false);
@@ -154,7 +147,7 @@ export default function BulkCadastralImport({ open, onOpenChange, onImportComple
                   </p>
                   <p className="flex items-start gap-2">
                     <Icon name="Clock" size={14} className="mt-0.5 flex-shrink-0" />
-                    <span>Импорт выполняется последовательно (около 0.5 сек на участок)</span>
+                    <span>Участки запрашиваются параллельно, результаты появляются по мере загрузки</span>
                   </p>
                   <p className="flex items-start gap-2">
                     <Icon name="Database" size={14} className="mt-0.5 flex-shrink-0" />
@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { PolygonObject } from '@/types/polygon';
 import { polygonApi } from '@/services/polygonApi';
 import { useToast } from '@/hooks/use-toast';
@@ -81,12 +81,32 @@ export function useMapData(userRole?: string) {
   const [polygonData, setPolygonData] = useState<PolygonObject[]>([]);
   const [isLoading, setIsLoading] = useState(true);
   const [trashData, setTrashData] = useState<PolygonObject[]>([]);
+  const syncVersionRef = useRef<string | null>(null);
   const { toast } = useToast();
 
   const loadPolygons = async () => {
     try {
       setIsLoading(true);
-      const data = await polygonApi.getAll();
+      const delta = await polygonApi.sync(syncVersionRef.current);
+      syncVersionRef.current = delta.version;
+
+      if (!delta.full) {
+        const deleted = new Set(delta.deleted);
+        const changed = new Map(delta.items.map(item => [item.id, item]));
+        setPolygonData(prev => {
+          const known = new Set(prev.map(p => p.id));
+          return [
+            ...delta.items.filter(item => !known.has(item.id)),
+            ...prev
+              .filter(p => !deleted.has(p.id))
+              .map(p => changed.get(p.id) ?? p)
+          ];
+        });
+        console.log('🔄 Synced polygons:', delta.items.length, 'changed,', delta.deleted.length, 'deleted');
+        return;
+      }
+
+      const data = delta.items;
       console.log('📦 Loaded polygons from DB:', data.length);
       if (data.length > 0) {
         console.log('🔍 First polygon details:', {
@@ -129,7 +149,7 @@ export function useMapData(userRole?: string) {
 
   const loadSampleData = async () => {
     try {
-      await Promise.all(sampleData.map(polygon => polygonApi.create(polygon)));
+      await polygonApi.bulkSave(sampleData);
       await loadPolygons();
       toast({
         title: 'Демо-данные загружены',
@@ -114,12 +114,14 @@ export function useMapHandlers({
     });
     
     try {
-      const savedPolygons = await Promise.all(
-        importedPolygons.map(polygon => polygonApi.create(polygon))
-      );
-      console.log('✅ Saved polygons:', savedPolygons.length);
+      const result = await polygonApi.bulkSave(importedPolygons);
+      const savedPolygons = result.items
+        .filter(item => item.status !== 'error')
+        .map(item => ({ ...importedPolygons[item.index], color: item.color ?? importedPolygons[item.index].color }));
+      console.log('✅ Saved polygons:', savedPolygons.length, 'failed:', result.failed);
       
-      setPolygonData(prev => [...prev, ...savedPolygons]);
+      const savedIds = new Set(savedPolygons.map(p => p.id));
+      setPolygonData(prev => [...prev.filter(p => !savedIds.has(p.id)), ...savedPolygons]);
       
       const newSegments = Array.from(new Set(importedPolygons.map(p => p.segment)));
       setSegmentVisibility(prev => {
@@ -134,7 +136,9 @@ export function useMapHandlers({
       
       toast({
         title: 'Импорт завершён',
-        description: `Добавлено объектов: ${savedPolygons.length}`
+        description: result.failed
+          ? `Добавлено объектов: ${savedPolygons.length}, с ошибками: ${result.failed}`
+          : `Добавлено объектов: ${savedPolygons.length}`
       });
     } catch (error) {
       console.error('❌ Import error:', error);
@@ -286,7 +290,7 @@ export function useMapHandlers({
         };
       });
 
-      await Promise.all(newPolygons.map(polygon => polygonApi.create(polygon)));
+      await polygonApi.bulkSave(newPolygons);
       await loadPolygons();
 
       setSegmentVisibility(prev => ({
@@ -0,0 +1,102 @@
+import func2url from '../../backend/func2url.json';
+
+const API_URL = func2url['cadastre-search'];
+// Не больше CADASTRE_BATCH_MAX номеров за запрос (backend/cadastre-search/batch.py)
+const BATCH_SIZE = 500;
+
+export interface CadastreParcel {
+  cadastral_number: string;
+  area: number;
+  category: string;
+  permitted_use: string;
+  address: string;
+  cost: number | string;
+  date: string;
+  geometry: { type: string; coordinates: unknown };
+}
+
+export interface CadastreBatchItem {
+  cadastral_number: string;
+  status: 'found' | 'not_found' | 'error';
+  cache?: 'HIT' | 'MISS' | 'STALE';
+  result?: CadastreParcel;
+  error?: string;
+}
+
+export interface CadastreBatchSummary {
+  total: number;
+  found: number;
+  not_found: number;
+  error: number;
+}
+
+export const cadastreApi = {
+  // Пакетный поиск частями по BATCH_SIZE номеров; onItem вызывается по мере готовности
+  async lookupBatch(
+    cadastralNumbers: string[],
+    onItem: (item: CadastreBatchItem) => void
+  ): Promise<CadastreBatchSummary> {
+    const total: CadastreBatchSummary = { total: 0, found: 0, not_found: 0, error: 0 };
+    for (let i = 0; i < cadastralNumbers.length; i += BATCH_SIZE) {
+      const summary = await this.lookupChunk(cadastralNumbers.slice(i, i + BATCH_SIZE), onItem);
+      if (summary) {
+        total.total += summary.total;
+        total.found += summary.found;
+        total.not_found += summary.not_found;
+        total.error += summary.error;
+      }
+    }
+    return total;
+  },
+
+  // Ответ NDJSON: строка на номер в порядке готовности, последняя — итоги
+  async lookupChunk(
+    cadastralNumbers: string[],
+    onItem: (item: CadastreBatchItem) => void
+  ): Promise<CadastreBatchSummary | null> {
+    const response = await fetch(API_URL, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ cadastral_numbers: cadastralNumbers })
+    });
+
+    if (!response.ok) {
+      const error = await response.json().catch(() => ({}));
+      throw new Error(error.error || 'Failed to lookup cadastral numbers');
+    }
+
+    let summary: CadastreBatchSummary | null = null;
+    const handleLine = (line: string) => {
+      if (!line.trim()) {
+        return;
+      }
+      const data = JSON.parse(line);
+      if (data.summary) {
+        summary = data.summary;
+      } else {
+        onItem(data);
+      }
+    };
+
+    if (!response.body) {
+      (await response.text()).split('\n').forEach(handleLine);
+      return summary;
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) {
+        break;
+      }
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split('\n');
+      buffer = lines.pop() || '';
+      lines.forEach(handleLine);
+    }
+    handleLine(buffer + decoder.decode());
+    return summary;
+  }
+};
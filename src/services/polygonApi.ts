@@ -1,6 +1,8 @@
-import { PolygonObject } from '@/types/polygon';
+import { PolygonObject, PolygonPage, PolygonSync, PolygonBulkResult, PolygonTrashSelection, PolygonTrashBatchResult, PolygonStats, PolygonStatsGroup, PolygonNearby, PolygonSearchResult } from '@/types/polygon';
+import { decodePackedGeometry } from '@/utils/packedGeometry';
 
 const API_URL = 'https://functions.poehali.dev/ba968529-dbc0-460b-9581-0535bbb18bb3';
+const BULK_CHUNK_SIZE = 500;
 
 function getAuthHeaders() {
   const token = localStorage.getItem('auth_token');
@@ -26,6 +28,76 @@ export const polygonApi = {
     return response.json();
   },
 
+  // Тот же список, но геометрия приходит в компактном формате и декодируется на клиенте
+  async getAllPacked(): Promise<PolygonObject[]> {
+    const cacheBust = `${Date.now()}_${Math.random().toString(36).substring(7)}`;
+    const response = await fetch(`${API_URL}?format=packed&nocache=${cacheBust}`, {
+      method: 'GET',
+      headers: getAuthHeaders(),
+      cache: 'no-store'
+    });
+
+    if (!response.ok) {
+      throw new Error('Failed to fetch polygons');
+    }
+
+    const items: Array<Omit<PolygonObject, 'coordinates'> & { coordinates: string | null }> = await response.json();
+    return items.map(item => ({
+      ...item,
+      coordinates: item.coordinates ? decodePackedGeometry(item.coordinates) as [number, number][] : []
+    }));
+  },
+
+  async getInBounds(bbox: [number, number, number, number]): Promise<PolygonObject[]> {
+    const cacheBust = `${Date.now()}_${Math.random().toString(36).substring(7)}`;
+    const response = await fetch(`${API_URL}?bbox=${bbox.join(',')}&nocache=${cacheBust}`, {
+      method: 'GET',
+      headers: getAuthHeaders(),
+      cache: 'no-store'
+    });
+
+    if (!response.ok) {
+      throw new Error('Failed to fetch polygons in bounds');
+    }
+
+    return response.json();
+  },
+
+  async getPage(options: { limit?: number; cursor?: string | null; fields?: string[] } = {}): Promise<PolygonPage> {
+    const params = new URLSearchParams();
+    params.set('limit', String(options.limit ?? 200));
+    if (options.cursor) params.set('cursor', options.cursor);
+    if (options.fields?.length) params.set('fields', options.fields.join(','));
+    params.set('nocache', `${Date.now()}_${Math.random().toString(36).substring(7)}`);
+
+    const response = await fetch(`${API_URL}?${params.toString()}`, {
+      method: 'GET',
+      headers: getAuthHeaders(),
+      cache: 'no-store'
+    });
+
+    if (!response.ok) {
+      throw new Error('Failed to fetch polygons page');
+    }
+
+    return response.json();
+  },
+
+  async sync(since: string | null): Promise<PolygonSync> {
+    const cacheBust = `${Date.now()}_${Math.random().toString(36).substring(7)}`;
+    const response = await fetch(`${API_URL}?since=${encodeURIComponent(since ?? '')}&nocache=${cacheBust}`, {
+      method: 'GET',
+      headers: getAuthHeaders(),
+      cache: 'no-store'
+    });
+
+    if (!response.ok) {
+      throw new Error('Failed to sync polygons');
+    }
+
+    return response.json();
+  },
+
   async getById(id: string): Promise<PolygonObject> {
     const cacheBust = `${Date.now()}_${Math.random().toString(36).substring(7)}`;
     const response = await fetch(`${API_URL}?id=${id}&nocache=${cacheBust}`, {
@@ -55,6 +127,33 @@ export const polygonApi = {
     return response.json();
   },
 
+  // Сохранение частями по BULK_CHUNK_SIZE объектов; index в items — позиция во всём списке
+  async bulkSave(polygons: PolygonObject[]): Promise<PolygonBulkResult> {
+    const total: PolygonBulkResult = { created: 0, updated: 0, failed: 0, items: [] };
+    for (let i = 0; i < polygons.length; i += BULK_CHUNK_SIZE) {
+      const result = await this.bulkSaveChunk(polygons.slice(i, i + BULK_CHUNK_SIZE));
+      total.created += result.created;
+      total.updated += result.updated;
+      total.failed += result.failed;
+      result.items.forEach(item => total.items.push({ ...item, index: item.index + i }));
+    }
+    return total;
+  },
+
+  async bulkSaveChunk(polygons: PolygonObject[]): Promise<PolygonBulkResult> {
+    const response = await fetch(API_URL, {
+      method: 'POST',
+      headers: getAuthHeaders(),
+      body: JSON.stringify({ action: 'bulk', items: polygons })
+    });
+
+    if (!response.ok) {
+      throw new Error('Failed to save polygons');
+    }
+
+    return response.json();
+  },
+
   async update(id: string, polygon: PolygonObject): Promise<PolygonObject> {
     const response = await fetch(`${API_URL}?id=${id}`, {
       method: 'PUT',
@@ -80,6 +179,87 @@ export const polygonApi = {
     }
   },
 
+  async findAt(lon: number, lat: number): Promise<PolygonObject[]> {
+    const response = await fetch(`${API_URL}?at=${lon},${lat}`, {
+      method: 'GET',
+      headers: getAuthHeaders()
+    });
+
+    if (!response.ok) {
+      throw new Error('Failed to find polygons at point');
+    }
+
+    return response.json();
+  },
+
+  async findNear(lon: number, lat: number, radius: number): Promise<PolygonNearby[]> {
+    const response = await fetch(`${API_URL}?near=${lon},${lat}&radius=${radius}`, {
+      method: 'GET',
+      headers: getAuthHeaders()
+    });
+
+    if (!response.ok) {
+      throw new Error('Failed to find polygons near point');
+    }
+
+    return response.json();
+  },
+
+  async search(query: string, limit = 20): Promise<PolygonSearchResult[]> {
+    const response = await fetch(`${API_URL}?q=${encodeURIComponent(query)}&limit=${limit}`, {
+      method: 'GET',
+      headers: getAuthHeaders()
+    });
+
+    if (!response.ok) {
+      throw new Error('Failed to search polygons');
+    }
+
+    return response.json();
+  },
+
+  async getStats(groupBy: PolygonStatsGroup[] = []): Promise<PolygonStats> {
+    const query = groupBy.length ? `&group_by=${groupBy.join(',')}` : '';
+    const response = await fetch(`${API_URL}?action=stats${query}`, {
+      method: 'GET',
+      headers: getAuthHeaders()
+    });
+
+    if (!response.ok) {
+      throw new Error('Failed to fetch polygon stats');
+    }
+
+    return response.json();
+  },
+
+  async moveManyToTrash(selection: PolygonTrashSelection): Promise<PolygonTrashBatchResult> {
+    const response = await fetch(API_URL, {
+      method: 'POST',
+      headers: getAuthHeaders(),
+      body: JSON.stringify({ action: 'move_to_trash', ...selection })
+    });
+
+    if (!response.ok) {
+      throw new Error('Failed to move polygons to trash');
+    }
+
+    return response.json();
+  },
+
+  async restoreManyFromTrash(selection: PolygonTrashSelection): Promise<PolygonTrashBatchResult> {
+    const response = await fetch(API_URL, {
+      method: 'POST',
+      headers: getAuthHeaders(),
+      body: JSON.stringify({ action: 'restore_from_trash', ...selection })
+    });
+
+    if (!response.ok) {
+      throw new Error('Failed to restore polygons');
+    }
+
+    return response.json();
+  },
+
   async getTrash(): Promise<PolygonObject[]> {
     const cacheBust = `${Date.now()}_${Math.random().toString(36).substring(7)}`;
     const response = await fetch(`${API_URL}?source=trash&nocache=${cacheBust}`, {
@@ -10,6 +10,67 @@ export interface PolygonObject {
   segment: string;
   visible: boolean;
   attributes: Record<string, any>;
+  // Считаются сервером по координатам; у старых объектов до backfill_geometry — null
+  area_m2?: number | null;
+  perimeter_m?: number | null;
+  centroid_lon?: number | null;
+  centroid_lat?: number | null;
+}
+
+export interface PolygonPage {
+  items: Partial<PolygonObject>[];
+  next_cursor: string | null;
+}
+
+export interface PolygonSync {
+  version: string;
+  full: boolean;
+  items: PolygonObject[];
+  deleted: string[];
+}
+
+export interface PolygonBulkItemResult {
+  index: number;
+  id: string | null;
+  status: 'created' | 'updated' | 'error';
+  color?: string;
+  error?: string;
+}
+
+export interface PolygonBulkResult {
+  created: number;
+  updated: number;
+  failed: number;
+  items: PolygonBulkItemResult[];
+}
+
+export type PolygonTrashSelection =
+  | { ids: string[] }
+  | { filter: { segment?: string; owner?: string; bbox?: [number, number, number, number] } };
+
+export type PolygonNearby = PolygonObject & { distance: number };
+
+export type PolygonSearchResult = PolygonObject & { score: number };
+
+export type PolygonStatsGroup = 'segment' | 'type' | 'status' | 'owner';
+
+export interface PolygonStatsTotals {
+  count: number;
+  area: number;
+  population: number;
+}
+
+export interface PolygonStats {
+  version: number;
+  total: PolygonStatsTotals;
+  groups?: (PolygonStatsTotals & Partial<Record<PolygonStatsGroup, string | null>>)[];
+}
+
+export interface PolygonTrashBatchResult {
+  moved?: number;
+  restored?: number;
+  ids: string[];
+  skipped: { id: string; error: string }[];
 }
 
 export interface MapLayer {
@@ -0,0 +1,57 @@
+// Декодер компактной геометрии format=packed (backend/polygons/packed.py):
+// [версия][точность][флаги] varint(число колец), для каждого кольца varint(число точек)
+// и zigzag-varint разности dx, dy от предыдущей точки.
+
+const PACKED_VERSION = 1;
+const FLAG_MULTI_RING = 1;
+
+export function decodePackedGeometry(base64: string): number[][] | number[][][] {
+  const binary = atob(base64);
+  const data = new Uint8Array(binary.length);
+  for (let i = 0; i < binary.length; i++) {
+    data[i] = binary.charCodeAt(i);
+  }
+
+  if (data.length < 3 || data[0] !== PACKED_VERSION) {
+    throw new Error('Unsupported packed geometry');
+  }
+  const scale = Math.pow(10, data[1]);
+  const multi = (data[2] & FLAG_MULTI_RING) !== 0;
+  let pos = 3;
+
+  // Арифметика вместо битовых операций: значения могут не помещаться в int32
+  const read = (): number => {
+    let value = 0;
+    let factor = 1;
+    let byte: number;
+    do {
+      if (pos >= data.length) {
+        throw new Error('Truncated packed geometry');
+      }
+      byte = data[pos++];
+      value += (byte & 0x7f) * factor;
+      factor *= 128;
+    } while (byte >= 0x80);
+    return value;
+  };
+  const readDelta = (): number => {
+    const value = read();
+    return value % 2 ? -(value + 1) / 2 : value / 2;
+  };
+
+  const rings: number[][][] = [];
+  let x = 0;
+  let y = 0;
+  const ringCount = read();
+  for (let r = 0; r < ringCount; r++) {
+    const pointCount = read();
+    const ring: number[][] = new Array(pointCount);
+    for (let p = 0; p < pointCount; p++) {
+      x += readDelta();
+      y += readDelta();
+      ring[p] = [x / scale, y / scale];
+    }
+    rings.push(ring);
+  }
+  return multi || rings.length === 0 ? rings : rings[0];
+}
@@ -0,0 +1,59 @@
+'''
+Хранилище кэша НСПД для тестов: таблица cadastre_lookup_cache в памяти.
+Понимает ровно GET_SQL и PUT_SQL модуля lookup_cache и притворяется соединением
+psycopg2 (cursor/commit/rollback). Время — поле now в секундах, его двигает тест.
+'''
+
+from typing import Any, Dict, Optional, Tuple
+
+
+class CacheStore:
+    def __init__(self, lookup_cache):
+        self.lookup_cache = lookup_cache
+        # номер -> (found, payload, fetched_at, expires_at)
+        self.rows: Dict[str, Tuple[bool, Optional[Dict[str, Any]], float, float]] = {}
+        self.now = 0.0
+        self.commits = 0
+
+    def put(self, number: str, payload: Optional[Dict[str, Any]], age: float = 0, ttl: float = 3600) -> None:
+        fetched_at = self.now - age
+        self.rows[number] = (payload is not None, payload, fetched_at, fetched_at + ttl)
+
+    def cursor(self):
+        return _Cursor(self)
+
+    def commit(self) -> None:
+        self.commits += 1
+
+    def rollback(self) -> None:
+        pass
+
+
+class _Cursor:
+    def __init__(self, store: CacheStore):
+        self.store = store
+        self.result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, sql: str, params=()) -> None:
+        store = self.store
+        if sql == store.lookup_cache.GET_SQL:
+            stale_max_age, numbers = params
+            self.result = [
+                (number, found, payload, fetched_at, expires_at > store.now, fetched_at > store.now - stale_max_age)
+                for number in numbers if number in store.rows
+                for found, payload, fetched_at, expires_at in [store.rows[number]]
+            ]
+        elif sql == store.lookup_cache.PUT_SQL:
+            number, found, payload, ttl = params
+            store.rows[number] = (found, payload.adapted if payload is not None else None, store.now, store.now + ttl)
+        else:
+            raise AssertionError('unexpected SQL: ' + sql)
+
+    def fetchall(self):
+        return self.result
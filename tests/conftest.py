@@ -0,0 +1,43 @@
+'''
+Общие фикстуры тестов backend-функций. Каждая функция — отдельный каталог со своими
+одноимёнными модулями (db.py, index.py, ...), поэтому load_function перед импортом
+убирает из sys.modules модули другой функции. Тесты с базой пропускаются без DATABASE_URL.
+'''
+
+import importlib
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+
+
+def load_function(function: str, module: str = 'index'):
+    '''Импортирует module из backend/<function> вместе с его соседними модулями'''
+    function_dir = BACKEND_DIR / function
+    for path in function_dir.glob('*.py'):
+        sys.modules.pop(path.stem, None)
+    sys.path.insert(0, str(function_dir))
+    try:
+        return importlib.import_module(module)
+    finally:
+        sys.path.remove(str(function_dir))
+
+
+@pytest.fixture
+def db_conn():
+    '''Соединение с тестовой базой; всё, что сделал тест, откатывается'''
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        pytest.skip('DATABASE_URL not configured')
+    psycopg2 = pytest.importorskip('psycopg2')
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET search_path TO t_p43707323_map_portal_creation, public")
+        yield conn
+    finally:
+        conn.rollback()
+        conn.close()
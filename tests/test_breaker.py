@@ -0,0 +1,183 @@
+'''
+Предохранитель внешних вызовов (cadastre-search/breaker.py): классификация ошибок,
+переходы closed → open → half_open, повторы в пределах CALL_BUDGET и адаптивный таймаут.
+'''
+
+import http.client
+import json
+import socket
+import urllib.error
+
+import pytest
+
+from conftest import load_function
+
+breaker = load_function('cadastre-search', 'breaker')
+
+
+@pytest.fixture
+def circuit(monkeypatch):
+    for name, value in (('BREAKER_THRESHOLD', '2'), ('BREAKER_COOLDOWN', '30'), ('RETRIES', '2'),
+                        ('RETRY_BASE', '0'), ('TIMEOUT_MIN', '1'), ('TIMEOUT_MAX', '5'), ('CALL_BUDGET', '20')):
+        monkeypatch.setenv('TESTSVC_' + name, value)
+    return breaker.CircuitBreaker('TESTSVC', 'TESTSVC')
+
+
+def _http_error(code):
+    return urllib.error.HTTPError('https://example.com', code, 'error', {}, None)
+
+
+@pytest.mark.parametrize('error, failure', [
+    (urllib.error.URLError('refused'), True),
+    (socket.timeout('timed out'), True),
+    (TimeoutError(), True),
+    (ConnectionResetError(), True),
+    (socket.gaierror(), True),
+    (http.client.IncompleteRead(b''), True),
+    (_http_error(500), True),
+    (_http_error(503), True),
+    (_http_error(408), True),
+    (_http_error(429), True),
+    (_http_error(400), False),
+    (_http_error(404), False),
+    (ValueError('could not convert string to float'), False),
+    (KeyError('results'), False),
+    (json.JSONDecodeError('Expecting value', '', 0), False),
+])
+def test_is_failure(error, failure):
+    assert breaker.is_failure(error) is failure
+
+
+def _open(circuit):
+    for _ in range(2):
+        circuit.allow()
+        circuit.record_failure()
+
+
+def test_opens_after_threshold_and_rejects(circuit):
+    circuit.allow()
+    circuit.record_failure()
+    assert circuit.state == breaker.CLOSED
+    circuit.allow()
+    circuit.record_failure()
+    assert circuit.state == breaker.OPEN
+    with pytest.raises(breaker.CircuitOpenError) as raised:
+        circuit.allow()
+    assert 0 < raised.value.retry_in <= 30
+    assert circuit.counters['rejected'] == 1
+
+
+def test_success_resets_failure_count(circuit):
+    circuit.record_failure()
+    circuit.record_success(0.1)
+    circuit.record_failure()
+    assert circuit.state == breaker.CLOSED
+
+
+def test_half_open_allows_one_probe(circuit):
+    _open(circuit)
+    circuit.opened_at -= 31
+    circuit.allow()
+    assert circuit.state == breaker.HALF_OPEN
+    with pytest.raises(breaker.CircuitOpenError):
+        circuit.allow()
+    circuit.record_success(0.1)
+    assert circuit.state == breaker.CLOSED
+    circuit.allow()
+
+
+def test_failed_probe_reopens(circuit):
+    _open(circuit)
+    circuit.opened_at -= 31
+    circuit.allow()
+    circuit.record_failure()
+    assert circuit.state == breaker.OPEN
+    with pytest.raises(breaker.CircuitOpenError):
+        circuit.allow()
+
+
+def test_call_retries_transport_errors(circuit, monkeypatch):
+    monkeypatch.setenv('TESTSVC_BREAKER_THRESHOLD', '10')
+    attempts = []
+
+    def fn(value, timeout):
+        attempts.append(timeout)
+        if len(attempts) < 3:
+            raise ConnectionResetError()
+        return value
+
+    assert circuit.call(fn, 'ok') == 'ok'
+    assert len(attempts) == 3
+    assert attempts[0] == 5
+    assert circuit.counters == {'success': 1, 'failure': 2, 'rejected': 0, 'retries': 2}
+
+
+def test_call_gives_up_after_retries(circuit, monkeypatch):
+    monkeypatch.setenv('TESTSVC_BREAKER_THRESHOLD', '10')
+    attempts = []
+
+    def fn(timeout):
+        attempts.append(timeout)
+        raise _http_error(503)
+
+    with pytest.raises(urllib.error.HTTPError):
+        circuit.call(fn)
+    assert len(attempts) == 3
+
+
+def test_call_does_not_retry_request_or_parse_errors(circuit):
+    for error in (_http_error(404), ValueError('bad area')):
+        attempts = []
+
+        def fn(timeout):
+            attempts.append(timeout)
+            raise error
+
+        with pytest.raises(type(error)):
+            circuit.call(fn)
+        assert len(attempts) == 1
+    assert circuit.state == breaker.CLOSED
+    assert circuit.counters['failure'] == 0
+
+
+def test_call_stops_retrying_when_circuit_opens(circuit):
+    attempts = []
+
+    def fn(timeout):
+        attempts.append(timeout)
+        raise TimeoutError()
+
+    with pytest.raises(TimeoutError):
+        circuit.call(fn)
+    # Порог 2: вторая ошибка размыкает цепь, третьей попытки нет
+    assert len(attempts) == 2
+    assert circuit.state == breaker.OPEN
+
+
+def test_call_budget_limits_retries(circuit, monkeypatch):
+    monkeypatch.setenv('TESTSVC_BREAKER_THRESHOLD', '10')
+    monkeypatch.setenv('TESTSVC_CALL_BUDGET', '0.5')
+    attempts = []
+
+    def fn(timeout):
+        attempts.append(timeout)
+        raise TimeoutError()
+
+    with pytest.raises(TimeoutError):
+        circuit.call(fn)
+    # Таймаут попытки урезан до бюджета, а на повтор с TIMEOUT_MIN бюджета не хватает
+    assert len(attempts) == 1
+    assert attempts[0] <= 0.5
+
+
+def test_timeout_adapts_to_latency(circuit):
+    assert circuit.timeout() == 5
+    for _ in range(breaker.MIN_LATENCY_SAMPLES):
+        circuit.record_success(0.1)
+    # p99 0.1 с × TIMEOUT_FACTOR 3 = 0.3 с, не меньше TIMEOUT_MIN
+    assert circuit.timeout() == 1
+    for _ in range(breaker.MIN_LATENCY_SAMPLES):
+        circuit.record_success(1.5)
+    assert circuit.timeout() == 4.5
+    status = circuit.status()
+    assert (status['state'], status['timeout_s'], status['latency_ms']['samples']) == ('closed', 4.5, 40)
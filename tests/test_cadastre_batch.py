@@ -0,0 +1,121 @@
+'''
+Пакетный поиск участков (cadastre-search, POST): разбор номеров, результаты
+HIT/MISS/STALE/error, бюджет времени и итоговая строка NDJSON. НСПД — поддельная
+функция fetch, кэш — хранилище в памяти (cadastre_store.py).
+'''
+
+import json
+import threading
+import urllib.error
+
+import pytest
+
+from cadastre_store import CacheStore
+from conftest import load_function
+
+batch = load_function('cadastre-search', 'batch')
+
+
+def _parcel(number):
+    return {'cadastral_number': number, 'area': 100.0}
+
+
+@pytest.fixture
+def store():
+    return CacheStore(load_function('cadastre-search', 'lookup_cache'))
+
+
+def test_parse_numbers_normalizes_and_deduplicates():
+    body = {'cadastral_numbers': [' 77:01:0001001:1', '77:01: 0001001:1', '', '77:01:0001001:2', '  ']}
+    assert batch.parse_numbers(body) == ['77:01:0001001:1', '77:01:0001001:2']
+
+
+@pytest.mark.parametrize('body', [
+    {},
+    {'cadastral_numbers': '77:01:0001001:1'},
+    {'cadastral_numbers': ['77:01:0001001:1', 5]},
+    {'cadastral_numbers': [' ', '']},
+])
+def test_parse_numbers_rejects_bad_input(body):
+    with pytest.raises(ValueError):
+        batch.parse_numbers(body)
+
+
+def test_parse_numbers_enforces_batch_limit(monkeypatch):
+    monkeypatch.setenv('CADASTRE_BATCH_MAX', '2')
+    assert len(batch.parse_numbers({'cadastral_numbers': ['1:1', '1:1', '1:2']})) == 2
+    with pytest.raises(ValueError):
+        batch.parse_numbers({'cadastral_numbers': ['1:1', '1:2', '1:3']})
+
+
+def test_lookup_batch_statuses(store, monkeypatch):
+    monkeypatch.setenv('CADASTRE_STALE_MAX_AGE', '1000')
+    store.put('hit', _parcel('hit'))
+    store.put('hit-missing', None)
+    store.put('stale', _parcel('stale'), age=500, ttl=100)
+    store.put('too-old', _parcel('too-old'), age=2000, ttl=100)
+    fetched = []
+
+    def fetch(number):
+        fetched.append(number)
+        if number in ('stale', 'too-old', 'error'):
+            raise urllib.error.URLError('connection refused')
+        if number == 'circuit':
+            raise batch.CircuitOpenError('NSPD', 12)
+        return None if number == 'new-missing' else _parcel(number)
+
+    numbers = ['hit', 'hit-missing', 'new', 'new-missing', 'stale', 'too-old', 'error', 'circuit']
+    items = {item['cadastral_number']: item for item in batch.lookup_batch(numbers, fetch, store)}
+
+    assert sorted(fetched) == sorted(numbers[2:])
+    assert {n: (i['status'], i.get('cache')) for n, i in items.items()} == {
+        'hit': ('found', 'HIT'),
+        'hit-missing': ('not_found', 'HIT'),
+        'new': ('found', 'MISS'),
+        'new-missing': ('not_found', 'MISS'),
+        'stale': ('found', 'STALE'),
+        'too-old': ('error', None),
+        'error': ('error', None),
+        'circuit': ('error', None),
+    }
+    assert items['new']['result'] == _parcel('new')
+    assert 'повторите через 12 с' in items['circuit']['error']
+    # Новые ответы НСПД записаны в кэш и зафиксированы одним commit
+    assert store.rows['new'][:2] == (True, _parcel('new'))
+    assert store.rows['new-missing'][:2] == (False, None)
+    assert store.commits == 1
+
+
+def test_lookup_batch_without_cache_fetches_everything():
+    items = list(batch.lookup_batch(['a', 'b'], _parcel, None))
+    assert sorted((i['cadastral_number'], i['cache']) for i in items) == [('a', 'MISS'), ('b', 'MISS')]
+
+
+def test_lookup_batch_time_budget(monkeypatch):
+    monkeypatch.setenv('CADASTRE_BATCH_TIME_BUDGET', '0.2')
+    release = threading.Event()
+
+    def fetch(number):
+        if number == 'slow':
+            release.wait(5)
+        return _parcel(number)
+
+    try:
+        items = {i['cadastral_number']: i for i in batch.lookup_batch(['fast', 'slow'], fetch, None)}
+    finally:
+        release.set()
+    assert items['fast']['status'] == 'found'
+    assert items['slow'] == {'cadastral_number': 'slow', 'status': 'error', 'error': 'Превышено время ожидания НСПД'}
+
+
+def test_ndjson_body_ends_with_summary():
+    items = [
+        {'cadastral_number': 'a', 'status': 'found', 'cache': 'HIT', 'result': _parcel('a')},
+        {'cadastral_number': 'b', 'status': 'not_found', 'cache': 'MISS'},
+        {'cadastral_number': 'c', 'status': 'error', 'error': 'Участок'},
+    ]
+    body = batch.ndjson_body(iter(items))
+    assert body.endswith('\n')
+    lines = [json.loads(line) for line in body.splitlines()]
+    assert lines[:-1] == items
+    assert lines[-1] == {'summary': {'total': 3, 'found': 1, 'not_found': 1, 'error': 1}}
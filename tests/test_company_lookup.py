@@ -0,0 +1,62 @@
+'''Кэш поиска компаний по ИНН: LRU и обновление записи до истечения срока.'''
+
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from conftest import load_function
+
+
+@pytest.fixture
+def lookup(monkeypatch):
+    monkeypatch.delenv('DATABASE_URL', raising=False)
+    module = load_function('dadata', 'company_lookup')
+    calls = []
+
+    def fetch(inn):
+        calls.append(inn)
+        return {'inn': inn, 'fetch': len(calls)}
+
+    monkeypatch.setattr(module, 'fetch_from_dadata', fetch)
+    module.calls = calls
+    return module
+
+
+def _wait_refreshed(module, inn, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while inn in module._refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return inn not in module._refreshing
+
+
+def test_lru_serves_repeat_lookups(lookup):
+    assert lookup.lookup_company('7707083893') == ({'inn': '7707083893', 'fetch': 1}, 'MISS')
+    assert lookup.lookup_company('7707083893') == ({'inn': '7707083893', 'fetch': 1}, 'LRU')
+    assert lookup.calls == ['7707083893']
+
+
+def test_refresh_ahead_does_not_join_regular_load(lookup):
+    # Обычная загрузка того же ИНН ещё идёт
+    in_flight = Future()
+    lookup._inflight['7707083893'] = in_flight
+    try:
+        lookup._refresh_in_background('7707083893')
+        assert _wait_refreshed(lookup, '7707083893')
+        assert lookup.calls == ['7707083893']
+        assert lookup._lru['7707083893'][0] == {'inn': '7707083893', 'fetch': 1}
+    finally:
+        in_flight.set_result((None, 'MISS'))
+        lookup._inflight.pop('7707083893', None)
+
+
+def test_entry_in_refresh_window_is_served_and_refreshed(lookup, monkeypatch):
+    monkeypatch.setenv('COMPANY_CACHE_TTL', '10')
+    monkeypatch.setenv('COMPANY_REFRESH_AHEAD', '1')
+    lookup.lookup_company('7707083893')
+
+    data, status = lookup.lookup_company('7707083893')
+    assert (data['fetch'], status) == (1, 'LRU')
+    assert _wait_refreshed(lookup, '7707083893')
+    assert lookup.calls == ['7707083893', '7707083893']
+    assert lookup._lru['7707083893'][0]['fetch'] == 2
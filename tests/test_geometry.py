@@ -0,0 +1,60 @@
+'''Геометрия полигонов: разбор bbox, метрики и попадание точки.'''
+
+import pytest
+
+from conftest import load_function
+
+geometry = load_function('polygons', 'geometry')
+
+
+def test_parse_bbox():
+    assert geometry.parse_bbox(None) is None
+    assert geometry.parse_bbox('') is None
+    assert geometry.parse_bbox('37.3, 55.5, 37.9, 56') == (37.3, 55.5, 37.9, 56.0)
+
+
+@pytest.mark.parametrize('value', [
+    '37.3,55.5',
+    '37.9,55.5,37.3,56.0',
+    'a,55.5,37.9,56.0',
+    'nan,55.5,37.9,56.0',
+    '37.3,55.5,inf,56.0',
+    '-inf,-inf,inf,inf',
+    '37.3,NaN,37.9,NaN',
+])
+def test_parse_bbox_rejects_invalid(value):
+    with pytest.raises(ValueError):
+        geometry.parse_bbox(value)
+
+
+def square(lon, lat, size):
+    '''Квадрат в нормализованных координатах с углом (lon, lat)'''
+    corners = [(lon, lat), (lon + size, lat), (lon + size, lat + size), (lon, lat + size)]
+    return [list(geometry.lonlat_to_normalized(x, y)) for x, y in corners]
+
+
+def test_hole_is_subtracted_like_contains_point():
+    outer, hole = square(37.0, 55.0, 0.1), square(37.04, 55.04, 0.02)
+    outer_area = geometry.compute_metrics(outer)[0]
+    hole_area = geometry.compute_metrics(hole)[0]
+    area, perimeter, lon, lat = geometry.compute_metrics([outer, hole])
+
+    assert area == pytest.approx(outer_area - hole_area)
+    assert perimeter == pytest.approx(geometry.compute_metrics(outer)[1] + geometry.compute_metrics(hole)[1])
+    assert not geometry.contains_point([outer, hole], 37.05, 55.05)
+    assert geometry.contains_point([outer, hole], 37.01, 55.01)
+    # Дырка по центру — центроид не смещается
+    assert (lon, lat) == pytest.approx(geometry.compute_metrics(outer)[2:], abs=1e-9)
+
+
+def test_separate_parts_and_island_in_hole_add_up():
+    first, second = square(37.0, 55.0, 0.1), square(38.0, 55.0, 0.1)
+    parts = geometry.compute_metrics([first, second])[0]
+    assert parts == pytest.approx(geometry.compute_metrics(first)[0] + geometry.compute_metrics(second)[0])
+
+    hole, island = square(37.02, 55.02, 0.06), square(37.04, 55.04, 0.02)
+    area = geometry.compute_metrics([first, hole, island])[0]
+    expected = sum(geometry.compute_metrics(ring)[0] * sign for ring, sign in ((first, 1), (hole, -1), (island, 1)))
+    assert area == pytest.approx(expected)
+    assert geometry.contains_point([first, hole, island], 37.05, 55.05)
+    assert not geometry.contains_point([first, hole, island], 37.03, 55.03)
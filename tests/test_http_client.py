@@ -0,0 +1,113 @@
+'''
+Пул соединений http_client на заглушке http.server, которая считает принятые
+TCP-соединения: последовательные вызовы идут по одному соединению, а закрытое
+сервером за время простоя соединение заменяется новым без ошибки для вызывающего.
+'''
+
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from conftest import load_function
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.accepted = 0
+        self.open_sockets = []
+        self.lock = threading.Lock()
+
+    def get_request(self):
+        sock, address = super().get_request()
+        with self.lock:
+            self.accepted += 1
+            self.open_sockets.append(sock)
+        return sock, address
+
+    def drop_idle_connections(self):
+        '''Закрывает все принятые соединения, как сервер по таймауту простоя'''
+        with self.lock:
+            sockets, self.open_sockets = self.open_sockets, []
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = json.dumps({'path': self.path}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    stub = _StubServer()
+    thread = threading.Thread(target=stub.serve_forever, daemon=True)
+    thread.start()
+    yield stub
+    stub.shutdown()
+    stub.server_close()
+
+
+@pytest.fixture
+def http_client(monkeypatch):
+    monkeypatch.setenv('HTTP_IDLE_TIMEOUT', '50')
+    return load_function('cadastre-search', 'http_client')
+
+
+def _url(server, path):
+    return 'http://127.0.0.1:%d%s' % (server.server_address[1], path)
+
+
+def test_sequential_calls_reuse_one_connection(server, http_client):
+    calls = 10
+    for i in range(calls):
+        assert http_client.request_json('GET', _url(server, '/item/%d' % i)) == {'path': '/item/%d' % i}
+
+    stats = http_client.stats()
+    assert server.accepted == 1
+    assert stats['requests'] == calls
+    assert stats['connections_opened'] == 1
+    assert stats['connections_reused'] == calls - 1
+    assert stats['idle'] == 1
+
+
+def test_reconnects_after_server_drops_idle_connection(server, http_client):
+    http_client.request_json('GET', _url(server, '/before'))
+    server.drop_idle_connections()
+
+    assert http_client.request_json('GET', _url(server, '/after')) == {'path': '/after'}
+    stats = http_client.stats()
+    assert server.accepted == 2
+    assert stats['connections_opened'] == 2
+    assert stats['connections_reused'] == 1
+
+    http_client.request_json('GET', _url(server, '/again'))
+    assert server.accepted == 2
+
+
+def test_connection_older_than_idle_timeout_is_not_reused(server, http_client, monkeypatch):
+    monkeypatch.setenv('HTTP_IDLE_TIMEOUT', '0')
+    for i in range(3):
+        http_client.request_json('GET', _url(server, '/item/%d' % i))
+
+    assert server.accepted == 3
+    assert http_client.stats()['connections_reused'] == 0
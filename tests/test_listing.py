@@ -0,0 +1,28 @@
+'''Колонки выборки списка: без fields= служебные колонки читаются только по запросу.'''
+
+from conftest import load_function
+
+listing = load_function('polygons', 'listing')
+
+
+def test_default_columns_skip_internal_columns():
+    columns = listing.select_columns(None).split(', ')
+    assert columns == list(listing.ROW_COLUMNS)
+    assert not set(listing.INTERNAL_COLUMNS) & set(columns)
+
+
+def test_internal_columns_added_for_zoom_and_packed():
+    assert listing.select_columns(None, simplified=True).split(', ')[-1] == 'coordinates_simplified'
+    assert listing.select_columns(None, packed=True).split(', ')[-1] == 'coordinates_packed'
+    assert listing.select_columns(['id', 'name'], simplified=True, packed=True) == 'id, name, created_at'
+
+
+def test_row_columns_match_table(db_conn):
+    '''Новая колонка polygon_objects должна попасть в ROW_COLUMNS или INTERNAL_COLUMNS'''
+    with db_conn.cursor() as cur:
+        cur.execute(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = 't_p43707323_map_portal_creation' AND table_name = 'polygon_objects'"
+        )
+        table_columns = {row[0] for row in cur.fetchall()}
+    assert table_columns == set(listing.ROW_COLUMNS) | set(listing.INTERNAL_COLUMNS)
@@ -0,0 +1,99 @@
+'''
+Кэш поиска участков (cadastre-search): сквозное чтение через кэш, отрицательный
+кэш и устаревший ответ при ошибке НСПД. Обработчик работает с хранилищем в памяти
+(cadastre_store.py); SQL самого кэша проверяется на базе, если задан DATABASE_URL.
+'''
+
+import json
+import urllib.error
+
+import pytest
+
+from cadastre_store import CacheStore
+from conftest import load_function
+
+NUMBER = '77:01:0001001:12'
+PARCEL = {'cadastral_number': NUMBER, 'area': 512.0, 'geometry': {'type': 'Polygon', 'coordinates': []}}
+
+
+@pytest.fixture
+def cadastre(monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', 'postgresql://cache-store')
+    monkeypatch.setenv('NSPD_RETRIES', '0')
+    index = load_function('cadastre-search')
+    store = CacheStore(load_function('cadastre-search', 'lookup_cache'))
+    calls = []
+    replies = []
+
+    def fetch(number, timeout=20):
+        calls.append(number)
+        reply = replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    monkeypatch.setattr(index, 'fetch_from_nspd', fetch)
+    monkeypatch.setattr(index, 'get_connection', lambda: store)
+    monkeypatch.setattr(index, 'release_connection', lambda conn: None)
+    index.store, index.calls, index.replies = store, calls, replies
+    return index
+
+
+def _get(index, number=NUMBER):
+    response = index.handler({'httpMethod': 'GET', 'queryStringParameters': {'cadastral_number': number}}, None)
+    return response['statusCode'], response['headers'].get('X-Cache'), json.loads(response['body'])
+
+
+def test_normalize_strips_all_whitespace(cadastre):
+    lookup_cache = load_function('cadastre-search', 'lookup_cache')
+    assert lookup_cache.normalize_cadastral_number(' 77:01: 0001001:12\t') == NUMBER
+
+
+def test_repeat_lookup_is_served_from_cache(cadastre):
+    cadastre.replies.append(PARCEL)
+    assert _get(cadastre) == (200, 'MISS', PARCEL)
+    assert _get(cadastre, ' 77:01:0001001: 12') == (200, 'HIT', PARCEL)
+    assert cadastre.calls == [NUMBER]
+
+
+def test_not_found_is_cached_for_negative_ttl(cadastre, monkeypatch):
+    monkeypatch.setenv('CADASTRE_NEGATIVE_TTL', '60')
+    cadastre.replies.extend([None, PARCEL])
+    assert _get(cadastre)[:2] == (503, 'MISS')
+    assert _get(cadastre)[:2] == (503, 'HIT')
+    cadastre.store.now += 61
+    assert _get(cadastre) == (200, 'MISS', PARCEL)
+    assert cadastre.calls == [NUMBER, NUMBER]
+
+
+def test_expired_entry_is_served_stale_when_nspd_fails(cadastre, monkeypatch):
+    monkeypatch.setenv('CADASTRE_STALE_MAX_AGE', '1000')
+    cadastre.store.put(NUMBER, PARCEL, age=500, ttl=100)
+    cadastre.replies.append(urllib.error.URLError('connection refused'))
+    assert _get(cadastre) == (200, 'STALE', PARCEL)
+
+
+def test_too_old_entry_is_not_served(cadastre, monkeypatch):
+    monkeypatch.setenv('CADASTRE_STALE_MAX_AGE', '1000')
+    cadastre.store.put(NUMBER, PARCEL, age=2000, ttl=100)
+    cadastre.replies.append(urllib.error.URLError('connection refused'))
+    status, cache_status, _ = _get(cadastre)
+    assert (status, cache_status) == (503, None)
+
+
+def test_cache_sql_round_trip(db_conn, monkeypatch):
+    monkeypatch.setenv('CADASTRE_NEGATIVE_TTL', '60')
+    lookup_cache = load_function('cadastre-search', 'lookup_cache')
+    with db_conn.cursor() as cur:
+        lookup_cache.put_entry(cur, 'test:found', PARCEL)
+        lookup_cache.put_entry(cur, 'test:missing', None)
+        cur.execute(
+            "UPDATE cadastre_lookup_cache SET fetched_at = LOCALTIMESTAMP - interval '40 days', "
+            "expires_at = LOCALTIMESTAMP - interval '39 days' WHERE cadastral_number = 'test:missing'"
+        )
+        entries = lookup_cache.get_entries(cur, ['test:found', 'test:missing', 'test:absent'])
+
+    assert set(entries) == {'test:found', 'test:missing'}
+    found, missing = entries['test:found'], entries['test:missing']
+    assert (found['found'], found['payload'], found['fresh'], found['usable']) == (True, PARCEL, True, True)
+    assert (missing['found'], missing['payload'], missing['fresh'], missing['usable']) == (False, None, False, False)
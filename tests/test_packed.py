@@ -0,0 +1,67 @@
+'''Компактная геометрия: encode_coordinates → decode_coordinates в пределах шага квантования.'''
+
+import random
+
+import pytest
+
+from conftest import load_function
+
+packed = load_function('polygons', 'packed')
+
+
+def _assert_close(decoded, original, bound):
+    assert len(decoded) == len(original)
+    for got, expected in zip(decoded, original):
+        assert len(got) == 2
+        assert abs(got[0] - expected[0]) <= bound
+        assert abs(got[1] - expected[1]) <= bound
+
+
+@pytest.mark.parametrize('precision', [5, 7])
+def test_round_trip_single_and_multi_ring(monkeypatch, precision):
+    monkeypatch.setenv('PACKED_PRECISION', str(precision))
+    bound = 0.5 / 10 ** precision + 1e-12
+    rng = random.Random(precision)
+
+    ring = [[rng.uniform(-1, 1), rng.uniform(-1, 1)] for _ in range(50)]
+    # Разности меняют знак и внутри кольца, и при переходе к следующему кольцу
+    rings = [
+        [[0.75, 0.25], [0.1, -0.3], [-0.6, 0.9], [0.75, 0.25]],
+        [[-0.9, -0.9], [-0.8, -0.95], [-0.85, -0.7]],
+        [[rng.uniform(-0.001, 0.001), rng.uniform(-0.001, 0.001)] for _ in range(20)],
+    ]
+
+    decoded = packed.decode_coordinates(packed.encode_coordinates(ring))
+    _assert_close(decoded, ring, bound)
+
+    decoded = packed.decode_coordinates(packed.encode_coordinates(rings))
+    assert len(decoded) == len(rings)
+    for got, expected in zip(decoded, rings):
+        _assert_close(got, expected, bound)
+
+
+def test_round_trip_is_stable_after_quantization():
+    ring = [[0.123456789, -0.987654321], [-0.5, 0.5], [0.0, 0.0]]
+    once = packed.decode_coordinates(packed.encode_coordinates(ring))
+    twice = packed.decode_coordinates(packed.encode_coordinates(once))
+    assert once == twice
+
+
+def test_decode_zero_rings_is_empty_geometry():
+    for flags in (0, packed.FLAG_MULTI_RING):
+        assert packed.decode_coordinates(bytes((packed.PACKED_VERSION, 7, flags, 0))) == []
+
+
+def test_encode_rejects_non_numeric_geometry():
+    assert packed.encode_coordinates([]) is None
+    assert packed.encode_coordinates([[0.1, 0.2, 0.3]]) is None
+    assert packed.encode_coordinates([['a', 'b']]) is None
+    assert packed.encode_coordinates([[float('nan'), 0.0]]) is None
+
+
+def test_decode_rejects_truncated_data():
+    data = packed.encode_coordinates([[0.1, 0.2], [0.3, -0.4]])
+    with pytest.raises(ValueError):
+        packed.decode_coordinates(data[:-1])
+    with pytest.raises(ValueError):
+        packed.decode_coordinates(b'\x09' + data[1:])
@@ -0,0 +1,85 @@
+'''
+Видимость полигонов: read_filter_sql и can_read должны совпадать с прежней
+построчной проверкой через check_permission на случайно заполненных пользователях,
+правах и объектах.
+'''
+
+import random
+
+from psycopg2.extras import RealDictCursor
+
+from conftest import load_function
+
+ROLES = ('admin', 'editor', 'user', 'viewer')
+LEVELS = ('read', 'write', 'admin', 'none')
+SEGMENTS = ('Сегмент А', 'Сегмент Б', 'Сегмент В', 'Сегмент А,Сегмент Б', '')
+PREFIX = 'permtest-'
+
+
+def _seed(cur, rng: random.Random):
+    users = [PREFIX + 'u%d' % i for i in range(24)]
+    for i, user_id in enumerate(users):
+        cur.execute(
+            "INSERT INTO users (id, email, name, password_hash, role, status) "
+            "VALUES (%s, %s, %s, 'x', %s, 'active')",
+            (user_id, user_id + '@example.com', user_id, ROLES[i % len(ROLES)])
+        )
+
+    for user_id in users:
+        # Не больше одного действующего права на ресурс: при нескольких check_permission
+        # берёт произвольное (LIMIT 1 без порядка), сравнивать там нечего
+        for resource_id in (None,) + SEGMENTS[:4]:
+            if rng.random() < 0.35:
+                cur.execute(
+                    "INSERT INTO permissions (user_id, resource_type, resource_id, permission_level) "
+                    "VALUES (%s, 'layer', %s, %s)",
+                    (user_id, resource_id, rng.choice(LEVELS))
+                )
+            if rng.random() < 0.2:
+                cur.execute(
+                    "INSERT INTO permissions (user_id, resource_type, resource_id, permission_level) "
+                    "VALUES (%s, 'layer', %s, 'revoked')",
+                    (user_id, resource_id)
+                )
+
+    for i in range(200):
+        owner = rng.choice(users + [PREFIX + 'nobody'])
+        cur.execute(
+            "INSERT INTO polygon_objects (id, name, type, status, coordinates, color, segment, user_id) "
+            "VALUES (%s, %s, 'polygon', 'active', '[]', '#3B82F6', %s, %s)",
+            (PREFIX + 'p%d' % i, 'Объект %d' % i, rng.choice(SEGMENTS), owner)
+        )
+    return users + [PREFIX + 'missing']
+
+
+def _visible_by_loop(polygons, cur, user_id: str):
+    '''Прежний список: свои, общие и объекты сегментов, проходящих check_permission'''
+    index = load_function('polygons')
+    return {
+        row['id'] for row in polygons
+        if row['user_id'] == user_id or row['user_id'] is None
+        or index.check_permission(cur, user_id, 'layer', row.get('segment') or '', 'read')
+    }
+
+
+def test_read_filter_matches_check_permission(db_conn):
+    index = load_function('polygons')
+    permissions = load_function('polygons', 'permissions')
+    with db_conn.cursor(cursor_factory=RealDictCursor) as cur:
+        users = _seed(cur, random.Random(20240601))
+        cur.execute("SELECT id, user_id, segment FROM polygon_objects WHERE id LIKE %s", (PREFIX + '%',))
+        polygons = cur.fetchall()
+
+        for user_id in users:
+            access = permissions.load_read_access(cur, user_id)
+
+            for segment in SEGMENTS:
+                expected = index.check_permission(cur, user_id, 'layer', segment or '', 'read')
+                assert permissions.can_read(access, segment or '') == expected, (user_id, segment)
+
+            where_sql, where_params = permissions.read_filter_sql(access, user_id)
+            cur.execute(
+                "SELECT id FROM polygon_objects WHERE " + where_sql + " AND id LIKE %s",
+                where_params + [PREFIX + '%']
+            )
+            assert {row['id'] for row in cur.fetchall()} == _visible_by_loop(polygons, cur, user_id), user_id
@@ -0,0 +1,66 @@
+'''
+Пересчёт сохранённых цветов полигонов при изменении сегментов: версия polygons
+увеличивается только тогда, когда какой-то цвет действительно изменился.
+'''
+
+from psycopg2.extras import RealDictCursor
+
+from conftest import load_function
+
+PREFIX = 'colortest-'
+
+
+def _polygons_version(cur) -> int:
+    cur.execute("SELECT version FROM data_versions WHERE name = 'polygons'")
+    row = cur.fetchone()
+    return row['version'] if row else 0
+
+
+def _seed(cur):
+    cur.execute(
+        "INSERT INTO segments (name, color) VALUES (%s, '#ff0000'), (%s, '#0000ff')",
+        (PREFIX + 'a', PREFIX + 'b')
+    )
+    for polygon_id, segment, color in (
+        ('p1', PREFIX + 'a', '#ff0000'),
+        ('p2', PREFIX + 'a,' + PREFIX + 'b', '#7f007f'),
+        ('p3', PREFIX + 'b', '#0000ff'),
+    ):
+        cur.execute(
+            "INSERT INTO polygon_objects (id, name, type, status, coordinates, color, segment, user_id, row_version) "
+            "VALUES (%s, %s, 'polygon', 'active', '[]', %s, %s, 'u', 0)",
+            (PREFIX + polygon_id, polygon_id, color, segment)
+        )
+
+
+def _rows(cur):
+    cur.execute("SELECT id, color, row_version FROM polygon_objects WHERE id LIKE %s ORDER BY id", (PREFIX + '%',))
+    return {row['id'][len(PREFIX):]: (row['color'], row['row_version']) for row in cur.fetchall()}
+
+
+def test_unchanged_colors_keep_polygons_version(db_conn):
+    segments = load_function('segments')
+    with db_conn.cursor(cursor_factory=RealDictCursor) as cur:
+        _seed(cur)
+        version = _polygons_version(cur)
+
+        assert segments.recompute_polygon_colors(cur, [PREFIX + 'a']) == 0
+        assert segments.recompute_polygon_colors(cur, [PREFIX + 'a', PREFIX + 'b']) == 0
+        assert _polygons_version(cur) == version
+        assert {row[1] for row in _rows(cur).values()} == {0}
+
+
+def test_changed_colors_get_one_new_version(db_conn):
+    segments = load_function('segments')
+    with db_conn.cursor(cursor_factory=RealDictCursor) as cur:
+        _seed(cur)
+        version = _polygons_version(cur)
+        cur.execute("UPDATE segments SET color = '#00ff00' WHERE name = %s", (PREFIX + 'a',))
+
+        assert segments.recompute_polygon_colors(cur, [PREFIX + 'a']) == 2
+        assert _polygons_version(cur) == version + 1
+        assert _rows(cur) == {
+            'p1': ('#00ff00', version + 1),
+            'p2': ('#007f7f', version + 1),
+            'p3': ('#0000ff', 0),
+        }